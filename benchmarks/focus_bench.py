@@ -0,0 +1,380 @@
+#!/usr/bin/python3
+"""
+Focus pipeline benchmark.
+
+Starts a private session bus (dbus-daemon), a stand-in browser with the focus daemon (focus_monitor.py)
+tied to it, and replays isPidFocused calls mixed with background bus noise at configurable rates.
+Reports the daemon's CPU time, peak RSS, delivered events per second, signal file growth and (with a
+push socket) the call to client latency, for each monitor backend. Runs on any headless Linux box with
+dbus-daemon (and dbus-monitor for the legacy backend).
+
+    python3 benchmarks/focus_bench.py                                  # generated traffic, both backends
+    python3 benchmarks/focus_bench.py --focus-rate 200 --noise-rate 2000 --duration 20
+    python3 benchmarks/focus_bench.py --replay trace.jsonl -b native   # recorded traffic
+
+A replay file has one JSON object per line: {"t": seconds from start, "kind": "focus"|"noise", "pid": "browser"|"other"|<pid>}
+"""
+import argparse
+import json
+import os
+import random
+import shutil
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+import session_bus # must come after the path setup
+import focus_monitor
+
+SHELL_NAME = "com.canonical.Unity" # owned by the sink, calls are sent to it like maliit does to Lomiri
+FOCUS_PATH = "/com/canonical/Unity/FocusInfo"
+OTHER_PID = 1 # not in the browser's tree
+
+BACKENDS = {
+    "native": {}, # session_bus subscription
+    "legacy": {focus_monitor.FOCUS_BACKEND_ENV: "dbus-monitor"}, # dbus-monitor text parsing, same push socket
+}
+
+# Background traffic a Lomiri session produces all the time: indicator property updates, app lifecycle and
+# notification calls. None of it matches the daemon's rule, the bus should filter it before it reaches us.
+NOISE = (
+    (session_bus.SIGNAL, "/com/canonical/indicator/network", "org.freedesktop.DBus.Properties", "PropertiesChanged", "s", ("org.ayatana.indicator",)),
+    (session_bus.SIGNAL, "/com/lomiri/Shell", "com.lomiri.Shell.AppLifecycle", "AppStateChanged", "su", ("dialer-app", 1)),
+    (session_bus.METHOD_CALL, "/org/freedesktop/Notifications", "org.freedesktop.Notifications", "GetCapabilities", "", ()),
+    (session_bus.METHOD_CALL, "/com/canonical/Unity/FocusInfo", "com.canonical.Unity.FocusInfo", "isSurfaceFocused", "s", ("surface-1",)),
+)
+
+
+#### START TRAFFIC ####
+
+def generate_schedule(duration: float, focus_rate: float, noise_rate: float, browser_share: float, seed: int = 1) -> list:
+    """
+    Returns [(t, kind, pid)] with evenly spaced focus calls and noise, jittered so they interleave.
+
+    Args:
+        duration (float): seconds of traffic.
+        focus_rate (float): isPidFocused calls per second.
+        noise_rate (float): unrelated messages per second.
+        browser_share (float): fraction of isPidFocused calls about the browser, the rest are about another app.
+    """
+    rng = random.Random(seed)
+    schedule = []
+    for kind, rate in (("focus", focus_rate), ("noise", noise_rate)):
+        if rate <= 0:
+            continue
+        count = int(duration * rate)
+        for i in range(count):
+            pid = "browser" if kind == "focus" and rng.random() < browser_share else "other"
+            schedule.append(((i + rng.random()) / rate, kind, pid))
+    schedule.sort()
+    return schedule
+
+
+def load_schedule(path: str) -> list:
+    schedule = []
+    with open(path) as f:
+        for line in f:
+            if line.strip():
+                event = json.loads(line)
+                schedule.append((float(event["t"]), event.get("kind", "focus"), event.get("pid", "browser")))
+    schedule.sort()
+    return schedule
+
+
+class Sink:
+    """
+    Owns SHELL_NAME and drains everything sent to it, so the bus never has to queue or drop our traffic.
+    """
+
+    def __init__(self, address: str):
+        self.connection = session_bus.Connection(address)
+        self.connection.call(session_bus.BUS_NAME, session_bus.BUS_PATH, session_bus.BUS_NAME, "RequestName", "su", (SHELL_NAME, 0))
+        self.thread = threading.Thread(target=self._drain, daemon=True)
+        self.thread.start()
+
+    def _drain(self):
+        try:
+            while True:
+                self.connection.receive()
+        except (OSError, session_bus.DBusError):
+            pass
+
+    def close(self):
+        self.connection.close()
+
+
+def replay(address: str, schedule: list, browser_pid: int) -> dict:
+    """
+    Sends the schedule in real time from one connection.
+
+    Returns:
+        dict: {"focus": calls sent, "browser": of those about the browser, "noise": noise sent, "lag_ms": worst send lag,
+               "sent_us": unix µs send times of the browser calls}
+    """
+    connection = session_bus.Connection(address)
+    counts = {"focus": 0, "browser": 0, "noise": 0, "lag_ms": 0.0, "sent_us": []}
+    started = time.monotonic()
+    try:
+        for offset, kind, pid in schedule:
+            delay = started + offset - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            else:
+                counts["lag_ms"] = max(counts["lag_ms"], -delay * 1000)
+            if kind == "focus":
+                pid = browser_pid if pid == "browser" else (OTHER_PID if pid == "other" else int(pid))
+                if pid == browser_pid:
+                    counts["sent_us"].append(time.time_ns() // 1000)
+                connection.send(session_bus.METHOD_CALL, {
+                    session_bus.FIELD_PATH: FOCUS_PATH, session_bus.FIELD_INTERFACE: focus_monitor.FOCUS_INTERFACE,
+                    session_bus.FIELD_MEMBER: focus_monitor.FOCUS_MEMBER, session_bus.FIELD_DESTINATION: SHELL_NAME,
+                }, "u", (pid,), session_bus.NO_REPLY_EXPECTED)
+                counts["focus"] += 1
+                counts["browser"] += pid == browser_pid
+            else:
+                message_type, path, interface, member, signature, args = NOISE[counts["noise"] % len(NOISE)]
+                fields = {session_bus.FIELD_PATH: path, session_bus.FIELD_INTERFACE: interface, session_bus.FIELD_MEMBER: member}
+                if message_type == session_bus.METHOD_CALL:
+                    fields[session_bus.FIELD_DESTINATION] = SHELL_NAME
+                connection.send(message_type, fields, signature, args, session_bus.NO_REPLY_EXPECTED)
+                counts["noise"] += 1
+    finally:
+        connection.close()
+    return counts
+
+#### END TRAFFIC ####
+
+#### START MEASUREMENT ####
+
+def process_tree(root_pid: int) -> list:
+    children = {}
+    for entry in os.listdir("/proc"):
+        if entry.isdigit():
+            try:
+                with open(f"/proc/{entry}/stat", "rb") as f:
+                    stat = f.read()
+                children.setdefault(int(stat[stat.rindex(b")") + 2:].split()[1]), []).append(int(entry))
+            except (OSError, ValueError, IndexError):
+                continue
+    tree, stack = [], [root_pid]
+    while stack:
+        pid = stack.pop()
+        tree.append(pid)
+        stack.extend(children.get(pid, ()))
+    return tree
+
+
+def cpu_seconds(pids) -> float:
+    ticks = 0
+    for pid in pids:
+        try:
+            with open(f"/proc/{pid}/stat", "rb") as f:
+                stat = f.read()
+            fields = stat[stat.rindex(b")") + 2:].split()
+            ticks += int(fields[11]) + int(fields[12]) # utime, stime
+        except (OSError, ValueError, IndexError):
+            continue
+    return ticks / os.sysconf("SC_CLK_TCK")
+
+
+def peak_rss_kb(pids) -> int:
+    total = 0
+    for pid in pids:
+        try:
+            with open(f"/proc/{pid}/status") as f:
+                for line in f:
+                    if line.startswith("VmHWM:"):
+                        total += int(line.split()[1])
+        except (OSError, ValueError):
+            continue
+    return total
+
+
+class PushClient:
+    """
+    Connects to the push socket like osk_manager.sys.mjs and timestamps every focus record it gets.
+    """
+
+    def __init__(self, socket_path: str):
+        self.received_us = []
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.connect(socket_path)
+        self.thread = threading.Thread(target=self._read, daemon=True)
+        self.thread.start()
+
+    def _read(self):
+        pending = b""
+        try:
+            while True:
+                data = self.sock.recv(65536)
+                if not data:
+                    return
+                now = time.time_ns() // 1000
+                pending += data
+                *lines, pending = pending.split(b"\n")
+                self.received_us += [now for line in lines if b'"focused":1' in line]
+        except OSError:
+            pass
+
+    def close(self):
+        self.sock.close()
+
+#### END MEASUREMENT ####
+
+#### START RUNNER ####
+
+BROWSER_STUB = """
+import os, sys
+sys.path.insert(0, {repo!r})
+import focus_monitor
+focus_monitor.start_focus_daemon([{profile!r}])
+os.execlp("sleep", "sleep", "3600") # the "browser", the daemon is tied to this pid
+"""
+
+
+def _wait_for(predicate, timeout: float) -> bool:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.02)
+    return False
+
+
+def run_backend(name: str, schedule: list, settle: float) -> dict:
+    """
+    Runs the schedule against one backend on a fresh bus and profile.
+    """
+    root = tempfile.mkdtemp(prefix=f"uwolf-focus-bench-{name}-")
+    bus = subprocess.Popen(["dbus-daemon", "--session", "--print-address", "--nofork"],
+                           stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True)
+    browser = sink = client = None
+    try:
+        address = bus.stdout.readline().strip()
+        profile = os.path.join(root, "profile")
+        os.makedirs(os.path.join(profile, "chrome", "JS"))
+        signal_path = os.path.join(profile, "chrome", "JS", "osk_overlay_config.js")
+        socket_path = os.path.join(profile, focus_monitor.PUSH_SOCKET_NAME)
+
+        env = dict(os.environ, DBUS_SESSION_BUS_ADDRESS=address, **BACKENDS[name])
+        env.update(UWOLF_PRESSURE="0", UWOLF_BACKGROUND_PRIORITY="0") # only the focus path is measured
+        browser = subprocess.Popen([sys.executable, "-c", BROWSER_STUB.format(repo=REPO_ROOT, profile=profile)],
+                                   env=env, cwd=root, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        sink = Sink(address)
+
+        # ready once the daemon (and dbus-monitor) run and the initial record is written
+        ready = _wait_for(lambda: os.path.exists(signal_path) and len(process_tree(browser.pid)) >= (3 if name == "legacy" else 2), 5.0)
+        if not ready:
+            raise RuntimeError(f"{name}: focus daemon did not start")
+        time.sleep(0.3)
+        if _wait_for(lambda: os.path.exists(socket_path), 2.0):
+            client = PushClient(socket_path)
+
+        daemon_pids = [pid for pid in process_tree(browser.pid) if pid != browser.pid]
+        seq_before = focus_monitor.read_signal_seq(signal_path)
+        size_before = os.path.getsize(signal_path)
+        cpu_before = cpu_seconds(daemon_pids)
+
+        started = time.monotonic()
+        sent = replay(address, schedule, browser.pid)
+        elapsed = time.monotonic() - started
+        time.sleep(settle) # let the daemon catch up before reading the results
+
+        daemon_pids = [pid for pid in process_tree(browser.pid) if pid != browser.pid]
+        cpu = cpu_seconds(daemon_pids) - cpu_before
+        delivered = focus_monitor.read_signal_seq(signal_path) - seq_before
+        result = {
+            "duration_s": elapsed,
+            "focus_sent": sent["focus"],
+            "browser_sent": sent["browser"],
+            "noise_sent": sent["noise"],
+            "delivered": delivered,
+            "events_per_s": delivered / elapsed if elapsed else 0.0,
+            "cpu_ms": cpu * 1000,
+            "cpu_ms_per_1k_msgs": cpu * 1e6 / max(1, sent["focus"] + sent["noise"]),
+            "peak_rss_kb": peak_rss_kb(daemon_pids),
+            "file_growth_bytes": os.path.getsize(signal_path) - size_before,
+            "send_lag_ms": sent["lag_ms"],
+        }
+        if client is not None and client.received_us:
+            latencies = [(received - sent_us) / 1000 for sent_us, received in zip(sent["sent_us"], client.received_us)]
+            result["latency_p50_ms"] = statistics.median(latencies)
+            result["latency_p95_ms"] = sorted(latencies)[int(0.95 * (len(latencies) - 1))]
+        return result
+    finally:
+        for closable in (client, sink):
+            if closable is not None:
+                closable.close()
+        if browser is not None:
+            browser.kill() # the daemon gets SIGTERM from the kernel and stops dbus-monitor
+            browser.wait()
+        bus.terminate()
+        bus.wait()
+        shutil.rmtree(root, ignore_errors=True)
+
+
+def report(results: dict) -> None:
+    rows = (
+        ("focus calls sent", "focus_sent", "{:.0f}"),
+        ("  about the browser", "browser_sent", "{:.0f}"),
+        ("noise messages sent", "noise_sent", "{:.0f}"),
+        ("records published", "delivered", "{:.0f}"),
+        ("events/s", "events_per_s", "{:.1f}"),
+        ("daemon CPU ms", "cpu_ms", "{:.1f}"),
+        ("CPU ms / 1k msgs", "cpu_ms_per_1k_msgs", "{:.2f}"),
+        ("peak RSS KiB", "peak_rss_kb", "{:.0f}"),
+        ("signal file growth B", "file_growth_bytes", "{:.0f}"),
+        ("latency p50 ms", "latency_p50_ms", "{:.2f}"),
+        ("latency p95 ms", "latency_p95_ms", "{:.2f}"),
+        ("worst send lag ms", "send_lag_ms", "{:.1f}"),
+    )
+    names = list(results)
+    print(f"\n  {'':<24}" + "".join(f"{name:>12}" for name in names))
+    for label, key, fmt in rows:
+        cells = [fmt.format(results[name][key]) if key in results[name] else "-" for name in names]
+        print(f"  {label:<24}" + "".join(f"{cell:>12}" for cell in cells))
+
+#### END RUNNER ####
+
+
+def main(argv) -> int:
+    parser = argparse.ArgumentParser(description="Synthetic isPidFocused replayer and focus daemon benchmark.")
+    parser.add_argument("-b", "--backend", action="append", choices=sorted(BACKENDS), help="monitor backend to run (default all available)")
+    parser.add_argument("-d", "--duration", type=float, default=10.0, help="seconds of generated traffic (default 10)")
+    parser.add_argument("--focus-rate", type=float, default=50.0, help="isPidFocused calls per second (default 50)")
+    parser.add_argument("--noise-rate", type=float, default=500.0, help="unrelated bus messages per second (default 500)")
+    parser.add_argument("--browser-share", type=float, default=0.8, help="fraction of focus calls about the browser (default 0.8)")
+    parser.add_argument("--replay", help="JSON lines traffic file to replay instead of generated traffic")
+    parser.add_argument("--settle", type=float, default=1.0, help="seconds to wait for the daemon after the last message (default 1)")
+    parser.add_argument("--json", action="store_true", help="print the results as JSON")
+    args = parser.parse_args(argv[1:])
+
+    if shutil.which("dbus-daemon") is None:
+        print("dbus-daemon not found, install dbus.")
+        return 2
+
+    schedule = load_schedule(args.replay) if args.replay else generate_schedule(args.duration, args.focus_rate, args.noise_rate, args.browser_share)
+    results = {}
+    for name in args.backend or sorted(BACKENDS, key=lambda name: name != "native"):
+        if name == "legacy" and shutil.which("dbus-monitor") is None:
+            print("dbus-monitor not found, skipping the legacy backend.")
+            continue
+        print(f"{name}: replaying {len(schedule)} messages...", flush=True)
+        results[name] = run_backend(name, schedule, args.settle)
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        report(results)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
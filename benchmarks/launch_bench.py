@@ -0,0 +1,293 @@
+#!/usr/bin/python3
+"""
+Offline launcher benchmark.
+
+Builds a fake Ubuntu Touch device in a temporary directory (sysfs display modes, key_constants.js,
+stand-in getprop/gsettings/device-info and a stub bin/AppRun), runs librewolf.sh end to end up to the
+exec of the stub AppRun and reports per-phase and total wall time. Runs on any Linux box with python3.
+
+    python3 benchmarks/launch_bench.py                     # run and compare against baselines.json
+    python3 benchmarks/launch_bench.py --update-baselines  # store the current medians as baselines
+
+Exits with 1 if a warm median regressed past the baseline tolerance.
+"""
+import argparse
+import json
+import os
+import runpy
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BASELINES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baselines.json")
+
+SCENARIOS = {
+    "staged": "'Staged'",
+    "windowed": "'Windowed'",
+}
+
+KEY_CONSTANTS_JS = """\
+var phoneKeyboardHeightPortrait = 0.365;
+var phoneKeyboardHeightLandscape = 0.49;
+var tabletKeyboardHeightPortrait = 0.28;
+var tabletKeyboardHeightLandscape = 0.38;
+var phoneWordribbonHeight = 4;
+var tabletWordribbonHeight = 6;
+"""
+
+STUBS = {
+    "getprop": "#!/bin/sh\necho 480\n",
+    "device-info": "#!/bin/sh\necho 'Name: benchmark'\necho 'DeviceType: phone'\n",
+    "gsettings": "#!/bin/sh\ncase \"$3\" in usage-mode) echo \"$UWOLF_BENCH_USAGE_MODE\";; *) echo true;; esac\n",
+}
+
+APPRUN_STUB = "#!/bin/sh\nprintf '%s\\n%s\\n' \"$(date +%s%N)\" \"$*\" > \"$UWOLF_BENCH_EXEC_STAMP\"\n"
+
+
+#### START FAKE DEVICE ####
+
+def _write(path, content, mode=0o644):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w") as f:
+        f.write(content)
+    os.chmod(path, mode)
+
+
+def build_app_dir(root: str) -> str:
+    """
+    Lays out the click package like scripts/build.sh does (chrome CSS/JS split, chrome manifest, precompiled modules).
+    """
+    app_dir = os.path.join(root, "app")
+    os.makedirs(app_dir)
+    for name in os.listdir(REPO_ROOT):
+        if name.endswith(".py") or name == "librewolf.sh":
+            shutil.copy2(os.path.join(REPO_ROOT, name), app_dir)
+
+    profile_dir = os.path.join(app_dir, "profile")
+    shutil.copytree(os.path.join(REPO_ROOT, "profile"), profile_dir, ignore=shutil.ignore_patterns("__pycache__", "chrome"))
+    source_chrome_dir = os.path.join(REPO_ROOT, "profile", "chrome")
+    for name in os.listdir(source_chrome_dir):
+        subdir = "CSS" if name.endswith(".css") else "JS"
+        os.makedirs(os.path.join(profile_dir, "chrome", subdir), exist_ok=True)
+        shutil.copy2(os.path.join(source_chrome_dir, name), os.path.join(profile_dir, "chrome", subdir))
+    subprocess.run([sys.executable, os.path.join(profile_dir, "chrome_manifest.py"),
+                    os.path.join(profile_dir, "chrome"), os.path.join(profile_dir, "chrome.manifest.json")],
+                   check=True, stdout=subprocess.DEVNULL)
+    subprocess.run([sys.executable, "-m", "compileall", "-q", "--invalidation-mode", "checked-hash", app_dir], # shipped precompiled
+                   check=True, stdout=subprocess.DEVNULL)
+
+    _write(os.path.join(app_dir, "bin", "AppRun"), APPRUN_STUB, 0o755)
+    shutil.copy2(os.path.join(REPO_ROOT, ".last_librewolf_tag"), app_dir)
+    return app_dir
+
+
+def build_device(root: str, usage_mode: str) -> dict:
+    """
+    Creates a fresh fake device (sysroot, stub executables, home with one profile) and returns its environment.
+    """
+    sysroot = os.path.join(root, "sysroot")
+    _write(os.path.join(sysroot, "sys", "class", "drm", "card0-DSI-1", "modes"), "1080x2340\n")
+    _write(os.path.join(sysroot, "sys", "class", "drm", "card0-HDMI-A-1", "modes"), "")
+    _write(os.path.join(sysroot, "usr", "share", "maliit", "plugins", "lomiri-keyboard", "keys", "key_constants.js"), KEY_CONSTANTS_JS)
+
+    stub_dir = os.path.join(root, "stubs")
+    for name, content in STUBS.items():
+        _write(os.path.join(stub_dir, name), content, 0o755)
+
+    home = os.path.join(root, "home")
+    _write(os.path.join(home, ".librewolf", "profiles.ini"), "[Profile0]\nName=default\nIsRelative=1\nPath=bench.default\nDefault=1\n")
+    os.makedirs(os.path.join(home, ".librewolf", "bench.default"))
+
+    env = dict(os.environ)
+    env.update({
+        "HOME": home,
+        "XDG_CACHE_HOME": os.path.join(home, ".cache"),
+        "XDG_CONFIG_HOME": os.path.join(home, ".config"),
+        "PATH": stub_dir + os.pathsep + env.get("PATH", "/usr/bin:/bin"),
+        "UWOLF_SYSROOT": sysroot,
+        "UWOLF_BENCH_USAGE_MODE": usage_mode,
+        "GRID_UNIT_PX": "18",
+        "DBUS_SESSION_BUS_ADDRESS": "unix:path=" + os.path.join(root, "no-bus"), # focus daemon falls back right away
+    })
+    env.pop("UWOLF_PROFILE", None)
+    return env
+
+#### END FAKE DEVICE ####
+
+#### START CHILD ####
+# Runs inside the launched process: times every phase of librewolf.sh's startup plan and hands
+# the timings to the parent right before the exec of the stub AppRun.
+
+def run_child(app_dir: str, phases_path: str) -> None:
+    started = time.time_ns()
+    os.chdir(app_dir) # the launcher runs from the click package
+    sys.path.insert(0, app_dir) # what running librewolf.sh as a script would do
+    sys.argv = [os.path.join(app_dir, "librewolf.sh")]
+    timings = []
+
+    launcher = runpy.run_path(sys.argv[0], run_name="uwolf_bench")
+    imported = time.time_ns()
+    timings.append(("import", started, imported))
+
+    launcher_globals = launcher["main"].__globals__
+    build_startup_plan = launcher_globals["build_startup_plan"]
+
+    def timed(phase, step):
+        def run(launch):
+            step_started = time.time_ns()
+            if phase == "exec":
+                with open(phases_path, "w") as f:
+                    json.dump({"timings": timings, "exec_started": step_started}, f)
+            step(launch)
+            timings.append((phase, step_started, time.time_ns()))
+        return run
+
+    def timed_plan(facts):
+        timings.append(("mode probes", imported, time.time_ns()))
+        return [(phase, timed(phase, step)) for phase, step in build_startup_plan(facts)]
+
+    launcher_globals["build_startup_plan"] = timed_plan
+    launcher["main"](sys.argv)
+    sys.exit("exec did not happen")
+
+#### END CHILD ####
+
+#### START RUNNER ####
+
+def run_once(app_dir: str, env: dict, root: str) -> dict:
+    """
+    Launches librewolf.sh once and returns {phase: milliseconds}, including "interpreter" (spawn to first
+    benchmark line), "exec" (exec to the stub AppRun running) and "total" (spawn to AppRun).
+    """
+    phases_path = os.path.join(root, "phases.json")
+    stamp_path = os.path.join(root, "exec-stamp")
+    for path in (phases_path, stamp_path):
+        if os.path.exists(path):
+            os.remove(path)
+
+    env = dict(env, UWOLF_BENCH_EXEC_STAMP=stamp_path)
+    spawned = time.time_ns()
+    result = subprocess.run([sys.executable, os.path.abspath(__file__), "--child", app_dir, phases_path],
+                            env=env, cwd=app_dir, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True)
+    if result.returncode != 0 or not os.path.exists(stamp_path):
+        raise RuntimeError(f"launcher did not reach the exec (exit code {result.returncode}):\n{result.stdout}")
+
+    with open(phases_path) as f:
+        child = json.load(f)
+    with open(stamp_path) as f:
+        exec_done = int(f.readline())
+
+    timings = {"interpreter": (child["timings"][0][1] - spawned) / 1e6}
+    for phase, phase_started, phase_ended in child["timings"]:
+        timings[phase] = (phase_ended - phase_started) / 1e6
+    timings["exec"] = (exec_done - child["exec_started"]) / 1e6
+    timings["total"] = (exec_done - spawned) / 1e6
+    return timings
+
+
+def run_scenario(name: str, iterations: int) -> dict:
+    """
+    Runs a scenario on a fresh fake device: the first launch is cold (empty caches, chrome deployment),
+    the rest are warm.
+
+    Returns:
+        dict: {"cold": {phase: ms}, "warm": {phase: [ms, ...]}}
+    """
+    root = tempfile.mkdtemp(prefix=f"uwolf-bench-{name}-")
+    try:
+        app_dir = build_app_dir(root)
+        env = build_device(root, SCENARIOS[name])
+        cold = run_once(app_dir, env, root)
+        warm = {}
+        for _ in range(iterations):
+            for phase, ms in run_once(app_dir, env, root).items():
+                warm.setdefault(phase, []).append(ms)
+        return {"cold": cold, "warm": warm}
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+
+def _percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+
+def report(name: str, result: dict) -> dict:
+    """
+    Prints the per-phase table of a scenario and returns its warm medians.
+    """
+    medians = {phase: statistics.median(values) for phase, values in result["warm"].items()}
+    print(f"\n{name}: {len(result['warm']['total'])} warm launches")
+    print(f"  {'phase':<16}{'cold ms':>10}{'median ms':>12}{'p95 ms':>10}")
+    for phase, values in result["warm"].items():
+        print(f"  {phase:<16}{result['cold'].get(phase, 0):>10.1f}{medians[phase]:>12.1f}{_percentile(values, 0.95):>10.1f}")
+    return medians
+
+
+def check_regressions(name: str, medians: dict, baselines: dict, tolerance: float, slack_ms: float) -> list:
+    """
+    Compares warm medians against the stored baselines.
+
+    Returns:
+        list: human readable regression descriptions, empty if none.
+    """
+    regressions = []
+    for phase, baseline in baselines.get(name, {}).items():
+        if phase not in medians:
+            continue
+        limit = baseline * (1 + tolerance) + slack_ms
+        if medians[phase] > limit:
+            regressions.append(f"{name}/{phase}: {medians[phase]:.1f} ms > {limit:.1f} ms (baseline {baseline:.1f} ms)")
+    return regressions
+
+#### END RUNNER ####
+
+
+def main(argv) -> int:
+    if len(argv) == 4 and argv[1] == "--child":
+        run_child(argv[2], argv[3])
+
+    parser = argparse.ArgumentParser(description="Offline uWolf launcher benchmark.")
+    parser.add_argument("-n", "--iterations", type=int, default=20, help="warm launches per scenario (default 20)")
+    parser.add_argument("-s", "--scenario", action="append", choices=sorted(SCENARIOS), help="scenario to run (default all)")
+    parser.add_argument("--tolerance", type=float, default=0.5, help="allowed relative slowdown of a median (default 0.5 = 50%%)")
+    parser.add_argument("--slack-ms", type=float, default=5.0, help="allowed absolute slowdown on top of the tolerance (default 5 ms)")
+    parser.add_argument("--update-baselines", action="store_true", help="store the measured medians in baselines.json")
+    args = parser.parse_args(argv[1:])
+
+    try:
+        with open(BASELINES_PATH) as f:
+            baselines = json.load(f)
+    except (OSError, ValueError):
+        baselines = {}
+
+    regressions = []
+    for name in args.scenario or sorted(SCENARIOS):
+        medians = report(name, run_scenario(name, args.iterations))
+        if args.update_baselines:
+            baselines[name] = {phase: round(ms, 1) for phase, ms in medians.items()}
+        else:
+            regressions += check_regressions(name, medians, baselines, args.tolerance, args.slack_ms)
+
+    if args.update_baselines:
+        with open(BASELINES_PATH, "w") as f:
+            json.dump(baselines, f, indent=2, sort_keys=True)
+            f.write("\n")
+        print(f"\nBaselines written to {BASELINES_PATH}")
+        return 0
+
+    if regressions:
+        print("\nRegressions:")
+        for regression in regressions:
+            print(f"  {regression}")
+        return 1
+    print("\nNo regressions." if baselines else "\nNo baselines stored, run with --update-baselines.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
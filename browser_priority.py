@@ -0,0 +1,203 @@
+import ctypes
+import os
+import resource
+import time
+
+# Lowers the CPU and I/O priority of the browser's process tree (main process + content processes, every thread)
+# while it is in the background, and restores it when it comes back, driven by the focus daemon.
+#
+# Everything here has to be undone without privileges, which rules out SCHED_IDLE and renicing back down
+# (both need CAP_SYS_NICE unless RLIMIT_NICE allows it). Background threads get:
+#   SCHED_BATCH                 always reversible, treated as CPU bound, their wakeups never preempt other tasks
+#   nice BACKGROUND_NICE        only if RLIMIT_NICE lets us return to the original nice value
+#   I/O class idle              ioprio_set, only gets disk time when nobody else wants it
+
+BACKGROUND_NICE = 10
+BACKGROUND_DELAY = 1.0 # seconds in the background before priorities drop, switching apps back and forth costs nothing
+
+IOPRIO_WHO_PROCESS = 1
+IOPRIO_CLASS_SHIFT = 13
+IOPRIO_CLASS_IDLE = 3
+IOPRIO_SYSCALLS = { # machine -> (ioprio_set, ioprio_get)
+    "x86_64": (251, 252),
+    "aarch64": (30, 31),
+    "armv7l": (314, 315),
+    "armv8l": (314, 315),
+    "i686": (289, 290),
+}
+
+
+class _IOPrio:
+    def __init__(self):
+        self.numbers = IOPRIO_SYSCALLS.get(os.uname().machine)
+        self.libc = None
+        if self.numbers is not None:
+            try:
+                self.libc = ctypes.CDLL(None, use_errno=True)
+            except OSError:
+                self.numbers = None
+
+    def get(self, tid: int):
+        if self.numbers is None:
+            return None
+        value = self.libc.syscall(self.numbers[1], IOPRIO_WHO_PROCESS, tid)
+        return None if value < 0 else value
+
+    def set(self, tid: int, value: int) -> bool:
+        if self.numbers is None:
+            return False
+        return self.libc.syscall(self.numbers[0], IOPRIO_WHO_PROCESS, tid, value) == 0
+
+
+def list_process_tree(root_pid: int, exclude=()) -> list:
+    """
+    Returns root_pid and all its descendants, found with one pass over /proc.
+
+    Args:
+        root_pid (int): the browser's main process.
+        exclude (iterable): pids left out together with their descendants (the focus daemon itself).
+    """
+    children = {}
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat", "rb") as f:
+                stat = f.read()
+            ppid = int(stat[stat.rindex(b")") + 2:].split()[1]) # field after state is ppid, comm may contain spaces
+        except (OSError, ValueError, IndexError):
+            continue
+        children.setdefault(ppid, []).append(int(entry))
+
+    excluded = set(exclude)
+    tree = []
+    stack = [root_pid]
+    while stack:
+        pid = stack.pop()
+        if pid in excluded:
+            continue
+        tree.append(pid)
+        stack.extend(children.get(pid, ()))
+    return tree
+
+
+def list_threads(pid: int) -> list:
+    try:
+        return [int(tid) for tid in os.listdir(f"/proc/{pid}/task")]
+    except (OSError, ValueError):
+        return []
+
+
+def _parent_pid(pid: int):
+    try:
+        with open(f"/proc/{pid}/stat", "rb") as f:
+            stat = f.read()
+        return int(stat[stat.rindex(b")") + 2:].split()[1])
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def _exists(pid: int) -> bool:
+    return os.path.exists(f"/proc/{pid}")
+
+
+class BrowserPriority:
+    """
+    Tracks whether the browser is in the foreground and applies background priorities to its process tree.
+
+    set_foreground(True) restores at once, set_foreground(False) only takes effect BACKGROUND_DELAY
+    seconds later (apply_pending, called from the daemon loop), and is cancelled if focus returns first.
+    """
+
+    def __init__(self, browser_pid: int, exclude=()):
+        self.browser_pid = browser_pid
+        self.exclude = tuple(exclude)
+        self.background = False
+        self.pending_since = None # monotonic time focus was lost, None if no change is pending
+        self.saved = {} # tid -> (policy, nice, ioprio) before it was moved to the background
+        self.skipped = set() # tids left alone by _lower (already BATCH, realtime, idle), also left alone by _restore
+        self.ioprio = _IOPrio()
+        original_nice = os.getpriority(os.PRIO_PROCESS, browser_pid) if _exists(browser_pid) else 0
+        nice_limit = resource.getrlimit(resource.RLIMIT_NICE)[0]
+        self.renice = os.geteuid() == 0 or nice_limit == resource.RLIM_INFINITY or 20 - nice_limit <= original_nice # can we get back?
+
+    @property
+    def deadline(self):
+        """
+        Monotonic time the pending background switch is due, None if there is none.
+        """
+        return None if self.pending_since is None else self.pending_since + BACKGROUND_DELAY
+
+    def set_foreground(self, foreground: bool) -> None:
+        if foreground:
+            self.pending_since = None
+            if self.background:
+                self._restore()
+        elif not self.background and self.pending_since is None:
+            self.pending_since = time.monotonic()
+
+    def apply_pending(self) -> None:
+        if self.pending_since is not None and time.monotonic() >= self.deadline:
+            self.pending_since = None
+            self._lower()
+
+    def _lower(self) -> None:
+        started = time.perf_counter()
+        count = 0
+        for pid in list_process_tree(self.browser_pid, self.exclude):
+            for tid in list_threads(pid):
+                if tid in self.saved or tid in self.skipped:
+                    continue
+                try:
+                    saved = (os.sched_getscheduler(tid), os.getpriority(os.PRIO_PROCESS, tid), self.ioprio.get(tid))
+                    if saved[0] != os.SCHED_OTHER:
+                        self.skipped.add(tid)
+                        continue # leave realtime/idle/batch threads (audio, ...) as they are
+                    os.sched_setscheduler(tid, os.SCHED_BATCH, os.sched_param(0))
+                    self.saved[tid] = saved
+                    if self.renice and saved[1] < BACKGROUND_NICE:
+                        os.setpriority(os.PRIO_PROCESS, tid, BACKGROUND_NICE)
+                    self.ioprio.set(tid, IOPRIO_CLASS_IDLE << IOPRIO_CLASS_SHIFT)
+                    count += 1
+                except OSError:
+                    continue # thread exited
+        self.background = True
+        print(f"Browser in background, lowered priority of {count} threads ({(time.perf_counter() - started) * 1000:.1f}ms).")
+
+    def _restore(self) -> None:
+        started = time.perf_counter()
+        count = 0
+        for pid in list_process_tree(self.browser_pid, self.exclude):
+            main_saved = self.saved.get(pid)
+            if main_saved is None and pid != self.browser_pid: # process started in the background, inherited from the thread that spawned it
+                main_saved = self.saved.get(_parent_pid(pid))
+            for tid in list_threads(pid):
+                if tid in self.skipped:
+                    continue
+                saved = self.saved.get(tid, main_saved) # threads started in the background inherited the lowered values of their process
+                if saved is None:
+                    continue # unknown origin, nothing to go back to
+                policy, nice, ioprio = saved
+                try:
+                    if os.sched_getscheduler(tid) != os.SCHED_BATCH:
+                        continue
+                    os.sched_setscheduler(tid, policy, os.sched_param(0))
+                    if self.renice:
+                        os.setpriority(os.PRIO_PROCESS, tid, nice)
+                    if ioprio is not None:
+                        self.ioprio.set(tid, ioprio)
+                    count += 1
+                except OSError:
+                    continue
+        self.saved.clear()
+        self.skipped.clear()
+        self.background = False
+        print(f"Browser in foreground, restored priority of {count} threads ({(time.perf_counter() - started) * 1000:.1f}ms).")
+
+
+def load_enabled(environ=None) -> bool:
+    """
+    Background priorities are on unless UWOLF_BACKGROUND_PRIORITY=0.
+    """
+    environ = os.environ if environ is None else environ
+    return environ.get("UWOLF_BACKGROUND_PRIORITY", "1") != "0"
@@ -1,93 +1,513 @@
-import threading
 import subprocess
+import fcntl
 import os
+import sys
 import time
+import json
+import signal
+import socket
+import selectors
 
-def monitor_dbus_and_write_to_file(profile_info):
+import session_bus
+from profile import tracing
+
+FOCUS_INTERFACE = "com.canonical.Unity.FocusInfo"
+FOCUS_MEMBER = "isPidFocused"
+FOCUS_MATCH_RULE = f"type='method_call',interface='{FOCUS_INTERFACE}',member='{FOCUS_MEMBER}'"
+
+# Fixed-size signal record read by osk_manager.sys.mjs, padded JSON so every rewrite has the same length.
+# ts: unix time in microseconds the D-Bus call was received, pub: when the record was published (latency stats).
+SIGNAL_RECORD_FORMAT = '{{"seq":{seq:>12d},"ts":{ts:>17d},"pub":{pub:>17d},"focused":{focused:d}}}\n'
+SIGNAL_RECORD_SIZE = len(SIGNAL_RECORD_FORMAT.format(seq=0, ts=0, pub=0, focused=0))
+
+# Push channel: every record is also sent as one line to each client connected to this socket in the profile.
+# Memory pressure records ({"pressure": "moderate"|"critical", ...}, see memory_pressure.py) are only sent here.
+# Clients send {"active": true|false} lines when the browser's windows gain or lose focus (see browser_priority.py).
+PUSH_SOCKET_NAME = "uwolf-focus.sock"
+LOCK_FILE_NAME = "uwolf-focus.lock" # held by the running daemon of a profile
+LOCK_WAIT = 3.0 # seconds, a daemon of a browser that just exited may still be shutting down
+
+FOCUS_BACKEND_ENV = "UWOLF_FOCUS_BACKEND" # "dbus-monitor" forces the legacy backend (benchmarks/focus_bench.py compares both)
+
+PR_SET_PDEATHSIG = 1
+PARENT_CHECK_INTERVAL = 5.0 # seconds, only polled if PR_SET_PDEATHSIG is not available
+
+
+def start_focus_daemon(profile_info, browser_pid: int = None):
     """
-    Monitors dbus for specific output and directly appends the filtered output to a file.
+    Starts the focus daemon (this module run with -m) for a profile, tied to the browser's lifetime.
 
-    This function runs a `dbus-monitor` command piped to `grep` directly,
-    with the output redirected to the specified file using shell redirection (`>>`).
-    The Python thread's primary role is to start and manage the lifecycle of this
-    long-running shell command.
+    Must be called from the thread that execs the browser: the daemon asks the kernel for SIGTERM
+    when its parent thread goes away (PR_SET_PDEATHSIG), which happens when the browser exits
+    (the launcher execs the browser in place, so the browser is the daemon's parent).
+    A per profile lock keeps it to one daemon per running browser.
 
     Args:
         profile_info (list): A list where the first element is the base profile path.
                              Example: `['/home/user/.config/my_app_profile']`
+        browser_pid (int): pid the browser will run as, defaults to this process.
 
     Returns:
-        tuple: A tuple containing:
-               - `threading.Thread` object: The active thread running the monitoring.
-               - `threading.Event` object: An event to signal the thread to stop.
-               Returns `(None, None)` if the provided profile path is invalid.
+        subprocess.Popen: the daemon process, None if the profile path is invalid or it could not be started.
     """
     # Check if profile_info has content and a valid path
     if not profile_info or not profile_info[0]:
         print("Could not find a valid profile path. Probably first start or an error occurred.")
-        return None, None
+        return None
 
     profile_path = profile_info[0]
 
     if not os.path.exists(profile_path):
         print(f"Error: Profile path does not exist! ({profile_path})")
-        return None, None
+        return None
 
     output_filepath = os.path.join(profile_path, "chrome", "JS", "osk_overlay_config.js")
+    socket_path = os.path.join(profile_path, PUSH_SOCKET_NAME)
+    browser_pid = browser_pid or os.getpid()
+
+    try:
+        process = subprocess.Popen([sys.executable, "-m", "focus_monitor", output_filepath, str(browser_pid), socket_path],
+                                   cwd=os.path.dirname(os.path.abspath(__file__))) # -m so the precompiled .pyc is used, a script is always recompiled
+    except OSError as e:
+        print(f"Error: Could not start the focus daemon. ({e})")
+        return None
+    print(f"Focus daemon started (pid {process.pid}). Signal record will be written to: {output_filepath}")
+    return process
+
+
+def stop_focus_daemon(process) -> None:
+    """
+    Stops a daemon started by start_focus_daemon, only needed if the browser could not be started.
+    """
+    if process is None or process.poll() is not None:
+        return
+    print("Terminating focus daemon...")
+    process.terminate() # Send SIGTERM
+    try:
+        process.wait(timeout=5) # Wait for a few seconds for it to terminate gracefully
+    except subprocess.TimeoutExpired:
+        print("Process did not terminate gracefully, force killing...")
+        process.kill() # Send SIGKILL if it didn't terminate in time
+        process.wait() # Wait for the kill to complete
+
+
+#### START FOCUS DAEMON ####
+
+def is_browser_pid(pid: int, browser_pid: int, known: dict) -> bool:
+    """
+    Checks if pid is the browser or one of its descendants by walking /proc parent links.
+
+    Args:
+        pid (int): pid from the isPidFocused call.
+        browser_pid (int): pid of the browser's main process.
+        known (dict): pid -> bool cache, so repeated calls cost a dict lookup.
+    """
+    if pid in known:
+        return known[pid]
+    result = False
+    current = pid
+    while current > 1:
+        if current == browser_pid:
+            result = True
+            break
+        try:
+            with open(f"/proc/{current}/stat", "rb") as f:
+                stat = f.read()
+            current = int(stat[stat.rindex(b")") + 2:].split()[1]) # field after state is ppid, comm may contain spaces
+        except (OSError, ValueError, IndexError):
+            break
+    known[pid] = result
+    return result
+
+
+def read_signal_seq(output_filepath: str) -> int:
+    """
+    Returns the sequence number of the current signal record, 0 if there is none (or it is in the legacy append format).
+    """
+    try:
+        with open(output_filepath) as f:
+            return int(json.loads(f.read(SIGNAL_RECORD_SIZE))["seq"])
+    except (OSError, ValueError, KeyError, TypeError):
+        return 0
+
+
+def now_us() -> int:
+    return time.time_ns() // 1000 # wall clock, comparable with Date.now() on the chrome side
+
+
+def write_signal_record(output_filepath: str, seq: int, focused: bool, timestamp_us: int = None) -> str:
+    """
+    Atomically replaces the signal record, the file always holds exactly SIGNAL_RECORD_SIZE bytes.
+
+    Args:
+        output_filepath (str): path of osk_overlay_config.js.
+        seq (int): monotonically increasing sequence number, the chrome side reacts when it changes.
+        focused (bool): whether the browser asked for input focus.
+        timestamp_us (int): unix time in microseconds the focus signal was seen, now if None.
+
+    Returns:
+        str: the record that was written.
+    """
+    published_us = now_us()
+    if timestamp_us is None:
+        timestamp_us = published_us
+    record = SIGNAL_RECORD_FORMAT.format(seq=seq, ts=timestamp_us, pub=published_us, focused=int(focused))
+    tmp_path = output_filepath + ".tmp"
+    with open(tmp_path, "w") as f:
+        f.write(record)
+    os.replace(tmp_path, output_filepath) # readers see either the old or the new record, never a partial one
+    return record
+
+
+def _set_parent_death_signal() -> bool:
+    """
+    Asks the kernel to send SIGTERM to this process when its parent exits, returns False if unsupported.
+    """
+    try:
+        import ctypes
+        libc = ctypes.CDLL(None, use_errno=True)
+        return libc.prctl(PR_SET_PDEATHSIG, signal.SIGTERM, 0, 0, 0) == 0
+    except (OSError, AttributeError):
+        return False
+
+
+def tie_to_browser(browser_pid: int) -> bool:
+    """
+    Makes the daemon exit together with the browser (its parent).
+
+    Returns:
+        bool: True if the kernel will signal us, False if the parent has to be polled (see FocusDaemon.run).
+    """
+    tied = _set_parent_death_signal()
+    if os.getppid() != browser_pid: # parent already gone before the death signal was armed
+        print(f"Browser (pid {browser_pid}) is not running anymore, focus daemon exiting.")
+        sys.exit(0)
+    return tied
+
+
+def acquire_instance_lock(lock_path: str):
+    """
+    Takes the per profile daemon lock, waiting up to LOCK_WAIT for a daemon that is shutting down.
+
+    Returns:
+        int: the locked file descriptor (keep it open while running), None if another daemon holds it.
+    """
+    fd = os.open(lock_path, os.O_RDWR | os.O_CREAT, 0o600)
+    deadline = time.monotonic() + LOCK_WAIT
+    while True:
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            return fd
+        except BlockingIOError:
+            if time.monotonic() > deadline:
+                os.close(fd)
+                return None
+            time.sleep(0.1)
+
 
-    stop_event = threading.Event()
+class DbusMonitor:
+    """
+    Fallback when the session bus cannot be reached directly: parses dbus-monitor's text output.
+    Stands in for the bus connection of FocusDaemon, so the push socket is served the same way.
+    dbus-monitor is our only child and dies with us (SIGTERM, or PR_SET_PDEATHSIG if we are killed).
+    """
+
+    def __init__(self):
+        def _die_with_daemon(): # runs in the child, this process is single threaded
+            _set_parent_death_signal()
+
+        self.process = subprocess.Popen(["dbus-monitor", FOCUS_MATCH_RULE], stdout=subprocess.PIPE, preexec_fn=_die_with_daemon)
+        self.sock = self.process.stdout # registered with the daemon's selector like a bus socket
+        os.set_blocking(self.sock.fileno(), False)
+        self.unique_name = f"dbus-monitor (pid {self.process.pid})"
+        self.pending = b""
+        self.call_received_us = None
+
+    def read_calls(self) -> list:
+        """
+        Parses what dbus-monitor printed so far.
+
+        Returns:
+            list: (unix µs the call was seen, pid or None if it could not be parsed) per isPidFocused call.
+
+        Raises:
+            OSError: if dbus-monitor exited.
+        """
+        try:
+            data = os.read(self.sock.fileno(), 65536)
+        except BlockingIOError:
+            return []
+        if not data:
+            raise OSError(f"dbus-monitor exited with status {self.process.wait()}")
+        lines = (self.pending + data).split(b"\n")
+        self.pending = lines.pop() # incomplete last line
+        calls = []
+        for line in lines:
+            line = line.decode(errors="replace")
+            if FOCUS_INTERFACE in line and FOCUS_MEMBER in line:
+                self.call_received_us = now_us() # the pid argument follows on the next line
+                continue
+            if self.call_received_us is None:
+                continue
+            fields = line.split()
+            try:
+                pid = int(fields[1]) if len(fields) == 2 and fields[0] == "uint32" else None
+            except ValueError:
+                pid = None
+            calls.append((self.call_received_us, pid))
+            self.call_received_us = None
+        return calls
+
+    def close(self) -> None:
+        if self.process.poll() is None:
+            self.process.terminate()
+            self.process.wait()
+        self.sock.close()
+
+
+def open_push_socket(socket_path: str) -> socket.socket:
+    """
+    Creates the listening Unix socket of the push channel, replacing a stale one from an earlier session.
+    """
+    try:
+        os.unlink(socket_path)
+    except FileNotFoundError:
+        pass
+    listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    listener.bind(socket_path)
+    os.chmod(socket_path, 0o600) # only the browser (same user) may listen in
+    listener.listen(8)
+    listener.setblocking(False)
+    return listener
+
+
+class FocusDaemon:
+    """
+    Watches isPidFocused calls on the session bus (a session_bus.Connection, or a DbusMonitor as fallback), keeps
+    the signal record file up to date and pushes every record to the connected chrome side clients, along with memory pressure records.
+
+    Protocol on the push socket, one JSON object per line:
+      daemon -> client: every signal record ({"seq", "ts", "pub", "focused"}) and memory pressure records ({"pressure", ...})
+      client -> daemon: {"active": true|false} when a browser window gains or loses activation, drives the background priorities
+
+    Only the matching method calls are routed to the bus connection, and clients only write on activation
+    changes (and hang up on exit), so the process sleeps in select() while nothing happens.
+    """
+
+    def __init__(self, connection, output_filepath: str, browser_pid: int, listener: socket.socket = None, pressure=None, priority=None):
+        self.connection = connection
+        self.output_filepath = output_filepath
+        self.browser_pid = browser_pid
+        self.listener = listener
+        self.pressure = pressure # MemoryPressureWatcher or None
+        self.priority = priority # BrowserPriority or None
+        self.selector = selectors.DefaultSelector()
+        self.clients = set()
+        self.known_pids = {}
+        self.seq = read_signal_seq(output_filepath) # continue the sequence so a restarted daemon is never mistaken for "no change"
+        self.record = write_signal_record(output_filepath, self.seq, False)
+
+    def publish(self, focused: bool, timestamp_us: int = None) -> None:
+        self.seq += 1
+        self.record = write_signal_record(self.output_filepath, self.seq, focused, timestamp_us)
+        self._broadcast(self.record.encode())
+
+    def _broadcast(self, data: bytes) -> None:
+        for client in list(self.clients):
+            try:
+                client.send(data) # records are tiny, a full socket buffer means the client is stuck
+            except OSError:
+                self._drop_client(client)
+
+    def _accept_client(self) -> None:
+        try:
+            client, _ = self.listener.accept()
+        except OSError:
+            return
+        client.setblocking(False)
+        try:
+            client.send(self.record.encode()) # current state first, so a (re)connecting client is in sync
+        except OSError:
+            client.close()
+            return
+        self.clients.add(client)
+        self.selector.register(client, selectors.EVENT_READ, self._read_client)
+
+    def _read_client(self, client) -> None:
+        try:
+            data = client.recv(256)
+        except BlockingIOError:
+            return
+        except OSError:
+            data = b""
+        if not data: # readable without data means they hung up
+            self._drop_client(client)
+            return
+        for line in data.splitlines(): # window activity, a few bytes per focus change
+            try:
+                active = json.loads(line)["active"]
+            except (ValueError, KeyError, TypeError):
+                continue
+            if self.priority is not None:
+                self.priority.set_foreground(bool(active))
+
+    def _drop_client(self, client) -> None:
+        self.clients.discard(client)
+        try:
+            self.selector.unregister(client)
+        except (KeyError, ValueError):
+            pass
+        client.close()
+
+    def _read_bus(self, _sock) -> None:
+        while True:
+            message = self.connection.receive()
+            self.handle_message(message)
+            if not self.connection.has_buffered_message():
+                break
+
+    def _check_pressure(self, triggered: bool = False) -> None:
+        record = self.pressure.check(triggered)
+        if record is None:
+            return
+        record["ts"] = now_us()
+        print(f"Memory pressure ({record['pressure']}, {record['mode']}, available {record['avail_kb']} kB, stall {record['stall']}%), "
+              f"asking {len(self.clients)} chrome client(s) to unload background tabs.")
+        tracing.event("memory pressure", **record)
+        tracing.flush()
+        self._broadcast((json.dumps(record) + "\n").encode())
 
-    def _worker_function():
+    def _read_monitor(self, _pipe) -> None:
+        for received_us, pid in self.connection.read_calls():
+            if pid is None: # unparsable argument, better a spurious OSK check than a missed one
+                self.publish(True, received_us)
+            else:
+                self.handle_focus_call(pid, received_us)
+
+    def handle_message(self, message) -> None:
+        received_us = now_us() # start of the OSK latency path
+        if message.type != session_bus.METHOD_CALL or message.member != FOCUS_MEMBER or message.interface != FOCUS_INTERFACE:
+            return # NameLost and friends
+        try:
+            pid = int(message.args()[0])
+        except (IndexError, ValueError, TypeError, session_bus.DBusError):
+            return
+        self.handle_focus_call(pid, received_us)
+
+    def handle_focus_call(self, pid: int, received_us: int) -> None:
+        if is_browser_pid(pid, self.browser_pid, self.known_pids):
+            self.publish(True, received_us)
+            if self.priority is not None:
+                self.priority.set_foreground(True)
+        elif self.priority is not None:
+            self.priority.set_foreground(False) # another app asked for the keyboard, so it is in front
+
+    def _next_timeout(self, poll_parent: bool):
+        timeouts = []
+        if poll_parent:
+            timeouts.append(PARENT_CHECK_INTERVAL)
+        if self.pressure is not None and self.pressure.interval is not None: # no PSI trigger, sample MemAvailable/avg10
+            timeouts.append(self.pressure.interval)
+        if self.priority is not None and self.priority.deadline is not None:
+            timeouts.append(max(0.0, self.priority.deadline - time.monotonic()))
+        return min(timeouts) if timeouts else None
+
+    def run(self, poll_parent: bool = False) -> None:
         """
-        The main function executed by the monitoring thread.
-        It runs the dbus command with direct file redirection.
+        Serves until the bus connection fails (or the browser is gone, if poll_parent is set).
         """
-        print(f"D-Bus monitoring thread started. Output will be appended directly to: {output_filepath}")
+        self.selector.register(self.connection.sock, selectors.EVENT_READ, self._read_monitor if isinstance(self.connection, DbusMonitor) else self._read_bus)
+        if self.listener is not None:
+            self.selector.register(self.listener, selectors.EVENT_READ, lambda _sock: self._accept_client())
+        if self.pressure is not None and self.pressure.fileno() is not None:
+            self.selector.register(self.pressure.fileno(), selectors.EVENT_READ, lambda _fd: self._check_pressure(True))
+        while True:
+            for key, _ in self.selector.select(self._next_timeout(poll_parent)):
+                key.data(key.fileobj)
+            if self.pressure is not None:
+                self._check_pressure() # no-op until the sampling interval has passed
+            if self.priority is not None:
+                self.priority.apply_pending() # no-op until the browser has been in the background for a moment
+            if poll_parent and os.getppid() != self.browser_pid:
+                print("Browser exited, focus daemon exiting.")
+                return
+
 
-        # Construct the command string including shell redirection.
-        # --line-buffered for grep is important to ensure output is flushed frequently.
-        # '>> {output_filepath}' appends the output to the file.
-        command_string = """dbus-monitor | grep --line-buffered -i "com.canonical.Unity.FocusInfo.*isPidFocused" >> {output_filepath}""".format(output_filepath=output_filepath)
-        process = None
+def run_daemon(output_filepath: str, browser_pid: int, socket_path: str = None) -> int:
+    """
+    Subscribes to isPidFocused calls on the session bus and publishes a signal record
+    for every call about the browser's process tree, until the browser exits.
+
+    Args:
+        output_filepath (str): signal record file (osk_overlay_config.js).
+        browser_pid (int): pid of the browser's main process, must be our parent.
+        socket_path (str): push channel socket, records are only written to the file if None.
+    """
+    import memory_pressure, browser_priority # daemon only, the launcher imports this module just to start us
+    tied = tie_to_browser(browser_pid)
+    profile_path = os.path.dirname(socket_path) if socket_path else os.path.dirname(os.path.dirname(os.path.dirname(output_filepath)))
+    lock_fd = acquire_instance_lock(os.path.join(profile_path, LOCK_FILE_NAME)) # released by the kernel when we exit
+    if lock_fd is None:
+        print("Another focus daemon is running for this profile, exiting.")
+        return 0
 
+    tracing.set_profile(profile_path)
+    try:
+        with tracing.span("daemon subscribe", browser_pid=browser_pid):
+            if os.environ.get(FOCUS_BACKEND_ENV) == "dbus-monitor":
+                raise session_bus.DBusError(f"{FOCUS_BACKEND_ENV}=dbus-monitor")
+            connection = session_bus.Connection()
+            connection.monitor([FOCUS_MATCH_RULE])
+    except (OSError, session_bus.DBusError) as e:
+        print(f"Could not subscribe to the session bus ({e}), falling back to dbus-monitor.")
         try:
-            # Start the subprocess. stdout/stderr are not captured by Python
-            # as they are redirected by the shell command itself.
-            process = subprocess.Popen(
-                command_string,
-                shell=True,
-                # No stdout=subprocess.PIPE or stderr=subprocess.PIPE here,
-                # as shell redirection handles the output.
-                # text=True and bufsize=1 are also not relevant for Popen itself,
-                # but bufsize=1 is implicitly handled by grep --line-buffered.
-            )
-
-            # Wait for the stop event or for the process to terminate unexpectedly.
-            # Using stop_event.wait() with a timeout allows checking if the process
-            # terminated on its own.
-            while not stop_event.is_set():
-                if process.poll() is not None:
-                    # Process terminated unexpectedly
-                    print(f"D-Bus monitor process terminated unexpectedly with exit code: {process.returncode}")
-                    break
-                time.sleep(1) # Check every second
-
-        except FileNotFoundError as e:
-            print(f"Error: Command not found. Ensure 'dbus-monitor' and 'grep' are in your system's PATH. ({e})")
-        except Exception as e:
-            print(f"An unexpected error occurred in the D-Bus monitoring thread: {e}")
-        finally:
-            # Ensure the subprocess is terminated upon thread exit
-            if process and process.poll() is None: # If the process is still running
-                print("Terminating D-Bus monitor process...")
-                process.terminate() # Send SIGTERM
-                try:
-                    process.wait(timeout=5) # Wait for a few seconds for it to terminate gracefully
-                except subprocess.TimeoutExpired:
-                    print("Process did not terminate gracefully, force killing...")
-                    process.kill() # Send SIGKILL if it didn't terminate in time
-                    process.wait() # Wait for the kill to complete
-            print("D-Bus monitoring thread finished.")
-
-    thread = threading.Thread(target=_worker_function)
-    return thread, stop_event
\ No newline at end of file
+            connection = DbusMonitor()
+        except OSError as e:
+            print(f"Could not start dbus-monitor: {e}")
+            tracing.flush()
+            return 1
+
+    listener = None
+    if socket_path:
+        try:
+            listener = open_push_socket(socket_path)
+        except OSError as e:
+            print(f"Could not open push socket {socket_path} ({e}), chrome will poll the signal file.")
+
+    pressure = memory_pressure.MemoryPressureWatcher.create(memory_pressure.load_config()) if listener is not None else None # records only go out over the socket
+    priority = browser_priority.BrowserPriority(browser_pid, exclude=(os.getpid(),)) if browser_priority.load_enabled() else None
+
+    print(f"Focus daemon subscribed as {connection.unique_name}, watching pid {browser_pid}.")
+    tracing.flush()
+    try:
+        FocusDaemon(connection, output_filepath, browser_pid, listener, pressure, priority).run(poll_parent=not tied)
+        return 0
+    except (OSError, session_bus.DBusError) as e:
+        print(f"Focus daemon stopped: {e}")
+        return 1
+    finally:
+        connection.close()
+        if priority is not None:
+            priority.set_foreground(True) # never leave a running browser deprioritized
+        if pressure is not None:
+            pressure.close()
+        if listener is not None:
+            listener.close()
+            try:
+                os.unlink(socket_path)
+            except OSError:
+                pass
+
+
+def main(argv) -> int:
+    if len(argv) not in (3, 4):
+        print(f"usage: {argv[0]} <osk_overlay_config.js path> <browser pid> [push socket path]")
+        return 2
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0)) # unwind so the push socket is removed and dbus-monitor stopped
+    return run_daemon(argv[1], int(argv[2]), argv[3] if len(argv) == 4 else None)
+
+#### END FOCUS DAEMON ####
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
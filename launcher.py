@@ -0,0 +1,285 @@
+'''
+ Copyright (C) 2022  UBPorts
+
+ This program is free software: you can redistribute it and/or modify
+ it under the terms of the GNU General Public License as published by
+ the Free Software Foundation; version 3.
+
+ udeb is distributed in the hope that it will be useful,
+ but WITHOUT ANY WARRANTY; without even the implied warranty of
+ MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+ GNU General Public License for more details.
+
+ You should have received a copy of the GNU General Public License
+  along with this program.  If not, see <http://www.gnu.org/licenses/>.
+'''
+import os
+import subprocess
+from profile import profile, librewolf_overrides, probes, tracing # profile.chrome/profile.keyboard are imported lazily, only staged mode needs OSK code
+
+
+#### Functions
+def scalingdevidor(GRID_PX : int = None) -> int: # getprop vendor.display.lcd_density
+  if GRID_PX is None:
+    GRID_PX = int(os.environ["GRID_UNIT_PX"])
+  if GRID_PX >= 21: # seems to be what most need if above or at 21 grid px
+    return 8
+  elif GRID_PX <= 16: # this one i know because my phone is 16 so if it seems weird don't worry it works.
+    return 12
+  else: # throw in the dark but lets hope it works
+    return 10
+
+def parse_launch_args(argv):
+  """
+  Splits the launcher arguments into the requested profile (-P name / -P=name) and the URL to open.
+
+  Returns:
+      tuple: (profile name or None, url or None)
+  """
+  profile_name = url = None
+  args = iter(argv[1:])
+  for arg in args:
+    if arg in ("-P", "--P", "-p"):
+      profile_name = next(args, None)
+    elif arg.startswith(("-P=", "--P=")):
+      profile_name = arg.split("=", 1)[1]
+    elif url is None:
+      url = arg
+  return profile_name, url
+
+def for_each_profile(launch, function, *args) -> dict:
+  """
+  Runs function(profile_info, *args) for every known profile concurrently, the launched profile included.
+  Profiles a browser is running on are skipped, their chrome is never swapped or deleted under them.
+
+  Returns:
+      dict: profile_info -> result, profiles whose call failed or that are in use are left out.
+  """
+  from concurrent.futures import ThreadPoolExecutor
+  targets = [launch["profile"]]
+  for other in launch["profiles"]:
+    if other == launch["profile"]:
+      continue
+    pid = profile.get_running_browser_pid(other[0])
+    if pid:
+      print(f"Profile '{other[1]}' is in use (pid {pid}), leaving it as it is.")
+      continue
+    targets.append(other)
+  results = {}
+  with ThreadPoolExecutor(max_workers=len(targets)) as executor:
+    futures = [(target, executor.submit(function, target, *args)) for target in targets]
+    for target, future in futures:
+      try:
+        results[target] = future.result()
+      except Exception as e:
+        print(f"Error provisioning profile {target}: {e!r}")
+  return results
+
+def get_scaling(facts) -> str:
+  if facts.lcd_density == 0:
+    print("falling back to GRID UNIT scaling.")
+    return str(max(0.7, min(float(os.environ["GRID_UNIT_PX"])/scalingdevidor(), 2.4))) # cap at 2.4max and 0.7min so avoid croping issues.
+  return str(max(0.7, min(float(facts.lcd_density/240), 2.4))) # cap at 2.4max and 0.7min so avoid croping issues. (DPI Scaling)
+
+
+#### START STARTUP STEPS ####
+# every step takes the shared launch dict (argv, facts, profile(s), focus daemon) and updates it in place.
+
+def run_mode_probes(launch):
+  names = probes.STAGED_PROBES if launch["facts"].staged else probes.WINDOWED_PROBES
+  launch["facts"] = probes.run_probes(probes.select(names), base=launch["facts"]) # run the device probes this mode needs once, concurrently
+
+def resolve_profile(launch):
+  facts = launch["facts"]
+  username = facts.username # get username
+  if not username: # ensure username is not empty
+    print("failed to find username defualting to phablet")
+    username = "phablet"
+
+  profile_name = launch["profile_name"] or os.environ.get(profile.PROFILE_ENV) # -P wins over $UWOLF_PROFILE
+  current_profile = profile.get_librewolf_default_profile(facts.home_dir, profile_name) # get requested or default profile
+  if not current_profile or not current_profile[0]: # try to create the profile if it is not present.
+    print("profile not found, trying to create a new profile")
+    try:
+        # Use subprocess to create the profile
+        result = subprocess.run(
+            ["bin/AppRun", "-CreateProfile", profile_name or username, "--headless"],
+            check=True  # This will raise an exception if the command fails
+        )
+        print("Profile created successfully.")
+        current_profile = profile.get_librewolf_default_profile(facts.home_dir, profile_name)
+    except subprocess.CalledProcessError as e: # handle exception
+        print("An error occurred while trying to create the profile:", e)
+  launch["profile"] = current_profile
+  if current_profile:
+    tracing.set_profile(current_profile[0]) # buffered spans go to <profile>/uwolf-trace.log from here on
+  launch["profiles"], default = profile.get_librewolf_profiles(facts.home_dir) if current_profile else ([], None) # registry is cached, no second parse
+  if current_profile and (profile_name or (default is not None and tuple(current_profile) == launch["profiles"][default])):
+    launch["profile_name"] = current_profile[1] # forwarded to AppRun as -P, so librewolf opens the profile that was provisioned
+  else:
+    launch["profile_name"] = None # no explicit or marked default profile, librewolf keeps choosing its own
+
+def sync_chrome(launch):
+  from profile import chrome
+  system_var_dict = {
+    "is-tablet" : launch["facts"].tablet # 0 for phone 1 for tablet
+  }
+  results = for_each_profile(launch, chrome.INIT_CHROME, system_var_dict, launch["facts"]) # copy custom css for adapting UI to every profile and read keyboard
+  launch["css_changed"] = results.get(launch["profile"], False)
+
+def remove_chrome(launch):
+  from profile import chrome
+  for_each_profile(launch, chrome.delete) # attempt to delete custom chrome files, so browser works unmodifed
+
+def copy_overrides(launch):
+  from profile import ram_cache
+  ram_cache_prefs = ram_cache.get_ram_cache_prefs(launch["profile"]) # opt-in (UWOLF_RAM_CACHE), {} keeps the cache on flash
+  librewolf_overrides.copy_librewolf_overrides_cfg(launch["profile"], launch["facts"].staged, launch["facts"], ram_cache_prefs) # copy librewolf settings overrides (True if Staged mode) plus the device's performance prefs
+
+def refresh_startup_cache(launch):
+  from profile import startup_cache
+  startup_cache.refresh_startup_cache(launch["profile"], force=launch["css_changed"]) # purge startupCache only if LibreWolf, chrome or overrides changed
+
+def start_focus_monitor(launch):
+  import focus_monitor
+  # started from this (the exec'ing) thread: the daemon is the browser's child and exits with it
+  launch["focus_daemon"] = focus_monitor.start_focus_daemon(launch["profile"]) # run monitor for osk focus pid in dbus
+  if launch["focus_daemon"] is None:
+      print("Failed to start focus daemon.")
+
+def set_environment(launch):
+  if launch["facts"].staged:
+    os.environ["MOZ_USE_XINPUT2"] = "1"
+    #os.environ["GDK_SCALE"]=str(float(os.environ["GRID_UNIT_PX"]/8)) # old
+    os.environ["GDK_DPI_SCALE"] = get_scaling(launch["facts"])
+    os.environ["GTK_IM_MODULE"] = "Maliit"
+    os.environ["GTK_IM_MODULE_FILE"] = "lib/@CLICK_ARCH@/gtk-3.0/3.0.0/immodules/immodules.cache"
+
+  set_display_backend()
+
+def set_display_backend():
+  # Explicitly force X11 backend for GTK applications like LibreWolf (will remove when mir2.x comes out)
+  os.environ["GDK_BACKEND"] = "x11" 
+  os.environ["DISABLE_WAYLAND"] = "1"
+
+  # Force Wayland
+  # os.environ["MOZ_ENABLE_WAYLAND"] = "1"
+
+def exec_browser(launch):
+  args = ["-P", launch["profile_name"]] if launch["profile_name"] else [] # chosen or marked default profile, otherwise librewolf picks its default
+  tracing.event("exec", staged=launch["facts"].staged, url=bool(launch["url"]))
+  tracing.flush() # last chance, exec replaces this process
+  try:
+    if launch["url"]:
+        # Pass the URL as an argument to librewolf
+        # The first argument to execlp after the executable name is argv[0] for the new process,
+        # so we repeat "bin/librewolf" and then add the actual arguments.
+        os.execlp("bin/AppRun", "bin/AppRun", *args, launch["url"])
+    else:
+        # If no URL is provided, just launch librewolf normally
+        os.execlp("bin/AppRun", "bin/AppRun", *args)
+  except:
+    pass
+
+#### END STARTUP STEPS ####
+
+#### START RUNNING INSTANCE ####
+# a browser already running on the profile gets the launch handed over: no probes, chrome sync or overrides
+# under its feet and no second focus daemon, AppRun's remote client passes the URL on and exits.
+
+def find_running_instance(profile_name):
+  """
+  Looks for a browser already running on the profile this launch would open.
+
+  Args:
+      profile_name (str): -P from the command line, $UWOLF_PROFILE or the default profile if None.
+
+  Returns:
+      tuple: (full_profile_path, profile_name, pid) of the running browser, None if there is none.
+  """
+  current_profile = profile.get_librewolf_default_profile(profile.get_home_dir(), profile_name) # registry is cached, no probes needed
+  if not current_profile:
+    return None
+  pid = profile.get_running_browser_pid(current_profile[0])
+  return (*current_profile, pid) if pid else None
+
+def forward_to_running_instance(running, url):
+  profile_path, profile_name, pid = running
+  print(f"LibreWolf is already running on profile '{profile_name}' (pid {pid}), handing the launch over to it.")
+  set_display_backend() # the remote client has to look for the browser where it runs
+  tracing.set_profile(profile_path)
+  tracing.event("forward", pid=pid, url=bool(url))
+  tracing.flush() # last chance, exec replaces this process
+  try:
+    os.execlp("bin/AppRun", "bin/AppRun", "-P", profile_name, *([url] if url else []))
+  except OSError as e:
+    print(f"Could not hand the launch over to the running browser: {e}")
+
+#### END RUNNING INSTANCE ####
+
+
+def build_startup_plan(facts) -> list:
+  """
+  Builds the ordered startup plan for the detected usage mode, so each launch only does the work its mode needs.
+
+  Args:
+      facts (DeviceFacts): probe results, at least usage_mode.
+
+  Returns:
+      list: (phase name, step function) pairs, run in order with the shared launch dict.
+  """
+  if facts.staged:
+    return [
+      ("probes", run_mode_probes),
+      ("profile", resolve_profile),
+      ("chrome", sync_chrome),
+      ("overrides", copy_overrides),
+      ("startup cache", refresh_startup_cache),
+      ("monitor", start_focus_monitor),
+      ("environment", set_environment),
+      ("exec", exec_browser),
+    ]
+  return [ # windowed/desktop mode: no OSK probes, chrome or focus monitor
+    ("probes", run_mode_probes),
+    ("profile", resolve_profile),
+    ("chrome", remove_chrome),
+    ("overrides", copy_overrides),
+    ("startup cache", refresh_startup_cache),
+    ("environment", set_environment),
+    ("exec", exec_browser),
+  ]
+
+
+def main(argv):
+  profile_name, url = parse_launch_args(argv)
+  with tracing.span("running instance"):
+    running = find_running_instance(profile_name)
+  if running is not None:
+    forward_to_running_instance(running, url)
+    return # only reached if exec failed, a second full launch would fail on the locked profile too
+
+  with tracing.span("mode probes"):
+    facts = probes.run_probes(probes.select(probes.MODE_PROBES)) # staged or windowed decides everything else
+  launch = {
+    "argv": argv,
+    "profile_name": profile_name, # -P, $UWOLF_PROFILE is resolved in resolve_profile
+    "url": url,
+    "facts": facts,
+    "profile": None,
+    "profiles": [], # every profile in profiles.ini, provisioned alongside the launched one
+    "css_changed": False, # system-parameters.css was rewritten this launch
+    "focus_daemon": None, # subprocess.Popen of focus_monitor.py, stopped here only if exec fails
+  }
+
+  for phase, step in build_startup_plan(launch["facts"]):
+    with tracing.span(phase):
+      step(launch)
+  tracing.flush() # only reached if exec failed
+
+  # only reached if exec failed, stop focus daemon
+  if launch["focus_daemon"] is not None:
+      import focus_monitor
+      focus_monitor.stop_focus_daemon(launch["focus_daemon"])
+      print("Focus daemon stopped successfully.")
+  else:
+      print("Focus daemon was not running, so no need to stop it.")
@@ -0,0 +1,215 @@
+import os
+import select
+import time
+from typing import NamedTuple
+
+from profile.perf_prefs import read_meminfo_kb
+
+# Memory pressure watcher for the focus daemon, which forwards its records to the chrome side
+# (osk_manager.sys.mjs unloads background tabs and minimizes memory when it gets one).
+#
+# Pressure is detected, in order of preference, by:
+#   psi-trigger: a PSI trigger on /proc/pressure/memory, the kernel wakes us (no polling, kernel >= 5.2,
+#                unprivileged only on newer kernels)
+#   psi-avg:     polling the "some avg10" stall percentage of /proc/pressure/memory
+#   meminfo:     polling MemAvailable in /proc/meminfo (most Ubuntu Touch kernels have no PSI)
+
+PSI_PATH = "/proc/pressure/memory"
+PSI_WINDOW_US = 2000000 # unprivileged PSI triggers need a multiple of 2s
+
+MODERATE = "moderate"
+CRITICAL = "critical"
+
+
+class PressureConfig(NamedTuple):
+    """
+    Thresholds of the watcher, see load_config for the environment variables.
+
+    Attributes:
+        stall_ms (int): memory stall time per 2s window (PSI "some") that counts as pressure.
+        min_available_mb (int): MemAvailable below this is pressure, below half of it critical.
+        interval (float): seconds between samples when PSI triggers are not available.
+        cooldown (float): minimum seconds between two records, tabs need time to unload.
+    """
+    stall_ms: int = 150
+    min_available_mb: int = 256
+    interval: float = 5.0
+    cooldown: float = 30.0
+
+
+CONFIG_ENV = {
+    "stall_ms": ("UWOLF_PRESSURE_STALL_MS", int),
+    "min_available_mb": ("UWOLF_PRESSURE_MIN_AVAILABLE_MB", int),
+    "interval": ("UWOLF_PRESSURE_INTERVAL", float),
+    "cooldown": ("UWOLF_PRESSURE_COOLDOWN", float),
+}
+
+
+def load_config(environ=None):
+    """
+    Reads the thresholds from the environment, UWOLF_PRESSURE=0 disables the watcher.
+
+    Returns:
+        PressureConfig: the configuration, None if disabled. Invalid values keep their default.
+    """
+    environ = os.environ if environ is None else environ
+    if environ.get("UWOLF_PRESSURE", "1") == "0":
+        return None
+    values = {}
+    for field, (name, convert) in CONFIG_ENV.items():
+        if name not in environ:
+            continue
+        try:
+            value = convert(environ[name])
+        except ValueError:
+            print(f"Ignoring invalid {name}={environ[name]!r}, using {PressureConfig._field_defaults[field]}.")
+            continue
+        if value > 0:
+            values[field] = value
+    return PressureConfig(**values)
+
+
+#### START READERS ####
+
+def read_mem_available_kb():
+    """
+    Returns MemAvailable in KiB, None if it cannot be read (kernels older than 3.14 do not have it).
+    """
+    try:
+        return read_meminfo_kb("MemAvailable")
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def read_psi_some_avg10(path: str = PSI_PATH):
+    """
+    Returns the "some avg10" stall percentage of the PSI file, None if PSI is not available.
+    """
+    try:
+        with open(path) as f:
+            for line in f:
+                if line.startswith("some "):
+                    for field in line.split()[1:]:
+                        key, _, value = field.partition("=")
+                        if key == "avg10":
+                            return float(value)
+    except (OSError, ValueError):
+        pass
+    return None
+
+#### END READERS ####
+
+
+class MemoryPressureWatcher:
+    """
+    Samples memory pressure and returns a record for the chrome side when it crosses the configured thresholds.
+
+    With a PSI trigger fileno() is pollable (readable when the kernel reports a stall) and interval is None,
+    otherwise the owner calls check() every interval seconds.
+    """
+
+    def __init__(self, config: PressureConfig):
+        self.config = config
+        self.mode = None
+        self.interval = config.interval
+        self._trigger_fd = None
+        self._epoll = None
+        self._next_sample = 0.0
+        self._last_record = -config.cooldown
+
+        if self._open_trigger():
+            self.mode = "psi-trigger"
+            self.interval = None
+        elif read_psi_some_avg10() is not None:
+            self.mode = "psi-avg"
+        elif read_mem_available_kb() is not None:
+            self.mode = "meminfo"
+
+    @classmethod
+    def create(cls, config: PressureConfig):
+        """
+        Returns a watcher, None if disabled (config is None) or the kernel exposes neither PSI nor MemAvailable.
+        """
+        if config is None:
+            return None
+        watcher = cls(config)
+        if watcher.mode is None:
+            print("Memory pressure watcher disabled, no PSI or MemAvailable on this kernel.")
+            return None
+        print(f"Memory pressure watcher started ({watcher.mode}, {config.stall_ms}ms stall / {config.min_available_mb}MiB available).")
+        return watcher
+
+    def _open_trigger(self) -> bool:
+        try:
+            fd = os.open(PSI_PATH, os.O_RDWR | os.O_NONBLOCK)
+        except OSError:
+            return False
+        try:
+            os.write(fd, f"some {self.config.stall_ms * 1000} {PSI_WINDOW_US}\0".encode())
+            # PSI triggers signal POLLPRI, wrapping them in an epoll gives the daemon's selector a plain readable fd
+            self._epoll = select.epoll()
+            self._epoll.register(fd, select.EPOLLPRI)
+        except OSError:
+            os.close(fd)
+            if self._epoll is not None:
+                self._epoll.close()
+                self._epoll = None
+            return False
+        self._trigger_fd = fd
+        return True
+
+    def fileno(self):
+        return self._epoll.fileno() if self._epoll is not None else None
+
+    def check(self, triggered: bool = False):
+        """
+        Samples pressure (only if triggered or interval elapsed since the last sample).
+
+        Args:
+            triggered (bool): fileno() was readable.
+
+        Returns:
+            dict: {"pressure": "moderate"|"critical", "mode", "avail_kb", "stall"}, None if there is
+                  no pressure or the last record is less than cooldown seconds old.
+        """
+        now = time.monotonic()
+        if triggered:
+            try:
+                self._epoll.poll(0) # drain
+            except OSError:
+                pass
+        elif self.interval is None or now < self._next_sample:
+            return None
+        else:
+            self._next_sample = now + self.interval
+
+        available_kb = read_mem_available_kb()
+        stall = read_psi_some_avg10() if self.mode != "meminfo" else None
+        min_available_kb = self.config.min_available_mb * 1024
+        stall_threshold = self.config.stall_ms * 100000 / PSI_WINDOW_US # stall time per window in percent
+
+        if self.mode == "psi-trigger":
+            pressure = triggered
+        elif self.mode == "psi-avg":
+            pressure = stall is not None and stall >= stall_threshold
+        else:
+            pressure = available_kb is not None and available_kb < min_available_kb
+        if not pressure or now - self._last_record < self.config.cooldown:
+            return None
+
+        critical = (available_kb is not None and available_kb < min_available_kb // 2) or (stall is not None and stall >= 4 * stall_threshold)
+        self._last_record = now
+        return {
+            "pressure": CRITICAL if critical else MODERATE,
+            "mode": self.mode,
+            "avail_kb": available_kb,
+            "stall": stall,
+        }
+
+    def close(self) -> None:
+        if self._epoll is not None:
+            self._epoll.close()
+            self._epoll = None
+        if self._trigger_fd is not None:
+            os.close(self._trigger_fd)
+            self._trigger_fd = None
@@ -1,15 +1,27 @@
 import os
 import shutil
-import filecmp # For comparing file contents
-from .keyboard import get_OSK_data # must be relative
+import tempfile
+
+from .chrome_manifest import ( # must be relative
+    DEPLOYED_MANIFEST_NAME, SHIPPED_MANIFEST_NAME,
+    build_manifest, file_digest, load_manifest, save_manifest,
+)
+from .fsutil import link_or_copy, write_if_changed # must be relative
+from . import tracing # must be relative
 
 
 #### START CHROME INIT ####
 
-def INIT_CHROME(profile_info : list, system_var_dict : dict):
+def INIT_CHROME(profile_info : list, system_var_dict : dict, facts=None) -> bool:
+    """
+    Syncs the custom chrome files and generates system-parameters.css for a profile.
+
+    Returns:
+        bool: True if system-parameters.css changed.
+    """
     if not profile_info or not profile_info[0]:
         print("Could not find a valid profile path. Probably first start or an error occurred.")
-        return
+        return False
 
     profile_path, profile_name = profile_info[0], profile_info[1]
 
@@ -17,28 +29,41 @@ def INIT_CHROME(profile_info : list, system_var_dict : dict):
 
     if not os.path.exists(profile_path):
         print(f"Error: Profile path does not exist! ({profile_path})")
-        return
+        return False
 
     destination_chrome_root = os.path.join(profile_path, "chrome") # save destination chrome folder path
 
-    copy_custom_chrome_files(destination_chrome_root) # copy chrome .css files
+    with tracing.span("chrome sync", profile=profile_name):
+        copy_custom_chrome_files(destination_chrome_root) # copy chrome .css files
 
-    generate_css_variables(destination_chrome_root, system_var_dict) ## generate css keyboard files
+    from .keyboard import get_OSK_data # must be relative, imported here so windowed launches never load OSK code
+    with tracing.span("css", profile=profile_name) as css_span:
+        changed = generate_css_variables(destination_chrome_root, system_var_dict, get_OSK_data(facts)) ## generate css keyboard files
+        css_span.set(changed=changed)
+    return changed
 
 #### END CHROME INIT ####
 
 #### START GENERATE KEYBOARD PARAMETERS ####
 
-def generate_css_variables(destination_chrome_root, system_var_dict,  data_dict: dict = get_OSK_data(), filename="system-parameters"):
+def generate_css_variables(destination_chrome_root, system_var_dict,  data_dict: dict = None, filename="system-parameters") -> bool:
     """
     Generates a CSS file with variables from a Python dictionary.
+    The file is rendered in memory and only replaced (atomically) if its content changed,
+    so the browser's cached chrome stylesheets stay valid across launches.
 
     Args:
         destination_chrome_root (path): path to chrome.
         system_var_dict (dict): has info about screen type/scaling amount.
-        data_dict (dict): The dictionary containing your values.
+        data_dict (dict): The dictionary containing your values (probed with get_OSK_data() if None).
         filename (str): The name of the CSS file to create.
+
+    Returns:
+        bool: True if the file was written, False if it was unchanged or could not be written.
     """
+    if data_dict is None:
+        from .keyboard import get_OSK_data # must be relative
+        data_dict = get_OSK_data()
 
     # For testing purposes, you can uncomment this:
     #data_dict = {
@@ -79,25 +104,102 @@ def generate_css_variables(destination_chrome_root, system_var_dict,  data_dict:
     css_content += "}\n"
 
     try:
-        with open(full_filepath, "w") as f:
-            f.write(css_content)
+        if not write_if_changed(full_filepath, css_content):
+            print(f"CSS variables in {full_filepath} are unchanged.")
+            return False
         print(f"CSS variables saved to {full_filepath}")
+        return True
     except OSError as e:
         print(f"Error writing to file '{full_filepath}': {e}")
+        return False
 
 #### END GENERATE KEYBOARD PARAMETERS ####
 
 #### START CUSTOM PROFILE CREATION ####
+
+# Files the browser side owns once they exist: copied only if missing, never overwritten or deleted by the sync.
+PRESERVED_FILES = frozenset((
+    "CSS/system-parameters.css", # generated by generate_css_variables
+    "JS/osk_overlay_config.js", # signal record rewritten by the focus daemon
+    "JS/osk_overlay_config.js.tmp",
+    DEPLOYED_MANIFEST_NAME,
+    DEPLOYED_MANIFEST_NAME + ".tmp",
+))
+
+
+def load_source_manifest(source_chrome_dir) -> dict:
+    """
+    Returns the manifest shipped next to source_chrome_dir (written by scripts/build.sh),
+    or builds one on the fly if it is missing (e.g. running from a source checkout).
+    """
+    manifest = load_manifest(os.path.join(os.path.dirname(source_chrome_dir), SHIPPED_MANIFEST_NAME))
+    if manifest is None:
+        print("No shipped chrome manifest found, hashing source 'chrome' directory.")
+        manifest = build_manifest(source_chrome_dir)
+    return manifest
+
+
+def scan_chrome_tree(chrome_root):
+    """
+    Walks chrome_root once.
+
+    Returns:
+        tuple: ({relative file path: size}, {relative dir path})
+    """
+    files = {}
+    dirs = set()
+    for dirpath, dirnames, filenames in os.walk(chrome_root):
+        rel_dir = os.path.relpath(dirpath, chrome_root)
+        if rel_dir != ".":
+            dirs.add(rel_dir.replace(os.sep, "/"))
+        for filename in filenames:
+            rel_path = os.path.normpath(os.path.join(rel_dir, filename)).replace(os.sep, "/")
+            try:
+                files[rel_path] = os.lstat(os.path.join(dirpath, filename)).st_size
+            except OSError:
+                pass # vanished while walking
+    return files, dirs
+
+
+def _tree_matches(manifest, present_files, present_dirs) -> bool:
+    if present_dirs != set(manifest["dirs"]):
+        return False
+    for rel_path, (size, _) in manifest["files"].items():
+        if rel_path in PRESERVED_FILES:
+            if rel_path not in present_files:
+                return False
+        elif present_files.get(rel_path) != size:
+            return False
+    return all(rel_path in manifest["files"] or rel_path in PRESERVED_FILES for rel_path in present_files)
+
+
+def _is_unchanged(rel_path, entry, present_files, deployed_files, chrome_root) -> bool:
+    """
+    Checks if the deployed copy of a shipped file still has the manifest's content.
+    """
+    size, digest = entry
+    if present_files.get(rel_path) != size:
+        return False
+    recorded = deployed_files.get(rel_path)
+    if recorded == entry:
+        return True # deployed from the same content last time
+    return recorded is None and file_digest(os.path.join(chrome_root, rel_path)) == digest # no record (first manifest sync), compare content once
+
+
 def copy_custom_chrome_files(destination_chrome_root):
     """
-    Copies files from the script's 'chrome/' directory to the specified
-    Librewolf profile's 'chrome/' directory. Only copies files that are new
-    or have changed content. It also creates necessary subdirectories.
+    Syncs the script's 'chrome/' directory to the specified Librewolf profile's 'chrome/' directory,
+    driven by the manifest (path, size, sha256) of the shipped tree.
+
+    A copy of the manifest is kept in the destination, so when nothing changed the sync costs
+    one walk of the destination and one digest comparison. Otherwise a new tree is staged
+    (see deploy_chrome_tree) and switched into place, or, if that fails, only new or changed
+    files are copied in place and extraneous files/directories are deleted.
 
     Args:
         destination_chrome_root (path): a path to profile/chrome.
     """
-    
+
     # Define paths
     script_dir = os.path.dirname(os.path.abspath(__file__))
     source_chrome_dir = os.path.join(script_dir, "chrome")
@@ -110,6 +212,154 @@ def copy_custom_chrome_files(destination_chrome_root):
         print(f"Error: Source '{source_chrome_dir}' is not a directory. Skipping copy.")
         return
 
+    manifest = load_source_manifest(source_chrome_dir)
+    if not os.path.lexists(destination_chrome_root):
+        restore_chrome_link(destination_chrome_root, manifest)
+    deployed_manifest = load_manifest(os.path.join(destination_chrome_root, DEPLOYED_MANIFEST_NAME))
+    present_files, present_dirs = scan_chrome_tree(destination_chrome_root)
+
+    # 2. Common case, same manifest as last launch and the tree still looks like it
+    if deployed_manifest and deployed_manifest["digest"] == manifest["digest"] and _tree_matches(manifest, present_files, present_dirs):
+        print("Custom 'chrome' files are up to date.")
+        return
+
+    deployed_files = deployed_manifest["files"] if deployed_manifest else {}
+
+    # 3. Stage a complete tree and switch it in with one rename
+    try:
+        deploy_chrome_tree(destination_chrome_root, source_chrome_dir, manifest, present_files, deployed_files)
+        return
+    except OSError as e:
+        print(f"Error staging 'chrome' directory ({e}), syncing in place instead.")
+
+    sync_chrome_in_place(destination_chrome_root, source_chrome_dir, manifest, present_files, present_dirs, deployed_files)
+
+
+def restore_chrome_link(destination_chrome_root, manifest):
+    """
+    Puts back a profile/chrome that is missing but still staged in the profile:
+      - a real directory moved aside by an interrupted migration (see deploy_chrome_tree) is moved back
+      - a staged tree of the same manifest, left by delete() when switching to windowed mode, is pointed at again
+
+    Args:
+        destination_chrome_root (path): a path to profile/chrome.
+        manifest (dict): manifest of the shipped chrome tree.
+    """
+    profile_path = os.path.dirname(destination_chrome_root)
+    try:
+        names = sorted(os.listdir(profile_path))
+    except OSError:
+        return
+
+    for name in names:
+        old_chrome = os.path.join(profile_path, name, "chrome")
+        if name.startswith(".chrome-old-") and os.path.isdir(old_chrome) and not os.path.islink(old_chrome):
+            try:
+                os.rename(old_chrome, destination_chrome_root)
+                print(f"Recovered 'chrome' directory from an interrupted migration ({name}).")
+                return
+            except OSError as e:
+                print(f"Error recovering 'chrome' directory from {name}: {e}")
+
+    prefix = ".chrome-" + manifest["digest"][:12] + "-"
+    for name in names:
+        staged_root = os.path.join(profile_path, name)
+        if not name.startswith(prefix) or os.path.islink(staged_root):
+            continue
+        deployed_manifest = load_manifest(os.path.join(staged_root, DEPLOYED_MANIFEST_NAME))
+        if deployed_manifest and deployed_manifest["digest"] == manifest["digest"]:
+            link_path = destination_chrome_root + ".new"
+            try:
+                if os.path.lexists(link_path):
+                    os.unlink(link_path)
+                os.symlink(name, link_path)
+                os.replace(link_path, destination_chrome_root)
+                print(f"Switched 'chrome' back to {staged_root}.")
+            except OSError as e:
+                print(f"Error switching 'chrome' back to {staged_root}: {e}")
+            return
+
+
+def deploy_chrome_tree(destination_chrome_root, source_chrome_dir, manifest, present_files, deployed_files):
+    """
+    Builds the new chrome tree next to the profile's chrome directory and points profile/chrome at it.
+
+    profile/chrome becomes a symlink to a hidden '.chrome-<digest>-xxxx' directory, so replacing the
+    symlink is the single rename that switches versions and the browser never sees a half-written tree.
+    Unchanged files are hardlinked from the current tree, shipped files are hardlinked/reflinked from the
+    click package when it shares the filesystem (fsutil.link_or_copy), preserved files are always copied.
+
+    Args:
+        destination_chrome_root (path): a path to profile/chrome.
+        source_chrome_dir (path): shipped chrome tree.
+        manifest (dict): manifest of the shipped chrome tree.
+        present_files (dict): scan_chrome_tree result for destination_chrome_root.
+        deployed_files (dict): files of the manifest recorded at the last deployment.
+
+    Raises:
+        OSError: if the tree could not be staged or switched, the current tree is left untouched.
+    """
+    profile_path = os.path.dirname(destination_chrome_root)
+    staged_root = tempfile.mkdtemp(prefix=".chrome-" + manifest["digest"][:12] + "-", dir=profile_path)
+    os.chmod(staged_root, 0o755)
+    methods = {}
+
+    try:
+        for rel_dir in manifest["dirs"]:
+            os.makedirs(os.path.join(staged_root, rel_dir), exist_ok=True)
+
+        for rel_path, entry in manifest["files"].items():
+            staged_file_path = os.path.join(staged_root, rel_path)
+            current_file_path = os.path.join(destination_chrome_root, rel_path)
+
+            if rel_path in PRESERVED_FILES: # mutable, must never share an inode with the package
+                shutil.copy2(current_file_path if rel_path in present_files else os.path.join(source_chrome_dir, rel_path), staged_file_path)
+                method = "copy"
+            elif _is_unchanged(rel_path, entry, present_files, deployed_files, destination_chrome_root):
+                method = link_or_copy(current_file_path, staged_file_path) # same profile, nearly always a hardlink
+            else:
+                print(f"File '{rel_path}' is new or changed. Deploying...")
+                method = link_or_copy(os.path.join(source_chrome_dir, rel_path), staged_file_path)
+            methods[method] = methods.get(method, 0) + 1
+
+        for rel_path in present_files: # generated files that are not shipped (system-parameters.css)
+            if rel_path in PRESERVED_FILES and rel_path not in manifest["files"] and not rel_path.startswith(DEPLOYED_MANIFEST_NAME):
+                staged_file_path = os.path.join(staged_root, rel_path)
+                os.makedirs(os.path.dirname(staged_file_path), exist_ok=True)
+                shutil.copy2(os.path.join(destination_chrome_root, rel_path), staged_file_path)
+
+        save_manifest(manifest, os.path.join(staged_root, DEPLOYED_MANIFEST_NAME))
+
+        # switch: a real directory (older uWolf) is moved aside once, from then on it is a single symlink replace.
+        # That one-time migration takes two renames (a directory can not be replaced by a symlink), if it is
+        # interrupted between them restore_chrome_link moves the directory back on the next launch.
+        link_path = destination_chrome_root + ".new"
+        if os.path.lexists(link_path):
+            os.unlink(link_path)
+        os.symlink(os.path.basename(staged_root), link_path)
+        if os.path.isdir(destination_chrome_root) and not os.path.islink(destination_chrome_root):
+            os.rename(destination_chrome_root, tempfile.mkdtemp(prefix=".chrome-old-", dir=profile_path) + "/chrome")
+        os.replace(link_path, destination_chrome_root)
+    except BaseException:
+        shutil.rmtree(staged_root, ignore_errors=True)
+        raise
+
+    print(f"Deployed 'chrome' {manifest['digest'][:12]} to {staged_root} ({', '.join(f'{count} {method}' for method, count in sorted(methods.items()))})")
+
+    # cleanup: the replaced tree and leftovers of interrupted deployments
+    for name in os.listdir(profile_path):
+        path = os.path.join(profile_path, name)
+        if name.startswith(".chrome-") and path != staged_root and not os.path.islink(path):
+            shutil.rmtree(path, ignore_errors=True)
+
+
+def sync_chrome_in_place(destination_chrome_root, source_chrome_dir, manifest, present_files, present_dirs, deployed_files):
+    """
+    Copies new or changed files into the existing chrome tree and deletes extraneous entries.
+    Fallback of deploy_chrome_tree, arguments are the same plus present_dirs from scan_chrome_tree.
+    """
+    failed = False
+
     # Ensure the root destination 'chrome' directory exists
     if not os.path.exists(destination_chrome_root):
         print(f"Creating destination 'chrome' root directory: {destination_chrome_root}")
@@ -119,89 +369,64 @@ def copy_custom_chrome_files(destination_chrome_root):
             print(f"Error creating destination 'chrome' root directory: {e}")
             return
 
-    # Walk through the source 'chrome' directory tree
-    for dirpath, dirnames, filenames in os.walk(source_chrome_dir):
-        # Calculate the relative path from the source_chrome_dir to the current directory (dirpath)
-        # E.g., if source_chrome_dir is /path/to/script/chrome
-        # and dirpath is /path/to/script/chrome/subfolder
-        # rel_path will be "subfolder"
-        rel_path = os.path.relpath(dirpath, source_chrome_dir)
-
-        # Construct the corresponding full path in the destination profile's 'chrome' directory
-        current_destination_dir = os.path.join(destination_chrome_root, rel_path)
-
-        # Ensure the current destination subdirectory exists
-        if not os.path.exists(current_destination_dir):
+    # Create missing directories (sorted, parents first)
+    for rel_dir in manifest["dirs"]:
+        if rel_dir not in present_dirs:
+            current_destination_dir = os.path.join(destination_chrome_root, rel_dir)
             print(f"Creating directory: {current_destination_dir}")
             try:
-                os.makedirs(current_destination_dir)
+                os.makedirs(current_destination_dir, exist_ok=True)
             except OSError as e:
-                print(f"Error creating directory {current_destination_dir}: {e}. Skipping files in this directory.")
-                continue # Skip processing files in this problematic directory
+                print(f"Error creating directory {current_destination_dir}: {e}")
+                failed = True
+
+    # Copy new or changed files
+    for rel_path, entry in manifest["files"].items():
+        source_file_path = os.path.join(source_chrome_dir, rel_path)
+        destination_file_path = os.path.join(destination_chrome_root, rel_path)
+
+        if rel_path in present_files:
+            if rel_path in PRESERVED_FILES or _is_unchanged(rel_path, entry, present_files, deployed_files, destination_chrome_root):
+                continue
+            print(f"File '{rel_path}' differs. Overwriting...")
+        else:
+            print(f"File '{rel_path}' does not exist in destination. Copying...")
 
-        # Process each file in the current directory
-        for filename in filenames:
-            source_file_path = os.path.join(dirpath, filename)
-            destination_file_path = os.path.join(current_destination_dir, filename)
-
-            should_copy = False
-            if os.path.exists(destination_file_path):
-                # Compare file contents (shallow=False for full content comparison)
-                try:
-                    if filecmp.cmp(source_file_path, destination_file_path, shallow=False):
-                        # print(f"File '{filename}' is identical. Skipping.") # Uncomment for verbose output of identical files
-                        pass
-                    else:
-                        print(f"File '{filename}' differs. Overwriting...")
-                        should_copy = True
-                        # Remove existing file before copying new one to avoid potential issues
-                        try:
-                            os.remove(destination_file_path)
-                        except OSError as e:
-                            print(f"Error removing existing file {destination_file_path} before overwrite: {e}. Skipping this file.")
-                            continue # Skip this file if removal fails
-                except OSError as e:
-                    print(f"Error comparing files '{source_file_path}' and '{destination_file_path}': {e}. Attempting to overwrite.")
-                    should_copy = True # Assume different if comparison fails
-            else:
-                print(f"File '{filename}' does not exist in destination. Copying...")
-                should_copy = True
-
-            if should_copy:
-                try:
-                    # shutil.copy2 preserves metadata (like modification times, permissions)
-                    shutil.copy2(source_file_path, destination_file_path)
-                    print(f"Copied: {source_file_path} to {destination_file_path}")
-                except Exception as e:
-                    print(f"Error copying file {source_file_path} to {destination_file_path}: {e}")
-        
-        for dirpath, dirnames, filenames in os.walk(destination_chrome_root, topdown=False): # topdown=False for deleting subdirs first
-            rel_path = os.path.relpath(dirpath, destination_chrome_root)
-            current_source_dir = os.path.join(source_chrome_dir, rel_path)
-
-            # Delete extraneous files
-            for filename in filenames:
-                destination_file_path = os.path.join(dirpath, filename)
-                source_file_path = os.path.join(current_source_dir, filename)
-
-                if not os.path.exists(source_file_path):
-                    print(f"Deleting extraneous file: {destination_file_path}")
-                    try:
-                        os.remove(destination_file_path)
-                    except OSError as e:
-                        print(f"Error deleting file {destination_file_path}: {e}")
-
-            # Delete extraneous directories (only if empty after file deletions, or if not in source)
-            if dirpath != destination_chrome_root: # Don't delete the root destination_chrome_root itself
-                if not os.path.exists(current_source_dir):
-                    if not os.listdir(dirpath): # Check if directory is empty
-                        print(f"Deleting extraneous empty directory: {dirpath}")
-                        try:
-                            os.rmdir(dirpath)
-                        except OSError as e:
-                            print(f"Error deleting empty directory {dirpath}: {e}")
-                    else:
-                        pass # Leave non-empty extraneous directories if they weren't in source
+        try:
+            # shutil.copy2 preserves metadata (like modification times, permissions)
+            shutil.copy2(source_file_path, destination_file_path)
+            print(f"Copied: {source_file_path} to {destination_file_path}")
+        except Exception as e:
+            print(f"Error copying file {source_file_path} to {destination_file_path}: {e}")
+            failed = True
+
+    # Delete extraneous files, then extraneous directories that are empty now (deepest first)
+    for rel_path in present_files:
+        if rel_path not in manifest["files"] and rel_path not in PRESERVED_FILES:
+            destination_file_path = os.path.join(destination_chrome_root, rel_path)
+            print(f"Deleting extraneous file: {destination_file_path}")
+            try:
+                os.remove(destination_file_path)
+            except OSError as e:
+                print(f"Error deleting file {destination_file_path}: {e}")
+
+    shipped_dirs = set(manifest["dirs"])
+    for rel_dir in sorted(present_dirs - shipped_dirs, reverse=True):
+        dirpath = os.path.join(destination_chrome_root, rel_dir)
+        try:
+            if not os.listdir(dirpath): # Leave non-empty extraneous directories (user or preserved files)
+                print(f"Deleting extraneous empty directory: {dirpath}")
+                os.rmdir(dirpath)
+        except OSError as e:
+            print(f"Error deleting empty directory {dirpath}: {e}")
+
+    # Record what was deployed, a failed copy leaves the old record so the next launch retries
+    deployed_manifest_path = os.path.join(destination_chrome_root, DEPLOYED_MANIFEST_NAME)
+    if not failed:
+        try:
+            save_manifest(manifest, deployed_manifest_path)
+        except OSError as e:
+            print(f"Error writing chrome manifest '{deployed_manifest_path}': {e}")
 
 #### END CUSTOM PROFILE CREATION ####
 
@@ -232,7 +457,10 @@ def delete(profile_info):
         print(f"Error destination 'chrome' root directory does not exist, nothing to do.")
     
     try:
-        os.rmdir(destination_chrome_root)
+        if os.path.islink(destination_chrome_root): # staged deployment, see deploy_chrome_tree
+            os.unlink(destination_chrome_root) # the staged tree is kept, switching back only points at it again (restore_chrome_link)
+        else:
+            os.rmdir(destination_chrome_root)
     except OSError as e:
         print(f"Error deleting root 'chrome' directory {destination_chrome_root}: {e}")
 
@@ -1,14 +1,12 @@
 // ==UserScript==
 // @name          OSK Config Trigger
-// @description   Periodically sends a command to the OSK Manager to read the config file, and sends hide commands based on clicks, Enter presses, and a double-hide on page load events.
+// @description   Sends hide commands to the OSK Manager based on clicks, Enter presses, and a double-hide on page load events (showing is pushed to the manager by the focus daemon).
 // @onlyonce
 // @include       chrome://browser/content/browser.xhtml
 // ==/UserScript==
 
-const READ_INTERVAL_MS = 200; // The interval for triggering the config read
 const DOUBLE_HIDE_DELAY_MS = 150; // Delay for the second HIDE command after page events
 const DEBUG_MODE = true;
-const CUSTOM_EVENT_READ_CONFIG = "OSK_READ_CONFIG_COMMAND"; // To tell manager to read file (for show)
 const CUSTOM_EVENT_HIDE_OSK = "OSK_HIDE_COMMAND"; // Command to hide the OSK
 
 function log(...args) {
@@ -21,17 +19,12 @@ log("OSK Config Trigger Script: Initializing.");
 
 /**
  * Dispatches a custom command message to the OSK Manager.
- * @param {string} type - The type of command (e.g., CUSTOM_EVENT_READ_CONFIG, CUSTOM_EVENT_HIDE_OSK).
+ * @param {string} type - The type of command (e.g., CUSTOM_EVENT_HIDE_OSK).
  */
 function dispatchCommand(type) {
   window.postMessage({ type: type }, "*"); // "*" for any origin
 }
 
-// Function to periodically dispatch the config read command
-function periodicallyReadConfigCommand() {
-  dispatchCommand(CUSTOM_EVENT_READ_CONFIG);
-}
-
 /**
  * Handles global click events to detect unfocus.
  * If a click occurs anywhere on the screen, it dispatches the OSK_HIDE_COMMAND.
@@ -68,9 +61,6 @@ function dispatchDoubleHide(eventName) {
   }, DOUBLE_HIDE_DELAY_MS);
 }
 
-// Start the continuous dispatching process for config read
-setInterval(periodicallyReadConfigCommand, READ_INTERVAL_MS);
-
 // Add a global click listener to detect clicks anywhere on the document body
 window.addEventListener('click', handleClickAnywhere, true); // Use capture phase for reliability
 
@@ -90,4 +80,4 @@ window.addEventListener('pageshow', () => { // For back/forward button navigatio
   dispatchDoubleHide('Pageshow');
 }, false);
 
-log(`OSK Config Trigger Script: Will dispatch '${CUSTOM_EVENT_READ_CONFIG}' every ${READ_INTERVAL_MS}ms. Also listening for any clicks, Enter key presses, and performing a double-hide on page load events.`);
\ No newline at end of file
+log("OSK Config Trigger Script: Listening for any clicks, Enter key presses, and performing a double-hide on page load events.");
\ No newline at end of file
@@ -1,6 +1,6 @@
 // ==UserScript==
 // @name OSK Manager (Config Driven)
-// @description Manages OSK overlay visibility based on commands from the trigger script.
+// @description Manages OSK overlay visibility based on commands from the trigger script, and unloads background tabs on memory pressure records from the focus daemon.
 // @onlyonce
 // ==/UserScript==
 
@@ -8,8 +8,14 @@ import { Windows } from "chrome://userchromejs/content/uc_api.sys.mjs";
 
 const CONFIG_FILE_URL = "chrome://userscripts/content/osk_overlay_config.js";
 const DEBUG_MODE = true;
-const CUSTOM_EVENT_READ_CONFIG = "OSK_READ_CONFIG_COMMAND";
 const CUSTOM_EVENT_HIDE_OSK = "OSK_HIDE_COMMAND";
+const PUSH_SOCKET_NAME = "uwolf-focus.sock"; // focus daemon push channel, in the profile directory
+const FALLBACK_POLL_INTERVAL_MS = 200; // Only used while the push channel is unavailable
+const PUSH_RECONNECT_DELAY_MS = 5000;
+const LATENCY_STATS_FILE = "uwolf-osk-latency.json"; // rolling OSK latency stats, in the profile directory
+const LATENCY_WINDOW = 256; // Samples kept per stage
+const LATENCY_FLUSH_DELAY_MS = 10000; // Stats are written once focus signals have been quiet this long
+const PRESSURE_TABS_TO_UNLOAD = { moderate: 1, critical: 3 }; // Background tabs unloaded per memory pressure record
 
 function log(...args) {
   if (DEBUG_MODE) {
@@ -19,8 +25,120 @@ function log(...args) {
 
 log("OSK Manager Script: Initializing.");
 
+/**
+ * Wall clock time in microseconds, comparable with the focus daemon's timestamps.
+ * @returns {number}
+ */
+function nowMicros() {
+  if (typeof performance !== "undefined") {
+    return Math.round((performance.timeOrigin + performance.now()) * 1000);
+  }
+  return Date.now() * 1000;
+}
+
+/**
+ * Keeps the last LATENCY_WINDOW samples of every stage of the OSK path
+ * (D-Bus call -> record published -> record read -> CSS class flip) in ring buffers,
+ * and writes p50/p95/p99 to LATENCY_STATS_FILE once signals go quiet.
+ * Adding a sample is a few array writes, so it stays enabled in production.
+ */
+class LatencyRecorder {
+  static STAGES = ["dbus-to-publish", "publish-to-read", "read-to-flip", "total"];
+
+  constructor() {
+    this.samples = {};
+    for (const stage of LatencyRecorder.STAGES) {
+      this.samples[stage] = new Float64Array(LATENCY_WINDOW);
+    }
+    this.count = 0;
+    this.flushTimer = null;
+  }
+
+  /**
+   * @param {object} record - The applied signal record (ts/pub in microseconds).
+   * @param {number} readUs - When the record was read.
+   * @param {number} flipUs - When the CSS classes were updated.
+   */
+  add(record, readUs, flipUs) {
+    if (!record.ts || !record.pub) {
+      return; // Initial record, not a focus signal
+    }
+    const slot = this.count % LATENCY_WINDOW;
+    this.samples["dbus-to-publish"][slot] = (record.pub - record.ts) / 1000;
+    this.samples["publish-to-read"][slot] = (readUs - record.pub) / 1000;
+    this.samples["read-to-flip"][slot] = (flipUs - readUs) / 1000;
+    this.samples["total"][slot] = (flipUs - record.ts) / 1000;
+    this.count++;
+
+    if (this.flushTimer !== null) {
+      clearTimeout(this.flushTimer);
+    }
+    this.flushTimer = setTimeout(() => this.flush(), LATENCY_FLUSH_DELAY_MS);
+  }
+
+  summary() {
+    const filled = Math.min(this.count, LATENCY_WINDOW);
+    const stages = {};
+    for (const stage of LatencyRecorder.STAGES) {
+      const sorted = this.samples[stage].slice(0, filled).sort();
+      const percentile = p => sorted[Math.min(filled - 1, Math.floor(p * filled))];
+      stages[stage] = {
+        p50: percentile(0.5),
+        p95: percentile(0.95),
+        p99: percentile(0.99),
+        max: sorted[filled - 1],
+      };
+    }
+    return {
+      unit: "ms",
+      samples: filled,
+      total_signals: this.count,
+      updated: new Date().toISOString(),
+      version: Services.appinfo.version,
+      stages,
+    };
+  }
+
+  async flush() {
+    this.flushTimer = null;
+    if (this.count === 0) {
+      return;
+    }
+    try {
+      await IOUtils.writeJSON(PathUtils.join(PathUtils.profileDir, LATENCY_STATS_FILE), this.summary(), {
+        tmpPath: PathUtils.join(PathUtils.profileDir, LATENCY_STATS_FILE + ".tmp"),
+      });
+    } catch (error) {
+      console.error("[OSK Manager] Error writing latency stats:", error);
+    }
+  }
+}
+
+const latencyRecorder = new LatencyRecorder();
+
 let currentOSKOverlayState = false; // false = hidden, true = shown
-let lastConfigFileCharCount = -1; // Initialize with -1 to ensure first read triggers a show
+let lastSignalSeq = -1; // Sequence number of the last applied focus signal record
+let lastConfigFileCharCount = -1; // Only used for the legacy append format (older uWolf daemons)
+let fallbackPollTimer = null; // The one poller of the process, shared by all windows
+let reconnectTimer = null;
+let pendingRead = null; // In-flight read of the signal file, concurrent reads share it
+const browserWindows = new Set(); // Browser windows with a loaded document
+let pushOutput = null; // Write side of the push channel, reports window activity to the daemon
+let lastReportedActive = null;
+
+/**
+ * Sets the OSK classes of one window's root element.
+ * @param {Window} win - A browser window.
+ * @param {boolean} show - True to show, false to hide the overlay.
+ */
+function applyOverlayClasses(win, show) {
+  const root = win.document && win.document.documentElement;
+  if (!root) {
+    return;
+  }
+  root.classList.toggle('osk-input-focused', show);
+  root.classList.toggle('osk-hidden', !show);
+}
 
 /**
  * Updates the actual OSK overlay visibility across all browser windows.
@@ -36,33 +154,113 @@ function setOSKOverlayState(show) {
   currentOSKOverlayState = show; // Update the internal state.
   log("OSK overlay state changed to:", show ? "SHOW" : "HIDE");
 
-  Windows.forEach((doc, win) => {
-    // Only target main browser windows and ensure they have the <html> element
-    if (Windows.isBrowserWindow(win) && win.document && win.document.documentElement) {
-      if (show) {
-        win.document.documentElement.classList.remove('osk-hidden');
-        win.document.documentElement.classList.add('osk-input-focused');
-      } else {
-        win.document.documentElement.classList.remove('osk-input-focused');
-        win.document.documentElement.classList.add('osk-hidden');
+  // One pass over the tracked windows, no window enumeration per state change.
+  for (const win of browserWindows) {
+    applyOverlayClasses(win, show);
+  }
+}
+
+/**
+ * Parses the fixed-size signal record written by the focus daemon:
+ * {"seq": <n>, "ts": <unix µs, bus message received>, "pub": <unix µs, record published>, "focused": 0|1}
+ * @param {string} content - The file content.
+ * @returns {object|null} The record, or null if the file is in the legacy append format.
+ */
+function parseSignalRecord(content) {
+  try {
+    const record = JSON.parse(content);
+    return typeof record.seq === "number" ? record : null;
+  } catch (error) {
+    return null;
+  }
+}
+
+/**
+ * Handles a memory pressure record pushed by the focus daemon ({"pressure": "moderate"|"critical", "avail_kb", ...}):
+ * unloads the least recently used background tabs across all windows, then asks Gecko to minimize memory.
+ * The daemon rate-limits records, so this runs at most once per cooldown.
+ * @param {object} record - The pressure record.
+ */
+function handleMemoryPressure(record) {
+  const count = PRESSURE_TABS_TO_UNLOAD[record.pressure] || 1;
+  const candidates = [];
+  for (const win of browserWindows) {
+    if (!win.gBrowser) {
+      continue;
+    }
+    for (const tab of win.gBrowser.tabs) {
+      // Skip visible, pinned and playing tabs, and tabs that are already unloaded (no linked browser)
+      if (tab.selected || tab.pinned || tab.soundPlaying || !tab.linkedPanel) {
+        continue;
       }
+      candidates.push({ tab, gBrowser: win.gBrowser });
+    }
+  }
+  candidates.sort((a, b) => a.tab.lastAccessed - b.tab.lastAccessed);
+
+  const unloaded = [];
+  for (const { tab, gBrowser } of candidates.slice(0, count)) {
+    try {
+      gBrowser.discardBrowser(tab);
+      unloaded.push(tab.label);
+    } catch (error) {
+      console.error("[OSK Manager] Error unloading tab:", error);
     }
-  }, true);
+  }
+  console.info(`[OSK Manager] Memory pressure (${record.pressure}, ${record.avail_kb} kB available): unloaded ${unloaded.length} background tab(s)`, unloaded);
+
+  const memoryManager = Cc["@mozilla.org/memory-reporter-manager;1"].getService(Ci.nsIMemoryReporterManager);
+  memoryManager.minimizeMemoryUsage(() => console.info("[OSK Manager] Memory minimized after pressure record."));
 }
 
 /**
- * Reads the content of the configuration file, compares character count,
- * and updates the OSK state if the count has changed.
+ * Shows the OSK overlay when the daemon reported a new focus request (the sequence number changed).
+ * @param {object} record - A parsed signal record.
+ * @param {number} readUs - When the record was read (nowMicros()).
  */
-async function readAndApplyConfigState() {
+function applySignalRecord(record, readUs) {
+  if (record.seq === lastSignalSeq) {
+    return;
+  }
+  lastSignalSeq = record.seq;
+  if (record.focused) {
+    log(`New focus signal ${record.seq}. Showing OSK.`);
+    setOSKOverlayState(true);
+    latencyRecorder.add(record, readUs, nowMicros());
+  }
+}
+
+/**
+ * Reads the signal record file and applies it, used while the push channel is unavailable.
+ * Calls made while a read is in flight get that read's promise instead of fetching again.
+ * @returns {Promise<void>}
+ */
+function readAndApplyConfigState() {
+  if (pendingRead === null) {
+    pendingRead = readConfigState().finally(() => {
+      pendingRead = null;
+    });
+  }
+  return pendingRead;
+}
+
+async function readConfigState() {
   try {
     const response = await fetch(CONFIG_FILE_URL);
     if (!response.ok) {
       throw new Error(`Failed to fetch config file: ${response.statusText}`);
     }
     const configContent = await response.text();
-    const currentCharCount = configContent.length;
+    const readUs = nowMicros();
+    const record = parseSignalRecord(configContent);
+
+    if (record) {
+      applySignalRecord(record, readUs);
+      return;
+    }
 
+    // Legacy append format (older uWolf daemons): every appended line is a focus request.
+    const currentCharCount = configContent.length;
     if (currentCharCount !== lastConfigFileCharCount) {
       log("Character count has changed. Showing OSK.");
       setOSKOverlayState(true);
@@ -75,7 +273,126 @@ async function readAndApplyConfigState() {
 }
 
 /**
- * Handles messages received from osk_config_trigger.uc.mjs.
+ * Polls the signal file until the push channel can be reconnected.
+ */
+function startFallbackPolling() {
+  if (fallbackPollTimer === null) {
+    log(`Push channel unavailable, polling every ${FALLBACK_POLL_INTERVAL_MS}ms.`);
+    readAndApplyConfigState();
+    fallbackPollTimer = setInterval(readAndApplyConfigState, FALLBACK_POLL_INTERVAL_MS);
+  }
+  if (reconnectTimer === null) {
+    reconnectTimer = setTimeout(() => {
+      reconnectTimer = null;
+      connectPushChannel();
+    }, PUSH_RECONNECT_DELAY_MS);
+  }
+}
+
+function stopFallbackPolling() {
+  if (fallbackPollTimer !== null) {
+    clearInterval(fallbackPollTimer);
+    fallbackPollTimer = null;
+    log("Push channel connected, polling stopped.");
+  }
+}
+
+/**
+ * Connects to the focus daemon's Unix socket and waits for records without any timer.
+ * The daemon sends the current record on connect and one line per focus signal after that.
+ * Falls back to polling the signal file if the socket cannot be reached or closes.
+ */
+function connectPushChannel() {
+  let input;
+  let output;
+  try {
+    const socketFile = Cc["@mozilla.org/file/local;1"].createInstance(Ci.nsIFile);
+    socketFile.initWithPath(PathUtils.join(PathUtils.profileDir, PUSH_SOCKET_NAME));
+    const transport = Cc["@mozilla.org/network/socket-transport-service;1"]
+      .getService(Ci.nsISocketTransportService)
+      .createUnixDomainTransport(socketFile);
+    input = transport.openInputStream(0, 0, 0).QueryInterface(Ci.nsIAsyncInputStream);
+    output = transport.openOutputStream(Ci.nsITransport.OPEN_UNBUFFERED, 0, 0);
+  } catch (error) {
+    log("Could not open push channel:", error);
+    startFallbackPolling();
+    return;
+  }
+
+  const scriptableInput = Cc["@mozilla.org/scriptableinputstream;1"].createInstance(Ci.nsIScriptableInputStream);
+  scriptableInput.init(input);
+  let pending = "";
+
+  const listener = {
+    onInputStreamReady(stream) {
+      let data;
+      try {
+        const available = stream.available(); // throws once the daemon is gone
+        if (available === 0) {
+          throw new Error("push channel closed");
+        }
+        data = scriptableInput.readBytes(available);
+      } catch (error) {
+        log("Push channel lost:", error);
+        scriptableInput.close();
+        pushOutput = null;
+        startFallbackPolling();
+        return;
+      }
+
+      const readUs = nowMicros();
+      stopFallbackPolling();
+      if (pushOutput === null) {
+        // The daemon's first record proves the transport is connected, only now can the output stream be written.
+        pushOutput = output;
+        lastReportedActive = null;
+        reportWindowActivity(); // The daemon starts out assuming the foreground
+      }
+      pending += data;
+      let newline;
+      while ((newline = pending.indexOf("\n")) !== -1) {
+        const line = pending.slice(0, newline);
+        pending = pending.slice(newline + 1);
+        const record = parseSignalRecord(line);
+        if (record) {
+          applySignalRecord(record, readUs);
+        } else if (line.includes('"pressure"')) {
+          try {
+            handleMemoryPressure(JSON.parse(line));
+          } catch (error) {
+            console.error("[OSK Manager] Error handling memory pressure record:", error);
+          }
+        }
+      }
+      stream.asyncWait(listener, 0, 0, Services.tm.currentThread); // sleep until the next record
+    },
+  };
+  input.asyncWait(listener, 0, 0, Services.tm.currentThread);
+}
+
+/**
+ * Tells the focus daemon whether any browser window is active, so it can lower the
+ * browser's CPU and I/O priority while it is in the background (see browser_priority.py).
+ * Only changes are sent; switching between browser windows is not a change.
+ */
+function reportWindowActivity() {
+  const active = Services.focus.activeWindow !== null;
+  if (pushOutput === null || active === lastReportedActive) {
+    return;
+  }
+  const line = JSON.stringify({ active }) + "\n";
+  try {
+    if (pushOutput.write(line, line.length) === line.length) {
+      lastReportedActive = active; // a short write is retried on the next activation change
+    }
+  } catch (error) {
+    log("Could not report window activity:", error);
+  }
+}
+
+/**
+ * Handles messages received from osk_config_trigger.uc.js, which only forwards hide events;
+ * showing comes from the process-wide push channel (or fallback poller).
  * @param {MessageEvent} event - The message event.
  */
 function handleCommandMessage(event) {
@@ -84,9 +401,7 @@ function handleCommandMessage(event) {
     return; // Ignore irrelevant messages
   }
 
-  if (event.data.type === CUSTOM_EVENT_READ_CONFIG) {
-    readAndApplyConfigState();
-  } else if (event.data.type === CUSTOM_EVENT_HIDE_OSK) {
+  if (event.data.type === CUSTOM_EVENT_HIDE_OSK) {
     log("Explicit HIDE command received from trigger. Hiding OSK.");
     setOSKOverlayState(false);
   } else {
@@ -106,6 +421,11 @@ Windows.onCreated(async (win) => {
   await Windows.waitWindowLoading(win);
 
   win.addEventListener('message', handleCommandMessage, false);
+  browserWindows.add(win);
+  win.addEventListener('activate', reportWindowActivity);
+  win.addEventListener('deactivate', () => Services.tm.dispatchToMainThread(reportWindowActivity)); // After the next window (if any) is active
+  win.addEventListener('unload', () => browserWindows.delete(win), { once: true });
+  applyOverlayClasses(win, currentOSKOverlayState); // New windows start in the shared state
 
   log("OSK Manager: Message listener added for window:", win.location.href);
 });
@@ -120,6 +440,5 @@ Windows.forEach((doc, win) => {
 
 log("OSK Manager Script: Initialization complete. Waiting for commands.");
 
-// Perform an initial read when the manager script itself initializes,
-// to set the initial state based on the daemon's file.
-readAndApplyConfigState();
\ No newline at end of file
+// Subscribe to the focus daemon, the first record it sends sets the initial state.
+connectPushChannel();
\ No newline at end of file
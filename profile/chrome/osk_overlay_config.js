@@ -1 +1 @@
-// this file is for communication with focus daemon it will be overwritten every session launch.
+{"seq":           0,"ts":                0,"pub":                0,"focused":0}
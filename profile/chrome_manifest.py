@@ -0,0 +1,94 @@
+import hashlib
+import json
+import os
+import sys
+
+# Manifest of the shipped profile/chrome tree: relative path -> [size, sha256].
+# Generated at build time (see scripts/build.sh), a copy is kept in every deployed chrome directory.
+
+MANIFEST_VERSION = 1
+SHIPPED_MANIFEST_NAME = "chrome.manifest.json" # next to profile/chrome in the click package
+DEPLOYED_MANIFEST_NAME = ".uwolf-manifest.json" # inside the deployed profile chrome directory
+
+
+def file_digest(path: str) -> str:
+    """
+    Returns the sha256 hex digest of a file's content.
+    """
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(65536), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _tree_digest(files: dict) -> str:
+    digest = hashlib.sha256()
+    for rel_path in sorted(files):
+        size, file_hash = files[rel_path]
+        digest.update(f"{rel_path}\0{size}\0{file_hash}\n".encode())
+    return digest.hexdigest()
+
+
+def build_manifest(source_dir: str, exclude=()) -> dict:
+    """
+    Walks source_dir once and hashes every file.
+
+    Args:
+        source_dir (path): root of the chrome tree.
+        exclude (iterable): relative paths to leave out.
+
+    Returns:
+        dict: {"version", "digest", "dirs": [relative dirs], "files": {relative path: [size, sha256]}}
+    """
+    files = {}
+    dirs = []
+    for dirpath, dirnames, filenames in os.walk(source_dir):
+        rel_dir = os.path.relpath(dirpath, source_dir)
+        if rel_dir != ".":
+            dirs.append(rel_dir.replace(os.sep, "/"))
+        for filename in filenames:
+            rel_path = os.path.normpath(os.path.join(rel_dir, filename)).replace(os.sep, "/")
+            if rel_path in exclude:
+                continue
+            full_path = os.path.join(dirpath, filename)
+            files[rel_path] = [os.path.getsize(full_path), file_digest(full_path)]
+    return {"version": MANIFEST_VERSION, "digest": _tree_digest(files), "dirs": sorted(dirs), "files": files}
+
+
+def load_manifest(path: str):
+    """
+    Loads a manifest, returns None if it is missing, corrupted or from another version.
+    """
+    try:
+        with open(path) as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if not isinstance(manifest, dict) or manifest.get("version") != MANIFEST_VERSION:
+        return None
+    return manifest
+
+
+def save_manifest(manifest: dict, path: str) -> None:
+    """
+    Atomically writes a manifest.
+    """
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(manifest, f, sort_keys=True)
+    os.replace(tmp_path, path)
+
+
+def main(argv) -> int:
+    if len(argv) != 3:
+        print(f"usage: {argv[0]} <chrome dir> <manifest output>")
+        return 2
+    manifest = build_manifest(argv[1])
+    save_manifest(manifest, argv[2])
+    print(f"Wrote manifest of {len(manifest['files'])} files ({manifest['digest'][:12]}) to {argv[2]}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
@@ -0,0 +1,117 @@
+import glob
+import json
+import os
+from types import MappingProxyType
+
+from .fsutil import atomic_write # must be relative
+
+
+CACHE_VERSION = 2
+
+
+#### START DEPENDENCIES ####
+# Every cached fact lists the inputs it depends on, a change in one input only invalidates the facts that use it.
+
+def _read_boot_id():
+    try:
+        with open("/proc/sys/kernel/random/boot_id") as f:
+            return f.read().strip()
+    except OSError:
+        return None
+
+def _stat_key(path):
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return [st.st_mtime_ns, st.st_size]
+
+def _display_modes_key():
+    from .keyboard import DISPLAY_MODES_GLOBS # only imported when an OSK fact is looked up
+    paths = [path for pattern in DISPLAY_MODES_GLOBS for path in sorted(glob.glob(pattern))]
+    return [[path, _stat_key(path)] for path in paths]
+
+def _key_constants_key():
+    from .keyboard import KEY_CONSTANTS_PATH
+    return _stat_key(KEY_CONSTANTS_PATH)
+
+def _dconf_key(): # gsettings values live in the dconf user database, any gsettings write replaces it.
+    config_home = os.environ.get("XDG_CONFIG_HOME") or os.path.join(os.environ.get("HOME", ""), ".config")
+    return _stat_key(os.path.join(config_home, "dconf", "user"))
+
+DEPENDENCIES = {
+    "boot": _read_boot_id,
+    "display": _display_modes_key,
+    "keyboard": _key_constants_key,
+    "dconf": _dconf_key,
+}
+
+#### END DEPENDENCIES ####
+
+
+def get_cache_path() -> str:
+    """
+    Returns the device-facts cache path under $XDG_CACHE_HOME (~/.cache if unset).
+    """
+    cache_home = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.environ.get("HOME", ""), ".cache")
+    return os.path.join(cache_home, "uwolf.chromiumos-guy", "device-facts.json")
+
+
+def fingerprint(dependency_names) -> dict:
+    """
+    Computes the current value of every named dependency.
+
+    Args:
+        dependency_names (iterable): keys of DEPENDENCIES.
+
+    Returns:
+        dict: dependency name -> JSON serializable fingerprint.
+    """
+    return {name: DEPENDENCIES[name]() for name in dependency_names}
+
+
+def load(path=None) -> dict:
+    """
+    Loads cached facts, returns {} if the cache is missing, corrupted or from another version.
+    Each entry is {"value": ..., "depends": {dependency: fingerprint}}.
+    """
+    path = path or get_cache_path()
+    try:
+        with open(path) as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    if not isinstance(data, dict) or data.get("version") != CACHE_VERSION:
+        return {}
+    return data.get("facts", {})
+
+
+def lookup(entries: dict, name: str, current: dict):
+    """
+    Returns (True, value) if the cached entry for name is still valid against the current fingerprints,
+    (False, None) otherwise.
+    """
+    entry = entries.get(name)
+    if not isinstance(entry, dict) or entry.get("depends") != current:
+        return False, None
+    return True, _freeze(entry.get("value"))
+
+
+def _freeze(value): # JSON gives back dicts and lists, facts stay immutable
+    if isinstance(value, dict):
+        return MappingProxyType({key: _freeze(item) for key, item in value.items()})
+    if isinstance(value, list):
+        return tuple(_freeze(item) for item in value)
+    return value
+
+
+def save(entries: dict, path=None) -> None:
+    """
+    Atomically writes the cache entries.
+    """
+    path = path or get_cache_path()
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        atomic_write(path, json.dumps({"version": CACHE_VERSION, "facts": entries}, default=dict).encode())
+    except (OSError, TypeError) as e:
+        print(f"Error writing device facts cache '{path}': {e}")
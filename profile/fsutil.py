@@ -0,0 +1,74 @@
+import fcntl
+import hashlib
+import os
+import shutil
+
+
+FICLONE = 0x40049409 # _IOW(0x94, 9, int) from linux/fs.h, reflink a whole file (btrfs, xfs, f2fs...)
+
+
+def link_or_copy(source_path: str, destination_path: str) -> str:
+    """
+    Deploys source_path at destination_path sharing the data blocks whenever possible:
+    a hardlink, else a reflink, else a plain copy (different filesystem, protected_hardlinks...).
+    Only use it for files nobody writes to in place.
+
+    Returns:
+        str: "link", "reflink" or "copy", whichever succeeded.
+    """
+    try:
+        os.link(source_path, destination_path)
+        return "link"
+    except OSError:
+        pass
+
+    try:
+        with open(source_path, "rb") as source, open(destination_path, "wb") as destination:
+            fcntl.ioctl(destination.fileno(), FICLONE, source.fileno())
+        shutil.copystat(source_path, destination_path)
+        return "reflink"
+    except OSError:
+        pass
+
+    shutil.copy2(source_path, destination_path) # also overwrites an empty file left by a failed reflink
+    return "copy"
+
+
+def atomic_write(path: str, data: bytes) -> None:
+    """
+    Replaces path with data in one rename. The data is written to a unique temporary file next to path,
+    so concurrent launches writing the same file never interleave into one temporary file.
+    """
+    import tempfile # only on a write, keeps it (and random) out of the warm launch's imports
+    fd, tmp_path = tempfile.mkstemp(prefix=os.path.basename(path) + ".", suffix=".tmp", dir=os.path.dirname(path) or ".")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            os.fchmod(f.fileno(), 0o644) # mkstemp creates 0600, keep the mode a plain open() gave
+            f.write(data)
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
+def write_if_changed(path: str, content: str) -> bool:
+    """
+    Atomically replaces path with content, unless the file already holds exactly that content
+    (compared by digest), so its mtime and any cache keyed on it stay valid.
+
+    Returns:
+        bool: True if the file was (re)written.
+    """
+    data = content.encode()
+    try:
+        with open(path, "rb") as f:
+            if hashlib.sha256(f.read()).digest() == hashlib.sha256(data).digest():
+                return False
+    except OSError:
+        pass # missing or unreadable, write it
+
+    atomic_write(path, data)
+    return True
@@ -1,6 +1,18 @@
 import subprocess
+import glob
 import os
 import re
+import shlex
+
+
+SYSROOT = os.environ.get("UWOLF_SYSROOT", "") # prefix for the device paths below, lets benchmarks/ run against a fake device
+KEY_CONSTANTS_PATH = SYSROOT + "/usr/share/maliit/plugins/lomiri-keyboard/keys/key_constants.js"
+DRM_DIR = SYSROOT + "/sys/class/drm/" # drm: direct rendering manager (should be used everywhere)
+FBDEV_DIR = SYSROOT + "/sys/class/graphics/" # virtual framebuffer (depricated in favour of drm, some ubuntu touch ports still use it apperantly)
+DISPLAY_MODES_GLOBS = (
+    DRM_DIR + "*/modes",
+    FBDEV_DIR + "*/modes",
+)
 
 
 def is_wordribbon_enabled() -> bool:
@@ -46,23 +58,61 @@ def is_wordribbon_enabled() -> bool:
     return True
   return False # if check fails then its enabled
 
-def get_vertical_resolution() -> int:
+def read_display_modes():
+    """
+    Reads every connector's sysfs modes file in a single pass, without spawning a shell.
+    DRM is used if it has any connectors, the framebuffer otherwise (same order as the old pipelines).
+
+    Returns:
+        tuple: (horizontal_resolution, vertical_resolution, preferred_mode) where the resolutions are the
+               largest found on any connector and preferred_mode is the (width, height) first listed by the
+               first connector that has modes (DRM lists the preferred mode first), or None if no modes were found.
+    """
+    for pattern in DISPLAY_MODES_GLOBS:
+        horizontal_resolution = 0
+        vertical_resolution = 0
+        preferred_mode = None
+        for path in sorted(glob.glob(pattern)):
+            try:
+                with open(path) as f:
+                    lines = f.read().split()
+            except OSError:
+                continue
+            for line in lines: # e.g. "1080x2340" (drm) or "U:1080x2340p-60" (fbdev)
+                width_field, _, height_field = line.partition("x")
+                widths = [int(n) for n in re.findall(r"[0-9]+", width_field)]
+                heights = [int(n) for n in re.findall(r"[0-9]+", height_field)]
+                if not widths or not heights:
+                    continue
+                horizontal_resolution = max(horizontal_resolution, *widths)
+                vertical_resolution = max(vertical_resolution, *heights)
+                if preferred_mode is None:
+                    preferred_mode = (widths[-1], heights[0])
+        if preferred_mode is not None:
+            return horizontal_resolution, vertical_resolution, preferred_mode
+    return None
+
+def get_vertical_resolution(native: bool = True) -> int:
+    modes = read_display_modes() if native else None # in-process first, the shell pipeline is only a fallback
+    if modes:
+        return modes[1]
+
     # getprop vendor.display.lcd_density
     vertical_resolution = None
     process = None
     try:
         # Start the QML process, capturing stdout
-        if os.path.exists("/sys/class/drm/"): # drm: direct rendering manager (should be used everywhere)
+        if os.path.exists(DRM_DIR): # drm: direct rendering manager (should be used everywhere)
             process = subprocess.run(
-                "cat /sys/class/drm/*/modes | awk -F 'x' '{print $2}' | grep -o '[0-9]*' | sort -nu | tail -n 1",
+                "cat " + shlex.quote(DRM_DIR) + "*/modes | awk -F 'x' '{print $2}' | grep -o '[0-9]*' | sort -nu | tail -n 1",
                 shell=True,
                 check=True,
                 capture_output=True,
                 text=True
             )
-        elif os.path.exists("/sys/class/graphics/"): # virtual framebuffer (depricated in favour of drm, some ubuntu touch ports still use it apperantly)
+        elif os.path.exists(FBDEV_DIR): # virtual framebuffer (depricated in favour of drm, some ubuntu touch ports still use it apperantly)
             process = subprocess.run(
-                "cat /sys/class/graphics/*/modes | awk -F 'x' '{print $2}' | grep -o '[0-9]*' | sort -nu | tail -n 1",
+                "cat " + shlex.quote(FBDEV_DIR) + "*/modes | awk -F 'x' '{print $2}' | grep -o '[0-9]*' | sort -nu | tail -n 1",
                 shell=True,
                 check=True,
                 capture_output=True,
@@ -73,7 +123,7 @@ def get_vertical_resolution() -> int:
             return 0
         vertical_resolution = int(process.stdout.strip())
 
-    except process.CalledProcessError as e:
+    except subprocess.CalledProcessError as e:
         # This handles errors if any command in the pipeline fails.
         print(f"Command failed with return code {e.returncode}:")
         print(e.stderr)
@@ -87,23 +137,27 @@ def get_vertical_resolution() -> int:
   
     return vertical_resolution
 
-def get_horizontal_resolution() -> int:
+def get_horizontal_resolution(native: bool = True) -> int:
+    modes = read_display_modes() if native else None # in-process first, the shell pipeline is only a fallback
+    if modes:
+        return modes[0]
+
     # getprop vendor.display.lcd_density
     horizontal_resolution = None
     process = None
     try:
         # Start the QML process, capturing stdout
-        if os.path.exists("/sys/class/drm/"): # drm: direct rendering manager (should be used everywhere)
+        if os.path.exists(DRM_DIR): # drm: direct rendering manager (should be used everywhere)
             process = subprocess.run(
-                "cat /sys/class/drm/*/modes | awk -F 'x' '{print $1}' | grep -o '[0-9]*' | sort -nu | tail -n 1",
+                "cat " + shlex.quote(DRM_DIR) + "*/modes | awk -F 'x' '{print $1}' | grep -o '[0-9]*' | sort -nu | tail -n 1",
                 shell=True,
                 check=True,
                 capture_output=True,
                 text=True
             )
-        elif os.path.exists("/sys/class/graphics/"):# virtual framebuffer (depricated in favour of drm, some ubuntu touch ports still use it apperantly)
+        elif os.path.exists(FBDEV_DIR):# virtual framebuffer (depricated in favour of drm, some ubuntu touch ports still use it apperantly)
             process = subprocess.run(
-                "cat /sys/class/graphics/*/modes | awk -F 'x' '{print $1}' | grep -o '[0-9]*' | sort -nu | tail -n 1",
+                "cat " + shlex.quote(FBDEV_DIR) + "*/modes | awk -F 'x' '{print $1}' | grep -o '[0-9]*' | sort -nu | tail -n 1",
                 shell=True,
                 check=True,
                 capture_output=True,
@@ -114,7 +168,7 @@ def get_horizontal_resolution() -> int:
             return 0
         horizontal_resolution = int(process.stdout.strip())
 
-    except process.CalledProcessError as e:
+    except subprocess.CalledProcessError as e:
         # This handles errors if any command in the pipeline fails.
         print(f"Command failed with return code {e.returncode}:")
         print(e.stderr)
@@ -138,7 +192,7 @@ def get_keyboard_heights() -> dict:
         Returns an empty dictionary if the file cannot be read or variables are not found.
     """
     keyboard_heights = {}
-    file_path = "/usr/share/maliit/plugins/lomiri-keyboard/keys/key_constants.js"
+    file_path = KEY_CONSTANTS_PATH
 
     # The variables we want to extract
     variables_to_find = [
@@ -182,17 +236,30 @@ def get_keyboard_heights() -> dict:
     return keyboard_heights
 
 
-def get_OSK_data() -> dict:
-    keyboard_heights = get_keyboard_heights() # a dict with the corresponding keyboard height values.
-    vertical_resolution = get_vertical_resolution()
-    horizontal_resolution = get_horizontal_resolution()
+def get_OSK_data(facts=None) -> dict:
+    """
+    Calculates OSK heights in pixels for CSS.
+
+    Args:
+        facts (DeviceFacts): optional probe results, when given no probing is done here.
+    """
+    if facts is not None:
+        keyboard_heights = facts.keyboard_heights
+        vertical_resolution = facts.vertical_resolution
+        horizontal_resolution = facts.horizontal_resolution
+        wordribbon_enabled = facts.wordribbon_enabled
+    else:
+        keyboard_heights = get_keyboard_heights() # a dict with the corresponding keyboard height values.
+        vertical_resolution = get_vertical_resolution()
+        horizontal_resolution = get_horizontal_resolution()
+        wordribbon_enabled = is_wordribbon_enabled()
     Phonewordribbon = 0
     Tabletwordribbon = 0
     buffer = 5 # we want some overshoot to account for variance intreduced by CSS flexboxs. (5px is a good amount)
     output_dict = {}
 
     try:
-        if is_wordribbon_enabled(): # grid_units * grid_unit_px = length in pixels
+        if wordribbon_enabled: # grid_units * grid_unit_px = length in pixels
             Phonewordribbon = int(keyboard_heights["phoneWordribbonHeight"]) * int(os.environ["GRID_UNIT_PX"])
             Tabletwordribbon = int(keyboard_heights["tabletWordribbonHeight"]) * int(os.environ["GRID_UNIT_PX"])
 
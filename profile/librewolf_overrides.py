@@ -1,18 +1,22 @@
 import os
-import shutil
-import filecmp # Make sure filecmp is imported if not already
 
-# (Keep your existing copy_custom_chrome_files function here as is)
+from .fsutil import write_if_changed # must be relative
+from .perf_prefs import build_perf_layer # must be relative
 
-def copy_librewolf_overrides_cfg(profile_info, staged: bool = True):
+
+def copy_librewolf_overrides_cfg(profile_info, staged: bool = True, facts=None, extra_prefs: dict = None):
     """
     Copies 'librewolf.overrides.cfg' from the script's 'profile/' directory
-    to the ~/.librewolf/ directory (parent of the specific profile).
-    Copies only if the file is new or has changed content.
+    to the ~/.librewolf/ directory (parent of the specific profile),
+    with the performance prefs generated for this device (perf_prefs.py) appended.
+    Writes only if the file is new or has changed content.
 
     Args:
         profile_info (tuple): A tuple containing (profile_full_path, profile_name).
                               (e.g., ('/home/user/.librewolf/xxxxxxxx.default', 'default'))
+        staged (bool): use the staged overrides (the .notstaged file otherwise).
+        facts (DeviceFacts): probe results used to size the performance prefs, none are added if missing.
+        extra_prefs (dict): more prefs for the generated block (see ram_cache.py), they win over the performance prefs.
     """
     if not profile_info or not profile_info[0]:
         print("Could not find a valid profile path. Cannot copy librewolf.overrides.cfg.")
@@ -44,34 +48,22 @@ def copy_librewolf_overrides_cfg(profile_info, staged: bool = True):
         print(f"Error: Source '{source_overrides_cfg}' is not a file. Skipping copy.")
         return
 
-    # 2. Check if destination file exists and compare its content
-    should_copy = False
-    if os.path.exists(destination_overrides_cfg):
-        # Compare file contents (shallow=False for full content comparison)
-        try:
-            if filecmp.cmp(source_overrides_cfg, destination_overrides_cfg, shallow=False):
-                print(f"librewolf.overrides.cfg at {destination_overrides_cfg} is identical. Skipping copy.")
-            else:
-                print(f"librewolf.overrides.cfg at {destination_overrides_cfg} differs from source. Overwriting...")
-                should_copy = True
-                # Remove existing file before copying new one to avoid potential issues
-                try:
-                    os.remove(destination_overrides_cfg)
-                except OSError as e:
-                    print(f"Error removing existing librewolf.overrides.cfg before overwrite: {e}. Skipping this file.")
-                    return # Stop if we can't remove the old file
-        except OSError as e:
-            print(f"Error comparing files '{source_overrides_cfg}' and '{destination_overrides_cfg}': {e}. Attempting to overwrite.")
-            should_copy = True # Assume different if comparison fails
-    else:
-        print(f"No librewolf.overrides.cfg found at {destination_overrides_cfg}. Copying new file.")
-        should_copy = True
+    # 2. Merge the shipped overrides with the performance layer generated for this device
+    try:
+        with open(source_overrides_cfg) as f:
+            content = f.read()
+    except OSError as e:
+        print(f"Error reading '{source_overrides_cfg}': {e}. Skipping copy.")
+        return
+    perf_layer = build_perf_layer(facts, extra_prefs)
+    if perf_layer:
+        content = content.rstrip("\n") + "\n\n" + perf_layer
 
-    # 3. Copy the new librewolf.overrides.cfg if needed
-    if should_copy:
-        print(f"Copying {source_overrides_cfg} to {destination_overrides_cfg}")
-        try:
-            shutil.copy2(source_overrides_cfg, destination_overrides_cfg) # copy2 preserves metadata
-            print("librewolf.overrides.cfg copied successfully.")
-        except Exception as e:
-            print(f"Error copying librewolf.overrides.cfg: {e}")
\ No newline at end of file
+    # 3. Write it only if the result changed (a rewrite would purge the startup cache)
+    try:
+        if write_if_changed(destination_overrides_cfg, content):
+            print(f"librewolf.overrides.cfg written to {destination_overrides_cfg}.")
+        else:
+            print(f"librewolf.overrides.cfg at {destination_overrides_cfg} is identical. Skipping copy.")
+    except OSError as e:
+        print(f"Error writing librewolf.overrides.cfg: {e}")
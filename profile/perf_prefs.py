@@ -0,0 +1,135 @@
+import os
+
+
+MEMINFO_PATH = "/proc/meminfo"
+GENERATED_HEADER = "// uWolf performance prefs, generated at launch for this device"
+
+# (max RAM in MiB, prefs) from low to high end, the first tier the device fits in is used.
+# cache sizes are in KiB, intervals in ms.
+TIERS = (
+    (3 * 1024, { # 2-3 GB phones: as few processes and as little cache as possible, the browser swaps otherwise
+        "dom.ipc.processCount": 2,
+        "dom.ipc.processPrelaunch.enabled": False,
+        "browser.cache.memory.capacity": 16384,
+        "browser.cache.disk.capacity": 51200,
+        "browser.sessionhistory.max_total_viewers": 0,
+        "browser.sessionstore.interval": 60000,
+        "browser.tabs.unloadOnLowMemory": True,
+        "image.mem.max_decoded_image_kb": 65536,
+    }),
+    (6 * 1024, {
+        "dom.ipc.processCount": 4,
+        "dom.ipc.processPrelaunch.enabled": True,
+        "browser.cache.memory.capacity": 32768,
+        "browser.cache.disk.capacity": 256000,
+        "browser.sessionhistory.max_total_viewers": 2,
+        "browser.sessionstore.interval": 30000,
+        "browser.tabs.unloadOnLowMemory": True,
+        "image.mem.max_decoded_image_kb": 131072,
+    }),
+    (None, {
+        "dom.ipc.processCount": 8,
+        "dom.ipc.processPrelaunch.enabled": True,
+        "browser.cache.memory.capacity": 65536,
+        "browser.cache.disk.capacity": 512000,
+        "browser.sessionhistory.max_total_viewers": 4,
+        "browser.sessionstore.interval": 15000,
+        "browser.tabs.unloadOnLowMemory": False,
+        "image.mem.max_decoded_image_kb": 262144,
+    }),
+)
+PHONE_MAX_PROCESSES = 4 # phones keep a core free for the shell and maliit, tablets may use all of them
+
+
+#### START DEVICE INPUTS ####
+
+def read_meminfo_kb(field: str, path: str = MEMINFO_PATH) -> int:
+    """
+    Returns a /proc/meminfo field (e.g. "MemAvailable") in KiB, raises if it cannot be read.
+    """
+    with open(path) as f:
+        for line in f:
+            if line.startswith(field + ":"):
+                return int(line.split()[1])
+    raise ValueError(f"no {field} in {path}")
+
+
+def read_mem_total_kb(path: str = MEMINFO_PATH) -> int:
+    """
+    Returns MemTotal in KiB (raises if it cannot be read, probes use their default then).
+    """
+    return read_meminfo_kb("MemTotal", path)
+
+
+def get_cpu_count() -> int:
+    """
+    Returns the number of cores the launcher may run on (all cores if affinity is unsupported).
+    """
+    try:
+        return len(os.sched_getaffinity(0))
+    except (AttributeError, OSError):
+        return os.cpu_count() or 1
+
+#### END DEVICE INPUTS ####
+
+
+def get_perf_prefs(mem_total_kb: int, cpu_count: int, device_type: str = "") -> dict:
+    """
+    Picks the performance prefs for a device.
+
+    Args:
+        mem_total_kb (int): total RAM in KiB, 0 if unknown (the lowest tier is used).
+        cpu_count (int): usable cores, 0 if unknown.
+        device_type (str): device-info DeviceType ("phone", "tablet", ... or "" if unknown).
+
+    Returns:
+        dict: pref name -> value.
+    """
+    mem_total_mb = mem_total_kb // 1024
+    for max_mem_mb, tier_prefs in TIERS:
+        if max_mem_mb is None or mem_total_mb < max_mem_mb:
+            prefs = dict(tier_prefs)
+            break
+
+    process_count = prefs["dom.ipc.processCount"]
+    if cpu_count:
+        process_count = min(process_count, max(2, cpu_count)) # more content processes than cores only adds context switches
+    if device_type == "phone":
+        process_count = min(process_count, PHONE_MAX_PROCESSES)
+    prefs["dom.ipc.processCount"] = process_count
+    return prefs
+
+
+def format_prefs(prefs: dict, facts_summary: str = "") -> str:
+    """
+    Renders prefs as defaultPref() lines, so values changed in about:config still win.
+    """
+    lines = [GENERATED_HEADER]
+    if facts_summary:
+        lines.append(f"// {facts_summary}")
+    for name, value in prefs.items():
+        if isinstance(value, bool):
+            value = "true" if value else "false"
+        elif isinstance(value, str):
+            value = '"' + value.replace("\\", "\\\\").replace('"', '\\"') + '"'
+        lines.append(f'defaultPref("{name}", {value});')
+    return "\n".join(lines) + "\n"
+
+
+def build_perf_layer(facts, extra_prefs: dict = None) -> str:
+    """
+    Returns the generated pref block for the probed device, "" if there is nothing to add.
+
+    Args:
+        facts (DeviceFacts): probe results, mem_total_kb, cpu_count and device_type are used.
+        extra_prefs (dict): prefs set at launch by other features (e.g. the RAM cache), they win over the tier.
+    """
+    prefs = {}
+    summary = ""
+    if facts is not None and facts.mem_total_kb:
+        prefs = get_perf_prefs(facts.mem_total_kb, facts.cpu_count, facts.device_type)
+        summary = f"RAM {facts.mem_total_kb // 1024} MiB, {facts.cpu_count or '?'} cores, {facts.device_type or 'unknown'} device"
+    prefs.update(extra_prefs or {})
+    if not prefs:
+        return ""
+    return format_prefs(prefs, summary)
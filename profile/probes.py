@@ -0,0 +1,244 @@
+import subprocess
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from types import MappingProxyType
+from typing import Any, Callable, NamedTuple
+
+from .profile import get_home_dir, get_whoami_output # must be relative
+from . import facts_cache
+from .perf_prefs import get_cpu_count, read_mem_total_kb # must be relative
+
+
+PROBE_TIMEOUT = 2.0 # seconds, per probe
+
+
+class FactMissing(ValueError):
+    """
+    Raised by a parser when the probe ran cleanly but the fact does not exist on this device (e.g. an unset
+    property), unlike other failures its default is cached.
+    """
+
+
+class Probe(NamedTuple):
+    """
+    Declares a single device probe.
+
+    Attributes:
+        name (str): field of DeviceFacts the parsed result is stored in.
+        command (list | str | callable): argv list, shell string or an in-process callable.
+        parse (callable): turns the raw output (or callable return value) into the fact.
+        default: value used when the probe fails or times out.
+        depends (tuple): facts_cache.DEPENDENCIES the result is keyed on, empty means never cached.
+        fallback (list | str | callable): run (and parsed) only if command fails, e.g. the subprocess version of a native probe.
+        timeout (float): seconds to wait before giving up on the probe.
+    """
+    name: str
+    command: Any
+    parse: Callable[[Any], Any]
+    default: Any = None
+    depends: tuple = ()
+    fallback: Any = None
+    timeout: float = PROBE_TIMEOUT
+
+
+class DeviceFacts(NamedTuple):
+    """
+    Immutable result of a probe run, shared by the launcher, chrome.INIT_CHROME and the scaling code.
+    """
+    lcd_density: int = 0
+    usage_mode: Any = None
+    device_type: str = ""
+    username: Any = None
+    home_dir: Any = None
+    display_modes: Any = (0, 0, None) # (horizontal, vertical, preferred (width, height))
+    spell_checking: Any = None
+    predictive_text: Any = None
+    keyboard_heights: Any = MappingProxyType({})
+    mem_total_kb: int = 0
+    cpu_count: int = 0
+
+    @property
+    def staged(self) -> bool:
+        return self.usage_mode == r"'Staged'" or self.usage_mode is None # check if staged, fallback if nothing was outputed to most likely.
+
+    @property
+    def tablet(self) -> int:
+        return 1 if self.device_type == "tablet" else 0 # 0 for phone 1 for tablet
+
+    @property
+    def horizontal_resolution(self) -> int:
+        return self.display_modes[0]
+
+    @property
+    def vertical_resolution(self) -> int:
+        return self.display_modes[1]
+
+    @property
+    def preferred_mode(self):
+        return self.display_modes[2]
+
+    @property
+    def wordribbon_enabled(self) -> bool:
+        return self.spell_checking in ("true", None) or self.predictive_text in ("true", None) # fallback to least UI breaking.
+
+
+#### START PARSERS ####
+
+def _parse_str(output):
+    return output.strip() or None
+
+def _parse_int(output):
+    if not output.strip():
+        raise FactMissing("empty output") # getprop prints nothing for an unset property
+    return int(output.strip())
+
+def _parse_device_type(output):
+    for line in output.splitlines(): # device-info prints "Key: Value" lines
+        key, _, value = line.partition(": ")
+        if key.strip() == "DeviceType":
+            return value.strip()
+    return ""
+
+def _parse_mapping(value):
+    return MappingProxyType(dict(value))
+
+def _parse_display_modes(value):
+    if not value or not value[0] or not value[1]:
+        raise ValueError("no display modes found")
+    horizontal_resolution, vertical_resolution, preferred_mode = value
+    return horizontal_resolution, vertical_resolution, tuple(preferred_mode) if preferred_mode else None
+
+#### END PARSERS ####
+
+#### START OSK PROBES ####
+# profile.keyboard is only imported once an OSK probe actually has to run (staged mode, cache miss).
+
+def _read_display_modes():
+    from .keyboard import read_display_modes
+    return read_display_modes()
+
+def _display_modes_subprocess(): # old shell pipelines, one per dimension
+    from .keyboard import get_horizontal_resolution, get_vertical_resolution
+    return get_horizontal_resolution(native=False), get_vertical_resolution(native=False), None
+
+def _get_keyboard_heights():
+    from .keyboard import get_keyboard_heights
+    return get_keyboard_heights()
+
+#### END OSK PROBES ####
+
+
+PROBES = (
+    Probe("lcd_density", ["getprop", "vendor.display.lcd_density"], _parse_int, 0, ("boot",)),
+    Probe("usage_mode", ["gsettings", "get", "com.lomiri.Shell", "usage-mode"], _parse_str, None, ("dconf",)),
+    Probe("device_type", ["device-info"], _parse_device_type, "", ("boot",)),
+    Probe("username", get_whoami_output, _parse_str, fallback=["whoami"]),
+    Probe("home_dir", get_home_dir, _parse_str, fallback=["sh", "-c", "echo $HOME"]),
+    Probe("display_modes", _read_display_modes, _parse_display_modes, (0, 0, None), ("boot", "display"), _display_modes_subprocess),
+    Probe("spell_checking", ["gsettings", "get", "com.lomiri.keyboard.maliit", "spell-checking"], _parse_str, None, ("dconf",)),
+    Probe("predictive_text", ["gsettings", "get", "com.lomiri.keyboard.maliit", "predictive-text"], _parse_str, None, ("dconf",)),
+    Probe("keyboard_heights", _get_keyboard_heights, _parse_mapping, MappingProxyType({}), ("keyboard",)),
+    Probe("mem_total_kb", read_mem_total_kb, int, 0, ("boot",)),
+    Probe("cpu_count", get_cpu_count, int, 0, ("boot",)),
+)
+
+MODE_PROBES = ("usage_mode",) # decides which of the sets below is needed
+WINDOWED_PROBES = ("username", "home_dir", "device_type", "mem_total_kb", "cpu_count") # the last three size the performance prefs
+STAGED_PROBES = WINDOWED_PROBES + ("lcd_density", "display_modes", "spell_checking", "predictive_text", "keyboard_heights")
+
+
+def select(names) -> tuple:
+    """
+    Returns the declared probes whose name is in names, in declaration order.
+    """
+    return tuple(probe for probe in PROBES if probe.name in names)
+
+
+def _run_command(probe: Probe, command):
+    if callable(command):
+        return probe.parse(command())
+
+    result = subprocess.run(
+        command,
+        shell=isinstance(command, str),
+        check=True,
+        capture_output=True,
+        text=True,
+        timeout=probe.timeout # kills the child if it hangs
+    )
+    return probe.parse(result.stdout)
+
+def _run_probe(probe: Probe):
+    """
+    Runs a single probe to completion and returns its parsed value (raises on failure).
+    """
+    try:
+        return _run_command(probe, probe.command)
+    except Exception as e:
+        if probe.fallback is None:
+            raise
+        print(f"Probe '{probe.name}' failed ({e!r}), trying fallback.")
+        return _run_command(probe, probe.fallback)
+
+
+def run_probes(probes=PROBES, use_cache: bool = True, base: DeviceFacts = None) -> DeviceFacts:
+    """
+    Runs every declared probe exactly once and concurrently.
+    Probes whose cached result is still valid are not run at all.
+
+    Args:
+        probes (tuple): the Probe declarations to run, defaults to PROBES.
+        use_cache (bool): read and update the persistent device facts cache.
+        base (DeviceFacts): earlier results to extend, fields not probed here are kept.
+
+    Returns:
+        DeviceFacts: immutable probe results, failed, timed out or not run probes hold their default.
+    """
+    base = base or DeviceFacts()
+    results = {}
+    entries = facts_cache.load() if use_cache else {}
+    fingerprints = {}
+    pending = []
+
+    for probe in probes:
+        if use_cache and probe.depends:
+            fingerprints[probe.name] = facts_cache.fingerprint(probe.depends)
+            hit, value = facts_cache.lookup(entries, probe.name, fingerprints[probe.name])
+            if hit:
+                results[probe.name] = value
+                continue
+        pending.append(probe)
+
+    if not pending:
+        return base._replace(**results) # warm launch, nothing to probe
+
+    cache_dirty = False
+    executor = ThreadPoolExecutor(max_workers=len(pending))
+    try:
+        started = time.monotonic()
+        futures = [(probe, executor.submit(_run_probe, probe)) for probe in pending]
+        for probe, future in futures:
+            remaining = max(0.0, started + probe.timeout - time.monotonic())
+            try:
+                results[probe.name] = future.result(timeout=remaining)
+            except (FutureTimeoutError, subprocess.TimeoutExpired) as e: # a hang may be transient, probe again next launch
+                print(f"Probe '{probe.name}' timed out, using default ({probe.default!r}): {e!r}")
+                results[probe.name] = probe.default
+                continue
+            except FactMissing as e: # definitive, a missing property (no lcd_density) stays missing until its inputs change
+                print(f"Probe '{probe.name}' found nothing, using default ({probe.default!r}): {e!r}")
+                results[probe.name] = probe.default
+            except Exception as e: # subprocess and parse errors may be transient (dconf not up yet), probe again next launch
+                print(f"Probe '{probe.name}' failed, using default ({probe.default!r}): {e!r}")
+                results[probe.name] = probe.default
+                continue
+            if probe.name in fingerprints:
+                entries[probe.name] = {"value": results[probe.name], "depends": fingerprints[probe.name]}
+                cache_dirty = True
+    finally:
+        executor.shutdown(wait=False) # never block launch on a hung in-process probe
+
+    if cache_dirty:
+        facts_cache.save(entries)
+
+    return base._replace(**results)
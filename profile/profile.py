@@ -1,11 +1,24 @@
 import subprocess
 import configparser
+import fcntl
+import json
 import os
+import pwd
 
-def get_whoami_output():
+from .facts_cache import get_cache_path # must be relative
+from .fsutil import atomic_write # must be relative
+
+def get_whoami_output(native: bool = True):
     """
-    Executes the 'whoami' command and captures its standard output.
+    Returns the current username from the password database,
+    falls back to executing the 'whoami' command and capturing its standard output.
     """
+    if native:
+        try:
+            return pwd.getpwuid(os.geteuid()).pw_name # same lookup whoami does, without the fork+exec
+        except KeyError:
+            print("Error: current uid has no passwd entry, falling back to 'whoami'.")
+
     try:
         # subprocess.run is the recommended way to run external commands.
         # capture_output=True will capture stdout and stderr.
@@ -25,10 +38,20 @@ def get_whoami_output():
         print("Error: 'whoami' command not found. Make sure it's in your system's PATH.")
         return None
 
-def get_home_dir():
+def get_home_dir(native: bool = True):
     """
-    Executes the 'echo $HOME' command and captures its standard output.
+    Returns $HOME from the environment (or the password database if unset),
+    falls back to executing the 'echo $HOME' command and capturing its standard output.
     """
+    if native:
+        home_dir = os.environ.get("HOME")
+        if home_dir:
+            return home_dir
+        try:
+            return pwd.getpwuid(os.getuid()).pw_dir
+        except KeyError:
+            print("Error: $HOME is not set and current uid has no passwd entry, falling back to the shell.")
+
     try:
         # subprocess.run is the recommended way to run external commands.
         # capture_output=True will capture stdout and stderr.
@@ -49,90 +72,200 @@ def get_home_dir():
         return None
 
 
-def get_librewolf_default_profile():
+#### START PROFILE REGISTRY ####
+# profiles.ini is parsed once per change, the resolved profiles are cached keyed on its mtime and size.
+
+PROFILE_ENV = "UWOLF_PROFILE" # profile name to launch, like -P
+REGISTRY_VERSION = 2
+
+
+def get_registry_cache_path() -> str:
+    """
+    Returns the profile registry cache path, next to the device facts cache.
+    """
+    return os.path.join(os.path.dirname(get_cache_path()), "profiles.json")
+
+
+def parse_profiles_ini(profiles_ini_path, base_path) -> dict:
+    """
+    Reads every profile of profiles.ini in a single pass over its sections.
+
+    Returns:
+        dict: {"profiles": [[full_profile_path, profile_name], ...], "default": index into profiles, None if profiles.ini marks none}
+
+    Raises:
+        configparser.Error: if profiles.ini is corrupted.
+    """
+    config = configparser.ConfigParser()
+    config.read(profiles_ini_path)
+
+    profiles = []
+    relative_paths = []
+    install_default = None
+    flagged_default = None
+    for section in config.sections():
+        if section.startswith('Install'):
+            if install_default is None and 'Default' in config[section]:
+                install_default = config[section]['Default'] # [Install...] section's 'Default' is the active profile path
+        elif section.startswith('Profile') and config.has_option(section, 'Path') and config.has_option(section, 'Name'):
+            if flagged_default is None and config[section].get('Default') == '1':
+                flagged_default = len(profiles) # fallback to [ProfileX] with Default=1
+            relative_paths.append(config[section]['Path'])
+            profiles.append([os.path.join(base_path, config[section]['Path']), config[section]['Name']])
+
+    default = flagged_default
+    if install_default in relative_paths:
+        default = relative_paths.index(install_default)
+    return {"profiles": profiles, "default": default}
+
+
+def _profiles_ini_key(profiles_ini_path):
+    st = os.stat(profiles_ini_path)
+    return [profiles_ini_path, st.st_mtime_ns, st.st_size]
+
+
+def load_profile_registry(profiles_ini_path, base_path) -> dict:
+    """
+    Returns parse_profiles_ini's result, from the registry cache while profiles.ini is unchanged.
+    """
+    key = _profiles_ini_key(profiles_ini_path)
+    cache_path = get_registry_cache_path()
+    try:
+        with open(cache_path) as f:
+            cached = json.load(f)
+        if cached.get("version") == REGISTRY_VERSION and cached.get("key") == key:
+            return cached["registry"]
+    except (OSError, ValueError, AttributeError, KeyError):
+        pass
+
+    registry = parse_profiles_ini(profiles_ini_path, base_path)
+    try:
+        os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+        atomic_write(cache_path, json.dumps({"version": REGISTRY_VERSION, "key": key, "registry": registry}).encode())
+    except OSError as e:
+        print(f"Error writing profile registry cache '{cache_path}': {e}")
+    return registry
+
+
+def get_librewolf_profiles(home_dir=None):
     """
-    Detects the default Librewolf profile from an existing profiles.ini.
+    Lists the Librewolf profiles of an existing profiles.ini.
     It does NOT create directories or profiles.ini if they don't exist.
-    Returns a tuple: (full_profile_path, profile_name), or (None, None) if not found.
+
+    Args:
+        home_dir (str): already probed home directory, detected with get_home_dir() if None.
+
+    Returns:
+        tuple: ([(full_profile_path, profile_name), ...], index of the default profile, None if profiles.ini marks none),
+               ([], None) if there is no usable profiles.ini.
     """
-    home_dir = get_home_dir()
+    if not home_dir:
+        home_dir = get_home_dir()
     if not home_dir:
         print("Could not determine home directory. Exiting.")
-        return None, None # Return (None, None) on error
+        return [], None
 
     base_path = os.path.join(home_dir, ".librewolf")
     profiles_ini_path = os.path.join(base_path, "profiles.ini")
-    
-    determined_profile_path = None
-    determined_profile_name = None
-    
+
     print(f"Checking for base directory: {base_path}")
 
     # 1. Ensure .librewolf directory exists (only check, no creation)
     if not os.path.exists(base_path):
         print(f"Directory '{base_path}' does not exist. Cannot find profiles.ini.")
-        return None
+        return [], None
 
     # 2. Attempt to read existing profiles.ini
-    config = configparser.ConfigParser()
-    
-    if os.path.exists(profiles_ini_path):
-        print(f"Found existing profiles.ini at: {profiles_ini_path}. Attempting to read default profile...")
-        try:
-            config.read(profiles_ini_path)
-
-            # Prioritize [Install...] section's 'Default' for the active profile path
-            for section in config.sections():
-                if section.startswith('Install') and 'Default' in config[section]:
-                    default_profile_path_relative = config[section]['Default']
-                    # Now, find the corresponding profile name from a [ProfileX] section
-                    for profile_section in config.sections():
-                        if profile_section.startswith('Profile') and config.has_option(profile_section, 'Path') and config[profile_section]['Path'] == default_profile_path_relative:
-                            determined_profile_name = config[profile_section].get('Name') # Get the 'Name' from that profile section
-                            break
-                    
-                    if determined_profile_name:
-                        determined_profile_path = os.path.join(base_path, default_profile_path_relative)
-                        print(f"Found default profile '{determined_profile_name}' with path: {determined_profile_path}")
-                        break
-
-            if not determined_profile_path: # If not found via Install section
-                # Fallback to [ProfileX] with Default=1
-                for section in config.sections():
-                    if section.startswith('Profile') and config.has_option(section, 'Default') and config[section]['Default'] == '1':
-                        if config.has_option(section, 'Path') and config.has_option(section, 'Name'):
-                            determined_profile_path = os.path.join(base_path, config[section]['Path'])
-                            determined_profile_name = config[section]['Name']
-                            print(f"Found default profile '{determined_profile_name}' from [{section}] (Default=1): {determined_profile_path}")
-                            break
-            
-            if not determined_profile_path:  # If still not found
-                # Check for available profiles
-                profiles = [section for section in config.sections() if section.startswith('Profile') and config.has_option(section, 'Path') and config.has_option(section, 'Name')]
-                
-                # If only one profile exists, select it
-                if len(profiles) == 1:
-                    section = profiles[0]
-                    determined_profile_path = os.path.join(base_path, config[section]['Path'])
-                    determined_profile_name = config[section]['Name']
-                    print(f"Only one profile found: '{determined_profile_name}' from [{section}]: {determined_profile_path}")
-                else:
-                    print("No default profile found and multiple profiles exist.")
-                    return None
-
-            if determined_profile_path and determined_profile_name:
-                # Ensure the directory exists if it's referenced in profiles.ini
-                # We only check and print, not create, as per the strict requirement.
-                if not os.path.exists(determined_profile_path):
-                    print(f"Warning: Default profile directory '{determined_profile_path}' referenced in profiles.ini does not exist. It might be corrupted or missing.")
-                return determined_profile_path, determined_profile_name
-            else:
-                print("Could not find a default profile definition in profiles.ini.")
-                return None
-
-        except configparser.Error as e:
-            print(f"Error parsing profiles.ini: {e}. It might be corrupted.")
+    if not os.path.exists(profiles_ini_path):
+        print(f"profiles.ini not found at: {profiles_ini_path}. Cannot determine default profile.")
+        return [], None
+
+    try:
+        registry = load_profile_registry(profiles_ini_path, base_path)
+    except (OSError, configparser.Error) as e:
+        print(f"Error parsing profiles.ini: {e}. It might be corrupted.")
+        return [], None
+    return [tuple(entry) for entry in registry["profiles"]], registry["default"]
+
+
+def get_librewolf_default_profile(home_dir=None, profile_name=None):
+    """
+    Detects the Librewolf profile to launch from an existing profiles.ini:
+    the one named profile_name (or $UWOLF_PROFILE) if given, else the default one.
+    If no profile is marked as default, the first one is used.
+    Returns a tuple: (full_profile_path, profile_name), or None if not found.
+
+    Args:
+        home_dir (str): already probed home directory, detected with get_home_dir() if None.
+        profile_name (str): requested profile (-P), matched against the name or directory name.
+    """
+    profiles, default = get_librewolf_profiles(home_dir)
+    if not profiles:
+        print("Could not find a default profile definition in profiles.ini.")
+        return None
+
+    profile_name = profile_name or os.environ.get(PROFILE_ENV)
+    if profile_name:
+        for determined_profile_path, determined_profile_name in profiles:
+            if profile_name in (determined_profile_name, os.path.basename(determined_profile_path)):
+                print(f"Found requested profile '{determined_profile_name}' with path: {determined_profile_path}")
+                break
+        else:
+            print(f"Requested profile '{profile_name}' not found in profiles.ini.")
             return None
     else:
-        print(f"profiles.ini not found at: {profiles_ini_path}. Cannot determine default profile.")
+        determined_profile_path, determined_profile_name = profiles[default if default is not None else 0] # none marked as default: use the first like the profile manager lists it
+        print(f"Found default profile '{determined_profile_name}' with path: {determined_profile_path}")
+
+    # Ensure the directory exists if it's referenced in profiles.ini
+    # We only check and print, not create, as per the strict requirement.
+    if not os.path.exists(determined_profile_path):
+        print(f"Warning: Profile directory '{determined_profile_path}' referenced in profiles.ini does not exist. It might be corrupted or missing.")
+    return determined_profile_path, determined_profile_name
+
+#### END PROFILE REGISTRY ####
+
+#### START RUNNING INSTANCE ####
+# librewolf locks a profile it runs on twice: the "lock" symlink (target "<ip>:+<pid>") and an fcntl lock on .parentlock.
+
+LOCK_LINK_NAME = "lock"
+PARENT_LOCK_NAME = ".parentlock"
+
+
+def get_running_browser_pid(profile_path):
+    """
+    Returns the pid of the browser running on a profile, None if it is not in use.
+    The symlink outlives a crash (and its pid may be reused), so the pid has to be alive
+    and .parentlock actually held before the profile counts as in use.
+
+    Args:
+        profile_path (str): full profile path.
+    """
+    try:
+        target = os.readlink(os.path.join(profile_path, LOCK_LINK_NAME))
+        pid = int(target.rpartition(":+")[2])
+    except (OSError, ValueError):
+        return None # no browser, or it exited cleanly and removed the link
+    if pid <= 0 or pid == os.getpid():
         return None
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return None # stale link
+    except PermissionError:
+        pass # alive, just not ours
+
+    try:
+        fd = os.open(os.path.join(profile_path, PARENT_LOCK_NAME), os.O_RDONLY)
+    except OSError:
+        return pid # no .parentlock to cross check, trust the live pid
+    try:
+        fcntl.lockf(fd, fcntl.LOCK_SH | fcntl.LOCK_NB) # only fails while the browser holds its write lock
+        held = False
+    except OSError:
+        held = True
+    finally:
+        os.close(fd) # also drops our shared lock right away
+    return pid if held else None
+
+#### END RUNNING INSTANCE ####
@@ -0,0 +1,144 @@
+import os
+import shutil
+
+from .perf_prefs import read_meminfo_kb # must be relative
+from .startup_cache import get_local_profile_dir # must be relative
+
+
+# Opt-in (UWOLF_RAM_CACHE=1, or =<MiB> for a fixed cap) relocation of the HTTP disk cache (cache2)
+# to a size capped directory on the $XDG_RUNTIME_DIR tmpfs, so page loads hit RAM instead of eMMC.
+# The cache is lost on reboot, which is fine for a cache.
+# The relocation is a managed symlink <local profile dir>/cache2 -> $XDG_RUNTIME_DIR/uwolf-cache/<profile>,
+# so the prefs (in the overrides shared by all profiles) stay the same whichever profile is launched
+# and profiles running side by side keep separate caches.
+
+RAM_CACHE_ENV = "UWOLF_RAM_CACHE"
+RAM_CACHE_DIRNAME = "uwolf-cache" # in $XDG_RUNTIME_DIR, one subdirectory per profile
+MIN_CACHE_MB = 32 # below this the cache is not worth it, the default location is kept
+MAX_CACHE_MB = 256
+TOTAL_RAM_SHARE = 16 # auto size: at most 1/16 of the RAM
+TMPFS_SHARE = 4 # and at most 1/4 of the runtime dir's tmpfs
+# The size only depends on totals so the generated prefs (and the startup cache keyed on them) stay the same
+# across launches, free RAM and tmpfs space only decide whether there is room for it right now.
+
+
+def get_requested_cap_mb(environ=None):
+    """
+    Returns None if the RAM cache is disabled, 0 for automatic sizing, or the requested cap in MiB.
+    """
+    environ = os.environ if environ is None else environ
+    value = environ.get(RAM_CACHE_ENV, "").strip()
+    if value in ("", "0"):
+        return None
+    if value == "1":
+        return 0
+    try:
+        return max(0, int(value))
+    except ValueError:
+        print(f"Ignoring invalid {RAM_CACHE_ENV}={value!r}, sizing the RAM cache automatically.")
+        return 0
+
+
+def get_cache_dir(profile_path: str, runtime_dir: str = None) -> str:
+    runtime_dir = runtime_dir or os.environ.get("XDG_RUNTIME_DIR", "")
+    return os.path.join(runtime_dir, RAM_CACHE_DIRNAME, os.path.basename(profile_path))
+
+
+def _is_managed_link(link_path: str) -> bool:
+    return os.path.islink(link_path) and os.path.basename(os.path.dirname(os.readlink(link_path))) == RAM_CACHE_DIRNAME
+
+
+def _remove_ram_cache(link_path: str) -> None:
+    if not _is_managed_link(link_path):
+        return
+    target = os.readlink(link_path)
+    try:
+        os.unlink(link_path) # librewolf recreates cache2 on flash
+    except OSError as e:
+        print(f"Could not remove the RAM cache link {link_path}: {e}")
+        return
+    shutil.rmtree(target, ignore_errors=True) # give the memory back
+
+
+def size_cache_mb(requested_mb: int, runtime_dir: str, present: bool = False) -> int:
+    """
+    Sizes the cache from total RAM and the size of the runtime dir's tmpfs.
+
+    Args:
+        requested_mb (int): cap asked for in UWOLF_RAM_CACHE, 0 for automatic.
+        runtime_dir (path): $XDG_RUNTIME_DIR.
+        present (bool): the cache exists from an earlier launch, its memory is already in use.
+
+    Returns:
+        int: cache size in MiB, 0 if there is no room for it (below MIN_CACHE_MB, or a new cache
+             would not fit in the free RAM or tmpfs space right now).
+    """
+    try:
+        total_mb = read_meminfo_kb("MemTotal") // 1024
+        available_mb = read_meminfo_kb("MemAvailable") // 1024
+        stat = os.statvfs(runtime_dir)
+    except (OSError, ValueError):
+        return 0
+    tmpfs_total_mb = stat.f_blocks * stat.f_frsize // (1024 * 1024)
+    tmpfs_free_mb = stat.f_bavail * stat.f_frsize // (1024 * 1024)
+
+    size_mb = min(requested_mb or MAX_CACHE_MB, total_mb // TOTAL_RAM_SHARE, tmpfs_total_mb // TMPFS_SHARE)
+    if size_mb < MIN_CACHE_MB:
+        return 0
+    if not present and (size_mb > tmpfs_free_mb or size_mb * 2 > available_mb):
+        return 0
+    return size_mb
+
+
+def get_ram_cache_prefs(profile_info, environ=None) -> dict:
+    """
+    Links the profile's disk cache to its RAM cache directory and returns the prefs for it.
+    Returns {} (default cache location) if the RAM cache is disabled or there is not enough room,
+    and removes a RAM cache left over from an earlier launch in that case.
+
+    Args:
+        profile_info (tuple): A tuple containing (profile_full_path, profile_name).
+        environ (dict): environment to read UWOLF_RAM_CACHE and XDG_RUNTIME_DIR from, defaults to os.environ.
+    """
+    environ = os.environ if environ is None else environ
+    if not profile_info or not profile_info[0]:
+        return {}
+    link_path = os.path.join(get_local_profile_dir(profile_info[0]), "cache2")
+    requested_mb = get_requested_cap_mb(environ)
+    runtime_dir = environ.get("XDG_RUNTIME_DIR", "")
+    if not runtime_dir or not os.path.isdir(runtime_dir):
+        if requested_mb is not None:
+            print("No $XDG_RUNTIME_DIR, keeping the disk cache on flash.")
+        _remove_ram_cache(link_path)
+        return {}
+
+    cache_dir = get_cache_dir(profile_info[0], runtime_dir)
+    size_mb = size_cache_mb(requested_mb, runtime_dir, os.path.isdir(cache_dir)) if requested_mb is not None else 0
+
+    if not size_mb:
+        if requested_mb is not None:
+            print(f"No room for a RAM cache of at least {MIN_CACHE_MB} MiB, keeping the disk cache on flash.")
+        _remove_ram_cache(link_path)
+        return {}
+
+    try:
+        os.makedirs(cache_dir, mode=0o700, exist_ok=True)
+        if os.path.islink(link_path) and not _is_managed_link(link_path):
+            print(f"{link_path} is a symlink uWolf did not create, keeping the disk cache where it points.")
+            return {}
+        if not os.path.islink(link_path) or os.readlink(link_path) != cache_dir:
+            if os.path.islink(link_path):
+                os.unlink(link_path) # runtime dir moved
+            elif os.path.isdir(link_path):
+                shutil.rmtree(link_path) # the cache on flash, not worth copying
+            os.makedirs(os.path.dirname(link_path), exist_ok=True)
+            os.symlink(cache_dir, link_path)
+    except OSError as e:
+        print(f"Could not link the disk cache to {cache_dir} ({e}), keeping it on flash.")
+        return {}
+    print(f"Disk cache in RAM at {cache_dir} ({size_mb} MiB).")
+    return {
+        "browser.cache.disk.enable": True, # librewolf ships with the disk cache off, the RAM cache would be unused
+        "browser.cache.disk.smart_size.enabled": False, # smart sizing would ignore the cap
+        "browser.cache.disk.capacity": size_mb * 1024, # KiB
+    }
@@ -0,0 +1,136 @@
+import configparser
+import json
+import os
+import shutil
+
+from .chrome_manifest import DEPLOYED_MANIFEST_NAME, file_digest, load_manifest # must be relative
+from .fsutil import atomic_write # must be relative
+
+
+STATE_FILENAME = "uwolf-startup-state.json" # in the profile directory
+STATE_VERSION = 2
+GENERATED_CSS_PATH = os.path.join("chrome", "CSS", "system-parameters.css") # rewritten for every profile by chrome.INIT_CHROME
+
+
+#### START STATE INPUTS ####
+
+def get_librewolf_build(app_dir: str = None):
+    """
+    Identifies the shipped LibreWolf build, from the extracted application.ini (Version + BuildID)
+    or, if that is missing, the .last_librewolf_tag file copied into the click package.
+
+    Args:
+        app_dir (path): click package root, defaults to the current directory (the launcher runs from it).
+    """
+    app_dir = app_dir or os.getcwd()
+    parser = configparser.ConfigParser(interpolation=None)
+    try:
+        if parser.read(os.path.join(app_dir, "bin", "application.ini")) and parser.has_section("App"):
+            return f"{parser.get('App', 'Version', fallback='')}+{parser.get('App', 'BuildID', fallback='')}"
+    except configparser.Error as e:
+        print(f"Error reading application.ini: {e}")
+    try:
+        with open(os.path.join(app_dir, ".last_librewolf_tag")) as f:
+            return f.read().strip() or None
+    except OSError:
+        return None
+
+
+def _chrome_digest(profile_path: str):
+    manifest = load_manifest(os.path.join(profile_path, "chrome", DEPLOYED_MANIFEST_NAME))
+    return manifest["digest"] if manifest else None
+
+
+def _generated_css_digest(profile_path: str):
+    try:
+        return file_digest(os.path.join(profile_path, GENERATED_CSS_PATH))
+    except OSError:
+        return None
+
+
+def _overrides_digest(profile_path: str):
+    try:
+        return file_digest(os.path.join(os.path.dirname(profile_path), "librewolf.overrides.cfg"))
+    except OSError:
+        return None
+
+
+def current_state(profile_path: str, app_dir: str = None) -> dict:
+    """
+    Returns everything the startup cache depends on: LibreWolf build, deployed chrome bundle,
+    generated CSS and overrides.
+    """
+    return {
+        "version": STATE_VERSION,
+        "librewolf": get_librewolf_build(app_dir),
+        "chrome": _chrome_digest(profile_path),
+        "css": _generated_css_digest(profile_path), # also rewritten for profiles that are not launched, each one purges on its own next launch
+        "overrides": _overrides_digest(profile_path),
+    }
+
+#### END STATE INPUTS ####
+
+
+def get_local_profile_dir(profile_path: str) -> str:
+    """
+    Returns the local (cache) profile directory under $XDG_CACHE_HOME/librewolf, where librewolf keeps
+    the startupCache and the HTTP disk cache (cache2) of a profile.
+    """
+    cache_home = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.environ.get("HOME", ""), ".cache")
+    return os.path.join(cache_home, "librewolf", os.path.basename(profile_path))
+
+
+def get_startup_cache_dirs(profile_path: str) -> list:
+    """
+    Returns the startupCache directories of a profile, the one in the profile itself
+    and the one in the local profile directory.
+    """
+    return [
+        os.path.join(profile_path, "startupCache"),
+        os.path.join(get_local_profile_dir(profile_path), "startupCache"),
+    ]
+
+
+def refresh_startup_cache(profile_info, force: bool = False, app_dir: str = None) -> bool:
+    """
+    Purges the profile's startupCache only if the LibreWolf build, the chrome bundle, the generated CSS
+    or the overrides changed since the last launch, so normal launches keep a warm cache.
+
+    Args:
+        profile_info (tuple): A tuple containing (profile_full_path, profile_name).
+        force (bool): purge even if the recorded state matches (e.g. generated chrome CSS changed).
+        app_dir (path): click package root, see get_librewolf_build.
+
+    Returns:
+        bool: True if the cache was purged.
+    """
+    if not profile_info or not profile_info[0]:
+        print("Could not find a valid profile path. Cannot manage startupCache.")
+        return False
+
+    profile_path = profile_info[0]
+    state_path = os.path.join(profile_path, STATE_FILENAME)
+    state = current_state(profile_path, app_dir)
+
+    try:
+        with open(state_path) as f:
+            recorded = json.load(f)
+    except (OSError, ValueError):
+        recorded = None # first launch with this uWolf version, purge once
+
+    if recorded == state and not force:
+        print("startupCache is up to date.")
+        return False
+
+    changed = [key for key in state if not isinstance(recorded, dict) or recorded.get(key) != state[key]]
+    print(f"Purging startupCache ({', '.join(changed) or 'forced'} changed).")
+    for cache_dir in get_startup_cache_dirs(profile_path):
+        if os.path.isdir(cache_dir):
+            shutil.rmtree(cache_dir, ignore_errors=True)
+            print(f"Deleted {cache_dir}")
+
+    try:
+        atomic_write(state_path, json.dumps(state).encode())
+    except OSError as e:
+        print(f"Error writing startup state '{state_path}': {e}")
+    return True
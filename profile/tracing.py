@@ -0,0 +1,124 @@
+import json
+import os
+import threading
+import time
+
+# Startup phase tracing, enabled with UWOLF_TRACE=1.
+# Each finished span becomes one JSON line {"ts": start in unix µs, "span": name, "ms": duration, "pid": pid, ...attributes}
+# in <profile>/uwolf-trace.log. Records are buffered until the profile is known (set_profile) and written by flush().
+
+ENABLED = os.environ.get("UWOLF_TRACE", "") not in ("", "0")
+TRACE_FILENAME = "uwolf-trace.log"
+MAX_LOG_BYTES = 256 * 1024 # rotated to .1, .2 when exceeded
+LOG_BACKUPS = 2
+
+_records = []
+_lock = threading.Lock()
+_log_path = None
+
+
+class _NullSpan:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+    def set(self, **attributes):
+        pass
+
+_NULL_SPAN = _NullSpan() # shared, so disabled tracing costs one call and no allocation
+
+
+class Span:
+    """
+    Times a block and records it when the block exits, attributes can be added while it runs with set().
+    """
+
+    def __init__(self, name: str, attributes: dict):
+        self.name = name
+        self.attributes = attributes
+
+    def __enter__(self):
+        self.started_us = time.time_ns() // 1000
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        record = {"ts": self.started_us, "span": self.name, "ms": round((time.perf_counter() - self.started) * 1000, 3), "pid": os.getpid()}
+        record.update(self.attributes)
+        if exc_type is not None:
+            record["error"] = repr(exc)
+        _add(record)
+        return False
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+
+
+def span(name: str, **attributes):
+    """
+    Returns a context manager that records how long its block took, a no-op if tracing is disabled.
+
+    Args:
+        name (str): phase name, e.g. "probes" or "chrome sync".
+        attributes: extra JSON serializable fields of the record.
+    """
+    if not ENABLED:
+        return _NULL_SPAN
+    return Span(name, attributes)
+
+
+def event(name: str, **attributes) -> None:
+    """
+    Records a point in time (e.g. the exec, which never returns to close a span).
+    """
+    if ENABLED:
+        record = {"ts": time.time_ns() // 1000, "span": name, "ms": 0, "pid": os.getpid()}
+        record.update(attributes)
+        _add(record)
+
+
+def _add(record: dict) -> None:
+    with _lock:
+        _records.append(record)
+
+
+def set_profile(profile_path: str) -> None:
+    """
+    Directs records to the profile's trace log, buffered records are written with the next flush().
+    """
+    global _log_path
+    if ENABLED and profile_path:
+        _log_path = os.path.join(profile_path, TRACE_FILENAME)
+
+
+def _rotate(log_path: str) -> None:
+    try:
+        if os.path.getsize(log_path) < MAX_LOG_BYTES:
+            return
+    except OSError:
+        return
+    for index in range(LOG_BACKUPS, 1, -1):
+        if os.path.exists(f"{log_path}.{index - 1}"):
+            os.replace(f"{log_path}.{index - 1}", f"{log_path}.{index}")
+    os.replace(log_path, f"{log_path}.1")
+
+
+def flush() -> None:
+    """
+    Appends the buffered records to the trace log in a single write, kept buffered if no profile is known yet.
+    """
+    global _records
+    if not ENABLED or _log_path is None:
+        return
+    with _lock:
+        records, _records = _records, []
+    if not records:
+        return
+    try:
+        _rotate(_log_path)
+        with open(_log_path, "a") as f:
+            f.write("".join(json.dumps(record, default=str) + "\n" for record in records))
+    except OSError as e:
+        print(f"Error writing trace log '{_log_path}': {e}")
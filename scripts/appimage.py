@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+import os
+import shutil
+import struct
+import subprocess
+import sys
+import tempfile
+
+# AppImage helpers for librewolf-d.sh, an AppImage (type 2) is an ELF runtime with a squashfs image appended to it.
+# Finding where the squashfs starts lets unsquashfs unpack it natively, without running the (possibly foreign arch) runtime.
+#
+# usage: appimage.py offset <AppImage>          prints the squashfs offset
+#        appimage.py fixture <out> [<runtime>]  builds a small AppImage for offline testing of librewolf-d.sh (needs mksquashfs)
+
+SQUASHFS_MAGIC = b"hsqs"
+ELF_MAGIC = b"\x7fELF"
+SCAN_CHUNK = 1024 * 1024
+
+
+def elf_end(path: str):
+    """
+    Returns the end of the ELF image (after the section header table), where the AppImage runtime
+    places the squashfs, same as the runtime's own --appimage-offset. None if the file is not ELF.
+    """
+    with open(path, "rb") as f:
+        header = f.read(64)
+    if len(header) < 52 or header[:4] != ELF_MAGIC:
+        return None
+    endian = "<" if header[5] == 1 else ">"
+    if header[4] == 2: # ELFCLASS64
+        shoff, = struct.unpack_from(endian + "Q", header, 0x28)
+        shentsize, shnum = struct.unpack_from(endian + "HH", header, 0x3A)
+    else: # ELFCLASS32
+        shoff, = struct.unpack_from(endian + "I", header, 0x20)
+        shentsize, shnum = struct.unpack_from(endian + "HH", header, 0x2E)
+    return shoff + shentsize * shnum
+
+
+def scan_for_magic(path: str, start: int = 0):
+    """
+    Returns the offset of the first squashfs superblock magic at or after start, None if there is none.
+    """
+    with open(path, "rb") as f:
+        f.seek(start)
+        position = start
+        tail = b""
+        while True:
+            chunk = f.read(SCAN_CHUNK)
+            if not chunk:
+                return None
+            data = tail + chunk
+            index = data.find(SQUASHFS_MAGIC)
+            if index != -1:
+                return position - len(tail) + index
+            tail = data[-(len(SQUASHFS_MAGIC) - 1):]
+            position += len(chunk)
+
+
+def find_squashfs_offset(path: str):
+    """
+    Args:
+        path (path): AppImage file.
+
+    Returns:
+        int: offset of the squashfs image, the ELF end if the magic is there, a scan for the magic otherwise.
+             None if no squashfs was found.
+    """
+    offset = elf_end(path)
+    if offset is not None:
+        with open(path, "rb") as f:
+            f.seek(offset)
+            if f.read(len(SQUASHFS_MAGIC)) == SQUASHFS_MAGIC:
+                return offset
+    return scan_for_magic(path, offset or 0)
+
+
+def build_fixture(output: str, runtime: str = "/bin/true") -> None:
+    """
+    Builds a small AppImage shaped like the LibreWolf one (AppRun, librewolf, application.ini),
+    used to run librewolf-d.sh offline: LIBREWOLF_APPIMAGE=<output> scripts/librewolf-d.sh
+
+    Args:
+        output (path): AppImage to write.
+        runtime (path): ELF to use as the runtime, it is never run.
+    """
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        root = os.path.join(tmp_dir, "root")
+        os.makedirs(os.path.join(root, "browser"))
+        with open(os.path.join(root, "AppRun"), "w") as f:
+            f.write("#!/bin/sh\nexec \"$(dirname \"$0\")/librewolf\" \"$@\"\n")
+        with open(os.path.join(root, "librewolf"), "w") as f:
+            f.write("#!/bin/sh\necho LibreWolf fixture \"$@\"\n")
+        with open(os.path.join(root, "application.ini"), "w") as f:
+            f.write("[App]\nName=LibreWolf\nVersion=0.0.0\nBuildID=00000000000000\n")
+        os.chmod(os.path.join(root, "AppRun"), 0o755)
+        os.chmod(os.path.join(root, "librewolf"), 0o755)
+
+        image = os.path.join(tmp_dir, "image.squashfs")
+        subprocess.run(["mksquashfs", root, image, "-quiet", "-noappend", "-all-root"], check=True, stdout=subprocess.DEVNULL)
+
+        with open(output, "wb") as out:
+            for part in (runtime, image):
+                with open(part, "rb") as f:
+                    shutil.copyfileobj(f, out)
+    os.chmod(output, 0o755)
+
+
+def main(argv: list) -> int:
+    if len(argv) >= 2 and argv[0] == "offset":
+        offset = find_squashfs_offset(argv[1])
+        if offset is None:
+            print(f"Error: no squashfs image found in {argv[1]}", file=sys.stderr)
+            return 1
+        print(offset)
+        return 0
+    if len(argv) >= 2 and argv[0] == "fixture":
+        try:
+            build_fixture(*argv[1:3])
+        except (OSError, subprocess.CalledProcessError) as e:
+            print(f"Error building fixture AppImage: {e}", file=sys.stderr)
+            return 1
+        print(argv[1])
+        return 0
+    print("usage: appimage.py offset <AppImage> | fixture <out> [<runtime>]", file=sys.stderr)
+    return 2
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -24,8 +24,9 @@ echo "--->managing files" >> $LOG_FILE
 /bin/cp $ROOT/* $BUILD_DIR 2>/dev/null >> $LOG_FILE
 
 /bin/cp $ROOT/assets/uwolf-logo.png $BUILD_DIR 2>/dev/null >> $LOG_FILE # copy uwolf logo into click package
+/bin/cp $ROOT/.last_librewolf_tag $INSTALL_DIR 2>/dev/null >> $LOG_FILE # librewolf version (dotfile, not caught by the globs), used to invalidate the startup cache
 
-/bin/sed -i "s/@CLICK_ARCH@/${ARCH_TRIPLET}/" ${BUILD_DIR}/librewolf.sh >> $LOG_FILE # change arch for launch script
+/bin/sed -i "s/@CLICK_ARCH@/${ARCH_TRIPLET}/" ${BUILD_DIR}/launcher.py >> $LOG_FILE # change arch for launch script (before it is precompiled)
 
 /bin/cp -rn $BUILD_DIR/usr/lib/* $INSTALL_DIR/lib 2>/dev/null >> $LOG_FILE # copy maliit libs to install dir
 
@@ -90,6 +91,29 @@ echo "---> copying browser chrome profile" >> $LOG_FILE
 /bin/cp ${ROOT}/profile/chrome/*.css ${INSTALL_DIR}/profile/chrome/CSS/ >> $LOG_FILE # copy CSS (userChrome.css) scripts
 /bin/cp ${ROOT}/profile/chrome/*.js ${INSTALL_DIR}/profile/chrome/JS/ >> $LOG_FILE # copy CSS (userChrome.js) scripts
 /bin/cp ${ROOT}/profile/chrome/*.mjs ${INSTALL_DIR}/profile/chrome/JS/ >> $LOG_FILE # copy CSS (userChrome.js) scripts
+## manifest (path, size, sha256) of the final chrome tree, used by chrome.py to sync profiles incrementally
+if ! python3 ${ROOT}/profile/chrome_manifest.py ${INSTALL_DIR}/profile/chrome ${INSTALL_DIR}/profile/chrome.manifest.json >> $LOG_FILE; then
+  echo "Error: failed to generate chrome manifest" >> $LOG_FILE
+  exit 1
+fi
+
+
+## precompiled launcher (the click package is read-only, so python can not cache bytecode on the device and would recompile every launch)
+echo "---> precompiling launcher modules" >> $LOG_FILE
+# checked-hash: the .pyc is used as long as its source is unchanged, whatever the mtimes in the package are.
+# built with the host's python3, only used on the device if it is the same version (same as the framework's)
+if ! python3 -m compileall -q --invalidation-mode checked-hash ${INSTALL_DIR}/launcher.py ${INSTALL_DIR}/focus_monitor.py ${INSTALL_DIR}/session_bus.py ${INSTALL_DIR}/memory_pressure.py ${INSTALL_DIR}/browser_priority.py ${INSTALL_DIR}/profile >> $LOG_FILE; then
+  echo "Error: failed to precompile launcher modules" >> $LOG_FILE
+  exit 1
+fi
+## import cost budget (scripts/import_budget.json), build with UWOLF_IMPORT_BUDGET_UPDATE=1 to record it with this container's python3
+## (first build on a new framework, or a new import that is intended) and commit the file
+BUDGET_ARGS=""
+[ "${UWOLF_IMPORT_BUDGET_UPDATE}" = "1" ] && BUDGET_ARGS="--update"
+if ! python3 ${ROOT}/scripts/import_budget.py ${INSTALL_DIR} ${BUDGET_ARGS} >> $LOG_FILE; then
+  echo "Error: launcher import cost over budget" >> $LOG_FILE
+  exit 1
+fi
 
 
 exit 0
\ No newline at end of file
@@ -0,0 +1,132 @@
+#!/usr/bin/python3
+"""
+Import cost budget of the launcher.
+
+Imports each entry point of the installed click package in a fresh interpreter with `python3 -X importtime`
+(precompiled .pyc files, as shipped) and compares it against import_budget.json:
+  - the import time, relative to a fixed set of stdlib imports timed the same way, so a slower build machine
+    does not fail the build but a heavier launcher does
+  - the modules it pulls in, a new eagerly imported module fails the build even if it happens to be cheap here
+
+    python3 scripts/import_budget.py <app dir>           # check, exits with 1 on a regression
+    python3 scripts/import_budget.py <app dir> --update  # store the current measurements as the budget
+
+Budgets are per Python version (the stdlib's own imports differ between versions) and have to be recorded
+with the interpreter of the build container, a version without a budget is only warned about until one is
+recorded:
+
+    UWOLF_IMPORT_BUDGET_UPDATE=1 in the build environment (env_vars in clickable.yaml) makes scripts/build.sh
+    record it instead of checking, then commit import_budget.json
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+BUDGET_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "import_budget.json")
+ENTRY_POINTS = ("launcher", "focus_monitor") # imported on every launch / by the focus daemon
+REFERENCE_IMPORTS = ("argparse", "json", "email.message") # not used by the launcher, only scales the budget to the machine
+RUNS = 7 # best of, import times are noisy
+TOLERANCE = 0.25 # allowed relative cost increase
+
+
+def import_times(app_dir: str, modules) -> list:
+    """
+    Imports modules in a fresh interpreter from app_dir.
+
+    Returns:
+        list: (module, nesting depth, cumulative µs) in the order -X importtime reports them (children first).
+    """
+    result = subprocess.run([sys.executable, "-E", "-s", "-B", "-X", "importtime", "-c", "import " + ", ".join(modules)],
+                            cwd=app_dir, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(f"importing {', '.join(modules)} failed:\n{result.stderr}")
+    times = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "imported package" in line:
+            continue
+        _self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        stripped = name.lstrip()
+        times.append((stripped, (len(name) - len(stripped) - 1) // 2, int(cumulative_us)))
+    return times
+
+
+def measure(app_dir: str, modules) -> tuple:
+    """
+    Returns:
+        tuple: (best cumulative µs of importing modules, sorted names of the modules they imported)
+    """
+    best = None
+    imported = set()
+    for _ in range(RUNS):
+        pending = []
+        total = 0
+        for name, depth, cumulative_us in import_times(app_dir, modules):
+            pending.append(name)
+            if depth == 0:
+                if name in modules:
+                    total += cumulative_us
+                    imported.update(pending)
+                pending = [] # interpreter startup (site, encodings) is not ours
+        best = total if best is None else min(best, total)
+    return best, sorted(imported)
+
+
+def check(measured: dict, budget: dict) -> list:
+    failures = []
+    for entry, current in measured.items():
+        allowed = budget.get(entry)
+        if allowed is None:
+            failures.append(f"{entry}: no budget, run with --update")
+            continue
+        limit = allowed["relative_cost"] * (1 + TOLERANCE)
+        if current["relative_cost"] > limit:
+            failures.append(f"{entry}: relative import cost {current['relative_cost']:.2f} > {limit:.2f} (budget {allowed['relative_cost']:.2f})")
+        new_modules = sorted(set(current["modules"]) - set(allowed["modules"]))
+        if new_modules:
+            failures.append(f"{entry}: new eager imports {', '.join(new_modules)} (import them where they are used, or run with --update)")
+    return failures
+
+
+def main(argv) -> int:
+    parser = argparse.ArgumentParser(description="Checks the launcher's import cost against import_budget.json.")
+    parser.add_argument("app_dir", help="installed click package (launcher.py, profile/, ...)")
+    parser.add_argument("--update", action="store_true", help="store the current measurements as this Python version's budget")
+    args = parser.parse_args(argv[1:])
+
+    version = "%d.%d" % sys.version_info[:2]
+    reference_us, _ = measure(args.app_dir, REFERENCE_IMPORTS)
+    measured = {}
+    for entry in ENTRY_POINTS:
+        cost_us, modules = measure(args.app_dir, (entry,))
+        measured[entry] = {"relative_cost": round(cost_us / reference_us, 3), "modules": modules}
+        print(f"{entry:<16} {cost_us / 1000:7.1f}ms  {cost_us / reference_us:5.2f}x reference  {len(modules)} modules")
+    print(f"{'reference':<16} {reference_us / 1000:7.1f}ms  (python {version})")
+
+    budgets = {}
+    if os.path.exists(BUDGET_PATH):
+        with open(BUDGET_PATH) as f:
+            budgets = json.load(f)
+
+    if args.update:
+        budgets[version] = measured
+        with open(BUDGET_PATH, "w") as f:
+            json.dump(budgets, f, indent=2, sort_keys=True)
+            f.write("\n")
+        print(f"Budget for python {version} written to {BUDGET_PATH}")
+        return 0
+
+    if version not in budgets:
+        print(f"WARNING no import budget for python {version}, not checking. Record one with the build container's interpreter (build once with UWOLF_IMPORT_BUDGET_UPDATE=1).")
+        return 0
+    failures = check(measured, budgets[version])
+    for failure in failures:
+        print(f"REGRESSION {failure}")
+    if not failures:
+        print("Import cost within budget.")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
@@ -7,56 +7,123 @@ case $ARCH in # make sure its the format i want while logging
   *) echo "Error: Unknown architecture ${ARCH}" && exit 1 ;;
 esac
 
-URL="https://gitlab.com/api/v4/projects/24386000/packages/generic/librewolf/latest/LibreWolf.${ARCH}.AppImage" # get download URL for appimage
-
-echo -e "download url: (${URL})\n" # logging
-
-/bin/wget "${URL}" -P "${INSTALL_DIR}" # download it
-
-APPIMAGE=`/bin/find "$INSTALL_DIR" -type f -name "*.AppImage" -print -quit` # get INSTALL_DIR to appimage
-
-if [ -f "${APPIMAGE}" ]; then # check if appimage downloaded
-  :
-else
-  echo "Error: NO APPIMAGE FOUND, did download go wrong?"
-  exit 1
+SCRIPT_DIR=`/usr/bin/dirname "$0"`
+PACKAGES_URL="https://gitlab.com/api/v4/projects/24386000/packages/generic/librewolf"
+
+## artifact cache
+# AppImages are stored by content (sha256/<checksum>) and indexed by librewolf tag (tags/<tag>.<arch> holds the checksum),
+# so rebuilding the same tag never downloads again.
+# UWOLF_ARTIFACT_CACHE: cache directory (default ~/.cache/uwolf/artifacts)
+# LIBREWOLF_SHA256: expected checksum of the AppImage, the build fails on mismatch
+# LIBREWOLF_APPIMAGE: use this local AppImage instead of downloading (offline builds, see appimage.py fixture)
+CACHE_DIR="${UWOLF_ARTIFACT_CACHE:-${XDG_CACHE_HOME:-$HOME/.cache}/uwolf/artifacts}"
+TAG=`/bin/cat "${ROOT:-$SCRIPT_DIR/..}/.last_librewolf_tag" 2>/dev/null | /usr/bin/tr -d '[:space:]'` || true
+TAG="${TAG:-latest}"
+TAG_INDEX="${CACHE_DIR}/tags/${TAG}.${ARCH}"
+URL="${PACKAGES_URL}/${TAG#v}/LibreWolf.${ARCH}.AppImage" # download URL for the appimage of exactly this tag (package versions have no "v")
+LATEST_URL="${PACKAGES_URL}/latest/LibreWolf.${ARCH}.AppImage"
+
+/bin/mkdir -p "${CACHE_DIR}/sha256" "${CACHE_DIR}/tags"
+
+checksum() {
+  /usr/bin/sha256sum "$1" | /usr/bin/cut -d ' ' -f 1
+}
+
+APPIMAGE=""
+if [ -n "${LIBREWOLF_APPIMAGE}" ]; then # local AppImage, nothing to download
+  echo "using local appimage (${LIBREWOLF_APPIMAGE})"
+  SUM=`checksum "${LIBREWOLF_APPIMAGE}"`
+  APPIMAGE="${LIBREWOLF_APPIMAGE}"
+elif [ -f "${TAG_INDEX}" ] && [ "${TAG}" != "latest" ]; then # cached by tag, verified against its content address
+  SUM=`/bin/cat "${TAG_INDEX}"`
+  if [ -n "${LIBREWOLF_SHA256}" ] && [ "${SUM}" != "${LIBREWOLF_SHA256}" ]; then
+    echo "cached appimage for ${TAG} does not match LIBREWOLF_SHA256, downloading again"
+  elif [ -f "${CACHE_DIR}/sha256/${SUM}" ] && [ "`checksum "${CACHE_DIR}/sha256/${SUM}"`" = "${SUM}" ]; then
+    echo "using cached appimage for ${TAG} (${SUM})"
+    APPIMAGE="${CACHE_DIR}/sha256/${SUM}"
+  else
+    echo "cached appimage for ${TAG} is missing or corrupt, downloading again"
+  fi
 fi
 
-/bin/chmod +x ${APPIMAGE} # grant it permissions
-
-QEMU_STATIC=`/bin/sh -lc "/bin/which qemu-${ARCH}-static" 2>/dev/null` # get qemu-$ARCH-static INSTALL_DIR
+if [ -z "${APPIMAGE}" ]; then
+  echo -e "download url: (${URL})\n" # logging
+  DOWNLOAD="${CACHE_DIR}/download.$$"
+  /bin/rm -f "${DOWNLOAD}"
+  INDEX_TAG="${TAG}"
+  if ! /bin/wget -q "${URL}" -O "${DOWNLOAD}"; then # download it
+    /bin/rm -f "${DOWNLOAD}"
+    if [ "${URL}" = "${LATEST_URL}" ] || ! /bin/wget -q "${LATEST_URL}" -O "${DOWNLOAD}"; then
+      /bin/rm -f "${DOWNLOAD}"
+      echo "Error: NO APPIMAGE FOUND, did download go wrong?"
+      exit 1
+    fi
+    echo "no appimage published for ${TAG} (yet), built with latest, not cached as ${TAG}"
+    INDEX_TAG="latest" # whatever version latest is, it must not be reused as ${TAG}
+  fi
+  SUM=`checksum "${DOWNLOAD}"`
+  /bin/mv -f "${DOWNLOAD}" "${CACHE_DIR}/sha256/${SUM}" # content addressed, same bytes same name
+  APPIMAGE="${CACHE_DIR}/sha256/${SUM}"
+  if [ "${INDEX_TAG}" != "latest" ]; then
+    echo "${SUM}" > "${TAG_INDEX}.tmp" && /bin/mv -f "${TAG_INDEX}.tmp" "${TAG_INDEX}"
+  fi
+fi
 
-if [ -z "$QEMU_STATIC" ]; then
-  echo -e "Error: qemu-${ARCH}-static not found\n"
-  echo "       try installing qemu-user-static"
-  /bin/rm -rf ${APPIMAGE}
+echo "librewolf ${INDEX_TAG:-${TAG}} appimage sha256: ${SUM}"
+if [ -n "${LIBREWOLF_SHA256}" ] && [ "${SUM}" != "${LIBREWOLF_SHA256}" ]; then
+  echo "Error: appimage checksum ${SUM} does not match LIBREWOLF_SHA256 (${LIBREWOLF_SHA256})"
   exit 1
 fi
 
-cd $INSTALL_DIR # needed to control extract dir
-$QEMU_STATIC $APPIMAGE --appimage-extract # extract with qemu emulation
+## extraction
+/bin/rm -rf "$INSTALL_DIR/squashfs-root"
+
+UNSQUASHFS=`command -v unsquashfs 2>/dev/null || /bin/sh -lc "/bin/which unsquashfs" 2>/dev/null` || true
+OFFSET=`/usr/bin/python3 "${SCRIPT_DIR}/appimage.py" offset "${APPIMAGE}"` || OFFSET=""
+
+if [ -n "$UNSQUASHFS" ] && [ -n "$OFFSET" ]; then # native: unpack the appended squashfs, nothing is executed
+  echo "extracting natively (squashfs at offset ${OFFSET})"
+  if ! $UNSQUASHFS -q -n -o "${OFFSET}" -d "$INSTALL_DIR/squashfs-root" "${APPIMAGE}" >/dev/null; then
+    # unsquashfs older than 4.4 has no -o, cut the image out instead
+    /bin/rm -rf "$INSTALL_DIR/squashfs-root"
+    /usr/bin/tail -c +$((OFFSET + 1)) "${APPIMAGE}" > "${CACHE_DIR}/image.$$.squashfs"
+    if ! $UNSQUASHFS -n -d "$INSTALL_DIR/squashfs-root" "${CACHE_DIR}/image.$$.squashfs" >/dev/null; then
+      echo "native extraction failed"
+      /bin/rm -rf "$INSTALL_DIR/squashfs-root" # never package a partial tree, qemu or the error below takes over
+    fi
+    /bin/rm -f "${CACHE_DIR}/image.$$.squashfs"
+  fi
+fi
 
-# cd $INSTALL_DIR # will fail (only work if target and host arch are the same)
-# $APPIMAGE --appimage-extract
+if [ ! -d "$INSTALL_DIR/squashfs-root" ]; then # fall back to running the appimage under qemu emulation
+  QEMU_STATIC=`/bin/sh -lc "/bin/which qemu-${ARCH}-static" 2>/dev/null` || true # get qemu-$ARCH-static INSTALL_DIR
+
+  if [ -z "$QEMU_STATIC" ]; then
+    echo -e "Error: neither unsquashfs nor qemu-${ARCH}-static found\n"
+    echo "       try installing squashfs-tools"
+    exit 1
+  fi
+
+  echo "extracting with ${QEMU_STATIC}"
+  /bin/cp "${APPIMAGE}" "$INSTALL_DIR/LibreWolf.${ARCH}.AppImage" # keep the cached copy read only
+  /bin/chmod +x "$INSTALL_DIR/LibreWolf.${ARCH}.AppImage" # grant it permissions
+  cd $INSTALL_DIR # needed to control extract dir
+  $QEMU_STATIC "$INSTALL_DIR/LibreWolf.${ARCH}.AppImage" --appimage-extract >/dev/null # extract with qemu emulation
+  /bin/rm -f "$INSTALL_DIR/LibreWolf.${ARCH}.AppImage"
+fi
 
 if [ ! -d "$INSTALL_DIR/squashfs-root" ]; then # check for extraction
   echo "Error: appimage not extracted properly!"
-  /bin/rm -rf ${APPIMAGE}
   exit 1
 fi
 
+/bin/mkdir -p $INSTALL_DIR/bin
 /bin/cp -r $INSTALL_DIR/squashfs-root/* $INSTALL_DIR/bin # move librewolf binary to its place (with merging)
-/bin/rm -rf $INSTALL_DIR/squashfs-root 
+/bin/rm -rf $INSTALL_DIR/squashfs-root
 
 if [ ! -d "${INSTALL_DIR}/bin" ]; then # sanity check mv worked
   echo "directory (${INSTALL_DIR}/bin) does not exist!!"
   exit 1
 fi
 
-/bin/rm -rf ${APPIMAGE} # remove appimage as its not needed anymore.
-
-if [ -f "${APPIMAGE}" ]; then # check if appimage remove, as this is not catastrophic script does not fail.
-  echo "Failed to Remove APPIMAGE (${APPIMAGE}) please remove manually"
-fi
-
-exit 0
\ No newline at end of file
+exit 0
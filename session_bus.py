@@ -0,0 +1,345 @@
+import os
+import socket
+import struct
+from typing import NamedTuple
+
+# Minimal D-Bus wire protocol client (stdlib only), enough for focus_monitor to
+# subscribe to the session bus without dbus-monitor, and for tools to send simple messages.
+
+METHOD_CALL = 1
+METHOD_RETURN = 2
+ERROR = 3
+SIGNAL = 4
+
+NO_REPLY_EXPECTED = 0x1
+
+FIELD_PATH = 1
+FIELD_INTERFACE = 2
+FIELD_MEMBER = 3
+FIELD_ERROR_NAME = 4
+FIELD_REPLY_SERIAL = 5
+FIELD_DESTINATION = 6
+FIELD_SENDER = 7
+FIELD_SIGNATURE = 8
+
+BUS_NAME = "org.freedesktop.DBus"
+BUS_PATH = "/org/freedesktop/DBus"
+
+_FIXED = { # type code -> (struct format, alignment)
+    "y": ("B", 1), "b": ("I", 4), "n": ("h", 2), "q": ("H", 2), "i": ("i", 4),
+    "u": ("I", 4), "x": ("q", 8), "t": ("Q", 8), "d": ("d", 8), "h": ("I", 4),
+}
+_FIELD_TYPES = {
+    FIELD_PATH: "o", FIELD_INTERFACE: "s", FIELD_MEMBER: "s", FIELD_ERROR_NAME: "s",
+    FIELD_REPLY_SERIAL: "u", FIELD_DESTINATION: "s", FIELD_SENDER: "s", FIELD_SIGNATURE: "g",
+}
+
+
+class DBusError(Exception):
+    pass
+
+
+class Message(NamedTuple):
+    type: int
+    flags: int
+    serial: int
+    fields: dict
+    body: bytes
+    endian: str # "<" or ">"
+
+    @property
+    def interface(self):
+        return self.fields.get(FIELD_INTERFACE)
+
+    @property
+    def member(self):
+        return self.fields.get(FIELD_MEMBER)
+
+    @property
+    def signature(self):
+        return self.fields.get(FIELD_SIGNATURE, "")
+
+    def args(self) -> list:
+        """
+        Unmarshals the message body.
+        """
+        values, _ = _unmarshal(self.signature, self.body, 0, self.endian)
+        return values
+
+
+#### START MARSHALLING ####
+
+def _split_signature(signature: str) -> list:
+    """
+    Splits a signature into its single complete types, e.g. "sa{sv}u" -> ["s", "a{sv}", "u"].
+    """
+    types = []
+    i = 0
+    while i < len(signature):
+        end = _complete_type_end(signature, i)
+        types.append(signature[i:end])
+        i = end
+    return types
+
+def _complete_type_end(signature: str, i: int) -> int:
+    code = signature[i]
+    if code == "a":
+        return _complete_type_end(signature, i + 1)
+    if code in "({":
+        closing = ")" if code == "(" else "}"
+        depth = 0
+        for j in range(i, len(signature)):
+            if signature[j] in "({":
+                depth += 1
+            elif signature[j] in ")}":
+                depth -= 1
+                if depth == 0:
+                    if signature[j] != closing:
+                        break
+                    return j + 1
+        raise DBusError(f"unbalanced signature: {signature}")
+    return i + 1
+
+def _alignment(type_code: str) -> int:
+    if type_code in _FIXED:
+        return _FIXED[type_code][1]
+    if type_code in "sao":
+        return 4
+    if type_code in "({":
+        return 8
+    return 1 # g, v
+
+def _pad(buffer: bytearray, alignment: int) -> None:
+    buffer.extend(b"\0" * (-len(buffer) % alignment))
+
+def _marshal_value(buffer: bytearray, type_signature: str, value) -> None:
+    code = type_signature[0]
+    _pad(buffer, _alignment(code))
+    if code in _FIXED:
+        buffer.extend(struct.pack("<" + _FIXED[code][0], int(value) if code == "b" else value))
+    elif code in "so":
+        data = value.encode()
+        buffer.extend(struct.pack("<I", len(data)) + data + b"\0")
+    elif code == "g":
+        data = value.encode()
+        buffer.extend(struct.pack("<B", len(data)) + data + b"\0")
+    elif code == "v":
+        variant_signature, variant_value = value
+        _marshal_value(buffer, "g", variant_signature)
+        _marshal_value(buffer, variant_signature, variant_value)
+    elif code == "a":
+        element = type_signature[1:]
+        length_offset = len(buffer)
+        buffer.extend(b"\0\0\0\0")
+        _pad(buffer, _alignment(element[0]))
+        start = len(buffer)
+        items = value.items() if element[0] == "{" else value
+        for item in items:
+            _marshal_value(buffer, element, item)
+        struct.pack_into("<I", buffer, length_offset, len(buffer) - start)
+    elif code in "({":
+        for member_type, member_value in zip(_split_signature(type_signature[1:-1]), value):
+            _marshal_value(buffer, member_type, member_value)
+    else:
+        raise DBusError(f"unsupported type: {type_signature}")
+
+def _unmarshal_value(type_signature: str, data: bytes, offset: int, endian: str):
+    code = type_signature[0]
+    alignment = _alignment(code)
+    offset += -offset % alignment
+    if code in _FIXED:
+        fmt = endian + _FIXED[code][0]
+        value = struct.unpack_from(fmt, data, offset)[0]
+        return (bool(value) if code == "b" else value), offset + struct.calcsize(fmt)
+    if code in "so":
+        length = struct.unpack_from(endian + "I", data, offset)[0]
+        offset += 4
+        return data[offset:offset + length].decode(errors="replace"), offset + length + 1
+    if code == "g":
+        length = data[offset]
+        offset += 1
+        return data[offset:offset + length].decode(), offset + length + 1
+    if code == "v":
+        variant_signature, offset = _unmarshal_value("g", data, offset, endian)
+        return _unmarshal_value(variant_signature, data, offset, endian)
+    if code == "a":
+        element = type_signature[1:]
+        length = struct.unpack_from(endian + "I", data, offset)[0]
+        offset += 4
+        offset += -offset % _alignment(element[0])
+        end = offset + length
+        items = []
+        while offset < end:
+            item, offset = _unmarshal_value(element, data, offset, endian)
+            items.append(item)
+        return (dict(items) if element[0] == "{" else items), end
+    if code in "({":
+        values, offset = _unmarshal(type_signature[1:-1], data, offset, endian)
+        return tuple(values), offset
+    raise DBusError(f"unsupported type: {type_signature}")
+
+def _unmarshal(signature: str, data: bytes, offset: int, endian: str):
+    values = []
+    for type_signature in _split_signature(signature):
+        value, offset = _unmarshal_value(type_signature, data, offset, endian)
+        values.append(value)
+    return values, offset
+
+def marshal_message(message_type: int, serial: int, fields: dict, signature: str = "", args=(), flags: int = 0) -> bytes:
+    """
+    Builds a little endian D-Bus message.
+
+    Args:
+        message_type (int): METHOD_CALL, METHOD_RETURN, ERROR or SIGNAL.
+        serial (int): non zero message serial.
+        fields (dict): header field code -> value (types from _FIELD_TYPES).
+        signature (str): body signature.
+        args (iterable): body values matching signature.
+        flags (int): header flags.
+    """
+    body = bytearray()
+    for type_signature, value in zip(_split_signature(signature), args):
+        _marshal_value(body, type_signature, value)
+
+    header_fields = [(code, (_FIELD_TYPES[code], value)) for code, value in fields.items() if value is not None]
+    if signature:
+        header_fields.append((FIELD_SIGNATURE, ("g", signature)))
+
+    header = bytearray(b"l" + struct.pack("<BBBII", message_type, flags, 1, len(body), serial))
+    _marshal_value(header, "a(yv)", header_fields)
+    _pad(header, 8)
+    return bytes(header + body)
+
+#### END MARSHALLING ####
+
+
+def get_session_bus_address() -> str:
+    address = os.environ.get("DBUS_SESSION_BUS_ADDRESS")
+    if address:
+        return address
+    runtime_dir = os.environ.get("XDG_RUNTIME_DIR") or f"/run/user/{os.getuid()}"
+    return f"unix:path={os.path.join(runtime_dir, 'bus')}"
+
+
+def _socket_path(address: str) -> str:
+    for entry in address.split(";"): # first usable unix transport wins
+        transport, _, params = entry.partition(":")
+        if transport != "unix":
+            continue
+        options = dict(option.split("=", 1) for option in params.split(",") if "=" in option)
+        if "path" in options:
+            return options["path"]
+        if "abstract" in options:
+            return "\0" + options["abstract"]
+    raise DBusError(f"no supported unix transport in bus address: {address}")
+
+
+class Connection:
+    """
+    A blocking connection to a D-Bus message bus.
+    """
+
+    def __init__(self, address: str = None):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.connect(_socket_path(address or get_session_bus_address()))
+        self._buffer = bytearray()
+        self._serial = 0
+        self._authenticate()
+        self.unique_name = self.call(BUS_NAME, BUS_PATH, BUS_NAME, "Hello").args()[0]
+
+    def _authenticate(self) -> None:
+        uid = str(os.geteuid()).encode().hex()
+        self.sock.sendall(b"\0AUTH EXTERNAL " + uid.encode() + b"\r\n")
+        reply = self._read_line()
+        if not reply.startswith(b"OK "):
+            raise DBusError(f"authentication rejected: {reply!r}")
+        self.sock.sendall(b"BEGIN\r\n")
+
+    def _read_line(self) -> bytes:
+        while b"\r\n" not in self._buffer:
+            self._fill()
+        line, _, rest = bytes(self._buffer).partition(b"\r\n")
+        self._buffer = bytearray(rest)
+        return line
+
+    def _fill(self) -> None:
+        chunk = self.sock.recv(65536)
+        if not chunk:
+            raise DBusError("connection closed by the bus")
+        self._buffer.extend(chunk)
+
+    def fileno(self) -> int:
+        return self.sock.fileno()
+
+    def close(self) -> None:
+        self.sock.close()
+
+    def send(self, message_type: int, fields: dict, signature: str = "", args=(), flags: int = 0) -> int:
+        """
+        Sends a message and returns its serial.
+        """
+        self._serial += 1
+        self.sock.sendall(marshal_message(message_type, self._serial, fields, signature, args, flags))
+        return self._serial
+
+    def has_buffered_message(self) -> bool:
+        """
+        True if a complete message is already buffered, i.e. receive() will not block
+        (selectors only report the socket, not this buffer).
+        """
+        if len(self._buffer) < 16:
+            return False
+        endian = "<" if self._buffer[0:1] == b"l" else ">"
+        body_length, _, fields_length = struct.unpack_from(endian + "III", self._buffer, 4)
+        return len(self._buffer) >= 16 + fields_length + (-(16 + fields_length) % 8) + body_length
+
+    def receive(self) -> Message:
+        """
+        Blocks until a complete message arrives and returns it.
+        """
+        while len(self._buffer) < 16:
+            self._fill()
+        endian = "<" if self._buffer[0:1] == b"l" else ">"
+        body_length, _, fields_length = struct.unpack_from(endian + "III", self._buffer, 4)
+        header_length = 16 + fields_length + (-(16 + fields_length) % 8)
+        total = header_length + body_length
+        while len(self._buffer) < total:
+            self._fill()
+
+        data = bytes(self._buffer[:total])
+        del self._buffer[:total]
+
+        message_type, flags = data[1], data[2]
+        serial = struct.unpack_from(endian + "I", data, 8)[0]
+        raw_fields, _ = _unmarshal_value("a(yv)", data, 12, endian)
+        return Message(message_type, flags, serial, dict(raw_fields), data[header_length:], endian)
+
+    def call(self, destination: str, path: str, interface: str, member: str, signature: str = "", args=()) -> Message:
+        """
+        Sends a method call and waits for its reply, messages received in between are dropped.
+        Raises DBusError if the reply is an error.
+        """
+        serial = self.send(METHOD_CALL, {
+            FIELD_PATH: path, FIELD_INTERFACE: interface, FIELD_MEMBER: member, FIELD_DESTINATION: destination,
+        }, signature, args)
+        while True:
+            message = self.receive()
+            if message.fields.get(FIELD_REPLY_SERIAL) != serial:
+                continue
+            if message.type == ERROR:
+                detail = message.args() if message.signature else []
+                raise DBusError(f"{message.fields.get(FIELD_ERROR_NAME)}: {detail[0] if detail else ''}")
+            return message
+
+    def monitor(self, match_rules: list) -> None:
+        """
+        Turns this connection into a monitor for match_rules (org.freedesktop.DBus.Monitoring),
+        falling back to eavesdropping match rules on buses without the Monitoring interface.
+        After this the connection only receives, it must not send.
+        """
+        try:
+            self.call(BUS_NAME, BUS_PATH, "org.freedesktop.DBus.Monitoring", "BecomeMonitor", "asu", (match_rules, 0))
+        except DBusError as e:
+            print(f"BecomeMonitor unavailable ({e}), falling back to eavesdropping.")
+            for rule in match_rules:
+                self.call(BUS_NAME, BUS_PATH, BUS_NAME, "AddMatch", "s", (rule + ",eavesdrop='true'",))